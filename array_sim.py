@@ -0,0 +1,836 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import simulation as S
+from directions import DirectionTable
+from events import TIME_EPS
+from history import History
+from profiler import Profiler
+from rng import ArrayStreams, SimRandom
+from simulation import Antibody, Cell, Leukocyte, Virus
+
+# 细胞状态编码
+HEALTHY, INFECTED, DEAD = 0, 1, 2
+STATE_CODES = {"healthy": HEALTHY, "infected": INFECTED, "dead": DEAD}
+STATE_NAMES = ("healthy", "infected", "dead")
+
+# 各物种的列：名字 -> (dtype, 默认值)；divide_at 用 NaN 表示 None
+CELL_FIELDS = {
+    "x": (np.float64, 0.0), "y": (np.float64, 0.0),
+    "vx": (np.float64, 0.0), "vy": (np.float64, 0.0),
+    "r": (np.float64, 0.0),
+    "state": (np.int8, HEALTHY),
+    "born": (np.float64, -np.inf),
+    "burst_at": (np.float64, 0.0),
+    "divide_at": (np.float64, np.nan),
+    "antibody_attached": (np.int32, 0),
+}
+VIRUS_FIELDS = {
+    "x": (np.float64, 0.0), "y": (np.float64, 0.0),
+    "vx": (np.float64, 0.0), "vy": (np.float64, 0.0),
+    "attached": (np.int32, 0),
+}
+ANTIBODY_FIELDS = {
+    "x": (np.float64, 0.0), "y": (np.float64, 0.0),
+    "vx": (np.float64, 0.0), "vy": (np.float64, 0.0),
+    "flash": (np.int32, 0),
+}
+LEUKOCYTE_FIELDS = {
+    "x": (np.float64, 0.0), "y": (np.float64, 0.0),
+    "vx": (np.float64, 0.0), "vy": (np.float64, 0.0),
+}
+
+
+# ---------- 结构数组（每个物种一组连续数组） ----------
+class SpeciesArrays:
+    def __init__(self, fields: Dict[str, Tuple[type, float]], capacity: int = 64):
+        object.__setattr__(self, "fields", dict(fields))
+        object.__setattr__(self, "n", 0)
+        object.__setattr__(self, "data", self._allocate(capacity))
+
+    def __len__(self) -> int:
+        return self.n
+
+    # sa.x 返回前 n 个元素的视图；sa.x += ... 原地写回
+    def __getattr__(self, name: str) -> np.ndarray:
+        data = self.__dict__.get("data")
+        if data is not None and name in data:
+            return data[name][:self.n]
+        raise AttributeError(name)
+
+    def __setattr__(self, name: str, value) -> None:
+        if name in self.data:
+            self.data[name][:self.n] = value
+        else:
+            object.__setattr__(self, name, value)
+
+    @property
+    def capacity(self) -> int:
+        return len(next(iter(self.data.values())))
+
+    def _allocate(self, capacity: int) -> Dict[str, np.ndarray]:
+        # 按容量新建一组列（填默认值）；子类可以换成别的存储（如共享内存）
+        return {name: np.full(capacity, default, dtype=dtype) for name, (dtype, default) in self.fields.items()}
+
+    def _reserve(self, extra: int) -> None:
+        need = self.n + extra
+        cap = self.capacity
+        if need <= cap:
+            return
+        while cap < need:
+            cap *= 2
+        grown = self._allocate(cap)
+        for name in self.fields:
+            grown[name][:self.n] = self.data[name][:self.n]
+        object.__setattr__(self, "data", grown)
+
+    def extend(self, **columns) -> None:
+        count = len(next(iter(columns.values())))
+        if count == 0:
+            return
+        self._reserve(count)
+        start, end = self.n, self.n + count
+        for name, (dtype, default) in self.fields.items():
+            col = self.data[name]
+            col[start:end] = columns[name] if name in columns else default
+        object.__setattr__(self, "n", end)
+
+    def keep(self, mask: np.ndarray) -> None:
+        # 按 mask 保留（保持原顺序）
+        count = int(np.count_nonzero(mask))
+        if count == self.n:
+            return
+        for name in self.fields:
+            col = self.data[name]
+            col[:count] = col[:self.n][mask]
+        object.__setattr__(self, "n", count)
+
+    def clear(self) -> None:
+        object.__setattr__(self, "n", 0)
+
+
+# ---------- 向量化工具 ----------
+def reflect_off_circle_arrays(x: np.ndarray, y: np.ndarray, vx: np.ndarray, vy: np.ndarray,
+                              margin, mask: Optional[np.ndarray] = None, center=None) -> None:
+    # 与 reflect_off_circle 相同，原地处理整组；center 是各个体所在大圆的圆心 (cx, cy)，默认画布中心
+    cx, cy = (S.CENTER, S.CENTER) if center is None else center
+    dx = x - cx
+    dy = y - cy
+    d = np.hypot(dx, dy)
+    limit = np.broadcast_to(S.RADIUS - np.asarray(margin, dtype=np.float64), d.shape)
+    out = (d > limit) & (d >= 1e-9)
+    if mask is not None:
+        out &= mask
+    if not out.any():
+        return
+    d_out = d[out]
+    nx = dx[out] / d_out
+    ny = dy[out] / d_out
+    lim = limit[out]
+    x[out] = np.broadcast_to(cx, d.shape)[out] + nx * lim
+    y[out] = np.broadcast_to(cy, d.shape)[out] + ny * lim
+    dot = vx[out] * nx + vy[out] * ny
+    vx[out] -= 2 * dot * nx
+    vy[out] -= 2 * dot * ny
+
+
+def clamp_into_circle(x: np.ndarray, y: np.ndarray, margin: float, center=None) -> None:
+    # 出生点不在大圆内时拉回到边界上（同 _inside_big_circle 的处理）
+    cx, cy = (S.CENTER, S.CENTER) if center is None else center
+    dx = x - cx
+    dy = y - cy
+    limit = S.RADIUS - margin
+    out = dx * dx + dy * dy > limit * limit
+    if not out.any():
+        return
+    d = np.hypot(dx[out], dy[out])
+    d[d == 0] = 1.0
+    x[out] = np.broadcast_to(cx, x.shape)[out] + dx[out] / d * limit
+    y[out] = np.broadcast_to(cy, y.shape)[out] + dy[out] / d * limit
+
+
+def neighbor_pairs(ax: np.ndarray, ay: np.ndarray, bx: np.ndarray, by: np.ndarray,
+                   reach: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # 网格粗筛：返回距离 <= reach 的 (a 下标, b 下标, 距离平方)，按 (a, b) 升序
+    empty = np.empty(0, dtype=np.int64)
+    if len(ax) == 0 or len(bx) == 0:
+        return empty, empty, np.empty(0)
+    size = max(float(reach), 1e-6)
+    bix = np.floor(bx / size).astype(np.int64)
+    biy = np.floor(by / size).astype(np.int64)
+    offset = 1 << 20
+    span = 1 << 21
+    bkey = (bix + offset) * span + (biy + offset)
+    order = np.argsort(bkey, kind="stable")
+    skey = bkey[order]
+    aix = np.floor(ax / size).astype(np.int64)
+    aiy = np.floor(ay / size).astype(np.int64)
+    akey = (aix + offset) * span + (aiy + offset)
+    # 查询也按键排好序：有序的键做二分查找快得多（上一次的结果就是下一次的下界，访存连续）
+    aorder = np.argsort(akey)
+    akey = akey[aorder]
+
+    # 同一列上 iy-1..iy+1 三个格子的键是连续的，一次区间查找即可；三列拼在一起只查一次
+    query = np.concatenate([akey + ox * span for ox in (-1, 0, 1)])
+    lo = np.searchsorted(skey, query - 1, side="left")
+    hi = np.searchsorted(skey, query + 1, side="right")
+    cnt = hi - lo
+    total = int(cnt.sum())
+    if total == 0:
+        return empty, empty, np.empty(0)
+    ia = np.repeat(np.tile(aorder, 3), cnt)
+    starts = np.repeat(lo - (np.cumsum(cnt) - cnt), cnt)
+    ib = order[np.arange(total) + starts]
+    dx = ax[ia] - bx[ib]
+    dy = ay[ia] - by[ib]
+    d2 = dx * dx + dy * dy
+    near = d2 <= reach * reach
+    ia, ib, d2 = ia[near], ib[near], d2[near]
+    # 单个整数键排序比 lexsort 快得多（配对本来就接近有序）
+    sort = np.argsort(ia * len(bx) + ib, kind="stable")
+    return ia[sort], ib[sort], d2[sort]
+
+
+def first_per_group(ia: np.ndarray) -> np.ndarray:
+    # ia 已升序：返回每组第一条记录的位置
+    if len(ia) == 0:
+        return np.empty(0, dtype=np.int64)
+    head = np.ones(len(ia), dtype=bool)
+    head[1:] = ia[1:] != ia[:-1]
+    return np.flatnonzero(head)
+
+
+def nearest_neighbor(ax: np.ndarray, ay: np.ndarray, bx: np.ndarray, by: np.ndarray,
+                     max_reach: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    # 批量最近邻：返回每个 a 最近的 b 下标（没有则 -1）与距离平方。
+    # 距离相同时取下标最小者（同 min(...) / 线性扫描 "<" 的结果）；
+    # 给了 max_reach 时只接受严格小于 max_reach 的目标。
+    na = len(ax)
+    best = np.full(na, -1, dtype=np.int64)
+    best_d2 = np.full(na, np.inf)
+    if na == 0 or len(bx) == 0:
+        return best, best_d2
+    if len(bx) <= 32:
+        # 目标很少（如白细胞）：直接算稠密距离矩阵，argmin 取第一个最小值
+        d2 = (ax[:, None] - bx[None, :]) ** 2 + (ay[:, None] - by[None, :]) ** 2
+        k = np.argmin(d2, axis=1)
+        kd2 = d2[np.arange(na), k]
+        ok = np.ones(na, dtype=bool) if max_reach is None else kd2 < max_reach * max_reach
+        best[ok] = k[ok]
+        best_d2[ok] = kd2[ok]
+        return best, best_d2
+
+    # 起始搜索半径按目标密度估计，找不到的再翻倍扩大
+    spacing = math.sqrt(math.pi * S.RADIUS * S.RADIUS / len(bx))
+    reach = max(spacing, 1.0)
+    limit = 2.0 * S.CANVAS_SIZE if max_reach is None else float(max_reach)
+    pending = np.arange(na)
+    while len(pending):
+        reach = min(reach, limit)
+        ia, ib, d2 = neighbor_pairs(ax[pending], ay[pending], bx, by, reach)
+        if max_reach is not None:
+            ok = d2 < limit * limit
+            ia, ib, d2 = ia[ok], ib[ok], d2[ok]
+        if len(ia):
+            # 配对已按 (a, b) 升序：组内最小距离里 b 下标最小的那条
+            starts = first_per_group(ia)
+            group_min = np.minimum.reduceat(d2, starts)
+            group = np.cumsum(np.r_[False, ia[1:] != ia[:-1]])
+            hit = np.flatnonzero(d2 == group_min[group])
+            head = hit[first_per_group(ia[hit])]
+            found = pending[ia[head]]
+            best[found] = ib[head]
+            best_d2[found] = d2[head]
+            done = np.zeros(len(pending), dtype=bool)
+            done[ia[head]] = True
+            pending = pending[~done]
+        if reach >= limit:
+            break
+        reach *= 2.0
+    return best, best_d2
+
+
+def unit_vectors(dx: np.ndarray, dy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    d = np.hypot(dx, dy)
+    ok = d >= 1e-9
+    safe = np.where(ok, d, 1.0)
+    return np.where(ok, dx / safe, 0.0), np.where(ok, dy / safe, 0.0)
+
+
+# ---------- 数组后端模拟引擎 ----------
+class ArraySimulation:
+    species_arrays = SpeciesArrays  # 各物种的列存储类型
+    worlds = 1                      # 一次模拟几个互不相干的世界（多世界批量模拟里是 K）
+
+    def __init__(self, seed: Optional[int] = None):
+        # 初始布局用与对象引擎相同的 placement 流（同一种子得到同一初始世界），
+        # 之后各子系统用 numpy 子流批量抽取
+        self.rng = SimRandom(seed)
+        self.gen = ArrayStreams(self.rng.seed)
+
+        # 统计
+        self.captured = 0
+        self.tick = 0
+        self.infected_count = 0
+        self.burst_count = 0
+        self.elapsed_time = 0.0
+        self.history = self.make_history()
+        self.metrics = None
+        self.profiler = Profiler()
+
+        # 离散方向（默认16方向，查表量化）
+        self.direction_table = DirectionTable(S.N_DIRECTIONS)
+        self.directions = self.direction_table.directions
+
+        self.cells = self.species_arrays(CELL_FIELDS)
+        self.viruses = self.species_arrays(VIRUS_FIELDS)
+        self.antibodies = self.species_arrays(ANTIBODY_FIELDS)
+        self.leukocytes = self.species_arrays(LEUKOCYTE_FIELDS)
+
+        self.ca_accum = 0.0
+
+        self.reset()
+
+    def reset(self, seed: Optional[int] = None):
+        if seed is not None:
+            self.reseed(seed)
+        self.captured = 0
+        self.tick = 0
+        self.infected_count = 0
+        self.burst_count = 0
+        self.overlap_residual = 0.0
+        self.elapsed_time = 0.0
+        self.history.clear()
+        self.ca_accum = 0.0
+
+        world = self.initial_objects()
+        self.placed = S.placement_report(world, self.worlds)
+        self.load_objects(*world)
+        self.record_history()
+
+    def make_history(self) -> History:
+        return History(S.HISTORY_CAPACITY, S.HISTORY_MODE)
+
+    def initial_objects(self) -> Tuple[List[Cell], List[Virus], List[Antibody], List[Leukocyte]]:
+        return S.initial_world(self.rng.placement, batch=True)
+
+    def reseed(self, seed: Optional[int] = None) -> None:
+        self.rng = SimRandom(seed)
+        self.gen = ArrayStreams(self.rng.seed)
+
+    # ---------- 与对象表示互转 ----------
+    def load_objects(self, cells: List[Cell], viruses: List[Virus],
+                     antibodies: List[Antibody], leukocytes: List[Leukocyte]) -> None:
+        for arrays in (self.cells, self.viruses, self.antibodies, self.leukocytes):
+            arrays.clear()
+        self.cells.extend(
+            x=[c.x for c in cells], y=[c.y for c in cells],
+            vx=[c.vx for c in cells], vy=[c.vy for c in cells],
+            r=[c.r for c in cells],
+            state=[STATE_CODES[c.state] for c in cells],
+            born=[c.born for c in cells],
+            burst_at=[c.burst_at for c in cells],
+            divide_at=[np.nan if c.divide_at is None else c.divide_at for c in cells],
+            antibody_attached=[c.antibody_attached for c in cells],
+        )
+        self.viruses.extend(x=[v.x for v in viruses], y=[v.y for v in viruses],
+                            vx=[v.vx for v in viruses], vy=[v.vy for v in viruses],
+                            attached=[v.attached for v in viruses])
+        self.antibodies.extend(x=[a.x for a in antibodies], y=[a.y for a in antibodies],
+                               vx=[a.vx for a in antibodies], vy=[a.vy for a in antibodies],
+                               flash=[a.flash for a in antibodies])
+        self.leukocytes.extend(x=[w.x for w in leukocytes], y=[w.y for w in leukocytes],
+                               vx=[w.vx for w in leukocytes], vy=[w.vy for w in leukocytes])
+
+    def to_objects(self) -> Tuple[List[Cell], List[Virus], List[Antibody], List[Leukocyte]]:
+        c = self.cells
+        cells = [
+            Cell(x=x, y=y, vx=vx, vy=vy, r=r, state=STATE_NAMES[st], born=bn,
+                 burst_at=bt, divide_at=None if math.isnan(dv) else dv, antibody_attached=ab)
+            for x, y, vx, vy, r, st, bn, bt, dv, ab in zip(
+                c.x.tolist(), c.y.tolist(), c.vx.tolist(), c.vy.tolist(), c.r.tolist(),
+                c.state.tolist(), c.born.tolist(), c.burst_at.tolist(),
+                c.divide_at.tolist(), c.antibody_attached.tolist())
+        ]
+        v = self.viruses
+        viruses = [Virus(x=x, y=y, vx=vx, vy=vy, attached=att)
+                   for x, y, vx, vy, att in zip(v.x.tolist(), v.y.tolist(), v.vx.tolist(),
+                                                v.vy.tolist(), v.attached.tolist())]
+        a = self.antibodies
+        antibodies = [Antibody(x=x, y=y, vx=vx, vy=vy, flash=fl)
+                      for x, y, vx, vy, fl in zip(a.x.tolist(), a.y.tolist(), a.vx.tolist(),
+                                                  a.vy.tolist(), a.flash.tolist())]
+        w = self.leukocytes
+        leukocytes = [Leukocyte(x=x, y=y, vx=vx, vy=vy)
+                      for x, y, vx, vy in zip(w.x.tolist(), w.y.tolist(), w.vx.tolist(), w.vy.tolist())]
+        return cells, viruses, antibodies, leukocytes
+
+    def run(self, seconds: float, dt: float = S.SIM_DT) -> int:
+        steps = 0
+        end_time = self.elapsed_time + seconds
+        while self.elapsed_time < end_time - 1e-9:
+            self.animate_step(dt)
+            steps += 1
+        return steps
+
+    # ---------- 连续动画步 ----------
+    def animate_step(self, dt: float):
+        prof = self.profiler
+        t = prof.start()
+        self.tick += 1
+        self.elapsed_time += dt
+        self.ca_accum += dt
+        ca_due = self.ca_accum >= S.CA_INTERVAL
+        if ca_due:
+            self.ca_accum %= S.CA_INTERVAL
+        t = self.advance(dt, ca_due, t)
+        self.record_history()
+        prof.lap("history", t)
+
+    def advance(self, dt: float, ca_due: bool, t: float) -> float:
+        # 一步里除时钟推进和记录历史以外的全部阶段（t 是计时起点，返回最后一段的终点）。
+        # 分块并行时每个块各自跑这一段
+        prof = self.profiler
+
+        # CA决策步
+        if ca_due:
+            self.ca_step()
+        t = prof.lap("ca_step", t)
+
+        # 连续移动：细胞
+        self.move_cells(dt)
+        t = prof.lap("move_cells", t)
+
+        # 细胞成长与分裂
+        self.cell_growth_and_division(dt)
+        t = prof.lap("growth", t)
+
+        # 细胞互相推开（新生的子细胞也在里面）
+        self.resolve_cell_overlaps()
+        t = prof.lap("overlaps", t)
+
+        # 连续移动：病毒 / 抗体 / 白细胞
+        self.move_agents(self.viruses, dt, S.VIRUS_R)
+        flash = self.antibodies.flash
+        flash[flash > 0] -= 1
+        self.move_agents(self.antibodies, dt, S.AB_R_FOR_COLLISION)
+        self.move_agents(self.leukocytes, dt, S.LEUKOCYTE_R)
+        t = prof.lap("move_agents", t)
+
+        self.infection_step(dt)
+        t = prof.lap("infection", t)
+        self.capture_check()
+        t = prof.lap("capture", t)
+        self.leukocyte_cleanup()
+        return prof.lap("cleanup", t)
+
+    def acting(self, sa: SpeciesArrays) -> np.ndarray:
+        # 本步可以主动发起接触（感染、捕获、清理）的个体下标：整体模拟里是全部个体
+        return np.arange(len(sa))
+
+    # 以下几个钩子在单个世界里都是平凡的，多世界批量模拟按位置区分各世界
+    def centers(self, x: np.ndarray, y: np.ndarray):
+        # 位于 (x, y) 的个体所在大圆的圆心；None 表示画布中心
+        return None
+
+    def nearest(self, ax: np.ndarray, ay: np.ndarray, bx: np.ndarray, by: np.ndarray,
+                max_reach: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return nearest_neighbor(ax, ay, bx, by, max_reach)
+
+    def tally(self, name: str, x: np.ndarray, y: np.ndarray) -> None:
+        # 计数器（infected_count / burst_count / captured）加上位于 (x, y) 的这些事件
+        setattr(self, name, getattr(self, name) + len(x))
+
+    def move_cells(self, dt: float) -> None:
+        c = self.cells
+        if len(c) == 0:
+            return
+        alive = c.state != DEAD
+        attached = c.antibody_attached
+        speed_factor = np.where(
+            attached > 0,
+            np.maximum(0.3, S.CELL_ATTACHED_SPEED_FACTOR - attached * S.CELL_ATTACHED_SPEED_DECAY),
+            1.0,
+        )
+        speed_factor[~alive] = 1.0
+        step = np.where(alive, dt, 0.0)
+        x, y, vx, vy = c.x, c.y, c.vx, c.vy
+        x += vx * step
+        y += vy * step
+        vx *= speed_factor
+        vy *= speed_factor
+        reflect_off_circle_arrays(x, y, vx, vy, c.r, mask=alive, center=self.centers(x, y))
+
+    def resolve_cell_overlaps(self) -> None:
+        # 细胞互相推开（位置式 Jacobi，与对象引擎的 resolve_cell_overlaps 相同）：粗筛一次收集配对，
+        # 最多迭代 OVERLAP_ITERATIONS 轮，每轮对所有重叠对同时修正（两边各让一半，多对取平均）；
+        # 速度按总位移一次性修正，剩余的最大重叠记在 overlap_residual
+        c = self.cells
+        self.overlap_residual = 0.0
+        alive = np.flatnonzero(c.state != DEAD)
+        if len(alive) < 2:
+            return
+        x, y, r = c.x[alive], c.y[alive], c.r[alive]
+        skin = 0.5 * S.CELL_R_SMALL
+        ia, ib, d2 = neighbor_pairs(x, y, x, y, 2 * max(S.CELL_R_SMALL, S.CELL_R_LARGE) + skin)
+        min_d = r[ia] + r[ib]
+        near = (ia < ib) & (d2 < (min_d + skin) ** 2)
+        ia, ib, d2, min_d = ia[near], ib[near], d2[near], min_d[near]
+        if len(ia) == 0:
+            return
+        # 完全重合的对预先抽一个随机推开方向，迭代中一直沿用
+        fx = np.zeros(len(ia))
+        fy = np.zeros(len(ia))
+        same = d2 < 1e-18
+        if same.any():
+            ang = self.gen.motion.random(int(np.count_nonzero(same))) * 2 * math.pi
+            fx[same] = np.cos(ang)
+            fy[same] = np.sin(ang)
+        n = len(alive)
+        px, py = x.copy(), y.copy()
+        for it in range(S.OVERLAP_ITERATIONS + 1):
+            dx = px[ia] - px[ib]
+            dy = py[ia] - py[ib]
+            d = np.hypot(dx, dy)
+            overlap = np.maximum(min_d - d, 0.0)
+            hit = overlap > 0
+            self.overlap_residual = float(overlap.max())
+            if it == S.OVERLAP_ITERATIONS or not hit.any():
+                break
+            apart = d > 1e-9
+            safe = np.where(apart, d, 1.0)
+            half = 0.5 * overlap
+            sx = np.where(apart, dx / safe, fx) * half
+            sy = np.where(apart, dy / safe, fy) * half
+            count = np.bincount(ia[hit], minlength=n) + np.bincount(ib[hit], minlength=n)
+            count = np.maximum(count, 1)
+            px += (np.bincount(ia, sx, n) - np.bincount(ib, sx, n)) / count
+            py += (np.bincount(ia, sy, n) - np.bincount(ib, sy, n)) / count
+        c.x[alive] = px
+        c.y[alive] = py
+        c.vx[alive] -= (px - x) * S.OVERLAP_VELOCITY_RATIO
+        c.vy[alive] -= (py - y) * S.OVERLAP_VELOCITY_RATIO
+
+    def move_agents(self, sa: SpeciesArrays, dt: float, r_obj: float) -> None:
+        if len(sa) == 0:
+            return
+        x, y, vx, vy = sa.x, sa.y, sa.vx, sa.vy
+        x += vx * dt
+        y += vy * dt
+        reflect_off_circle_arrays(x, y, vx, vy, r_obj, center=self.centers(x, y))
+        self.push_out_of_cells(sa, r_obj)
+
+    def push_out_of_cells(self, sa: SpeciesArrays, r_obj: float) -> None:
+        # healthy/infected 细胞作为障碍物；每个个体按下标最小的重叠细胞推开
+        c = self.cells
+        live = np.flatnonzero(c.state != DEAD)
+        if len(live) == 0 or len(sa) == 0:
+            return
+        cx, cy, cr = c.x[live], c.y[live], c.r[live]
+        reach = r_obj + max(S.CELL_R_SMALL, S.CELL_R_LARGE)
+        x, y, vx, vy = sa.x, sa.y, sa.vx, sa.vy
+        ia, ib, d2 = neighbor_pairs(x, y, cx, cy, reach)
+        min_d = cr[ib] + r_obj
+        hit = d2 < min_d * min_d
+        ia, ib, d2, min_d = ia[hit], ib[hit], d2[hit], min_d[hit]
+        if len(ia) == 0:
+            return
+        first = first_per_group(ia)
+        ia, ib, d2, min_d = ia[first], ib[first], d2[first], min_d[first]
+        d = np.sqrt(d2)
+        apart = d > 1e-9
+        nx = np.empty_like(d)
+        ny = np.empty_like(d)
+        nx[apart] = (x[ia[apart]] - cx[ib[apart]]) / d[apart]
+        ny[apart] = (y[ia[apart]] - cy[ib[apart]]) / d[apart]
+        if (~apart).any():
+            ang = self.gen.motion.random(int(np.count_nonzero(~apart))) * 2 * math.pi
+            nx[~apart] = np.cos(ang)
+            ny[~apart] = np.sin(ang)
+        x[ia] = cx[ib] + nx * min_d
+        y[ia] = cy[ib] + ny * min_d
+        dot = np.where(apart, vx[ia] * nx + vy[ia] * ny, 0.0)
+        vx[ia] -= 1.8 * dot * nx
+        vy[ia] -= 1.8 * dot * ny
+
+    def record_history(self):
+        live_cells = int(np.count_nonzero(self.cells.state != DEAD))
+        self.history.append((self.elapsed_time, len(self.leukocytes), live_cells,
+                             len(self.viruses), len(self.antibodies)))
+        if self.metrics is not None:
+            self.metrics.record(self)
+
+    def attach_metrics(self, recorder) -> None:
+        self.metrics = recorder
+        if recorder is not None:
+            recorder.record(self)
+
+    # ---------- CA决策步：只更新“速度方向”（整组批量计算） ----------
+    def ca_step(self):
+        rng = self.gen.motion
+        quantize = self.direction_table.quantize
+        c, v = self.cells, self.viruses
+
+        # 细胞：慢速、无目的乱动
+        alive = np.flatnonzero(c.state != DEAD)
+        if len(alive):
+            ang = rng.random(len(alive)) * 2 * math.pi
+            _, ddx, ddy = quantize(np.cos(ang), np.sin(ang))
+            self._steer(c, ddx * S.CELL_SPEED, ddy * S.CELL_SPEED, alive)
+
+        # 病毒：随机游走 + 轻微向最近“未死亡细胞”靠近 + 远离白细胞
+        n = len(v)
+        if n:
+            ang = rng.random(n) * 2 * math.pi
+            rx, ry = np.cos(ang), np.sin(ang)
+            cux = np.zeros(n)
+            cuy = np.zeros(n)
+            free = np.flatnonzero(v.attached <= 0)
+            if len(alive) and len(free):
+                lx, ly = c.x[alive], c.y[alive]
+                idx, _ = self.nearest(v.x[free], v.y[free], lx, ly)
+                near, idx = free[idx >= 0], idx[idx >= 0]
+                cux[near], cuy[near] = unit_vectors(lx[idx] - v.x[near], ly[idx] - v.y[near])
+            wux = np.zeros(n)
+            wuy = np.zeros(n)
+            w = self.leukocytes
+            if len(w):
+                idx, _ = self.nearest(v.x, v.y, w.x, w.y)
+                near = np.flatnonzero(idx >= 0)
+                wux[near], wuy[near] = unit_vectors(v.x[near] - w.x[idx[near]], v.y[near] - w.y[idx[near]])
+
+            att = v.attached
+            avoid_strength = S.VIRUS_AVOID_LEUKOCYTE * (1.0 + att * S.VIRUS_ATTACHED_AVOID_SCALE)
+            base = np.maximum(0.0, 1.0 - S.VIRUS_ATTRACT_CELL - avoid_strength)
+            tx = base * rx + S.VIRUS_ATTRACT_CELL * cux + avoid_strength * wux
+            ty = base * ry + S.VIRUS_ATTRACT_CELL * cuy + avoid_strength * wuy
+            _, ddx, ddy = quantize(tx, ty)
+            speed = S.VIRUS_SPEED * np.maximum(0.2, S.VIRUS_ATTACHED_SPEED_FACTOR
+                                               - att * S.VIRUS_ATTACHED_SPEED_DECAY)
+            self._steer(v, ddx * speed, ddy * speed)
+
+        # 抗体：感知半径内找最近未附着病毒，否则随机
+        free = v.attached == 0
+        self._chase(self.antibodies, v.x[free], v.y[free], S.AB_SENSE_RADIUS, S.AB_CHASE, S.AB_SPEED)
+
+        # 白细胞：追踪被标记目标（附着病毒/感染细胞/死亡细胞），病毒在前、细胞在后
+        bound = v.attached > 0
+        marked = (c.state != HEALTHY) | (c.antibody_attached > 0)
+        self._chase(self.leukocytes,
+                    np.concatenate((v.x[bound], c.x[marked])),
+                    np.concatenate((v.y[bound], c.y[marked])),
+                    S.LEUKOCYTE_SENSE_RADIUS, S.LEUKOCYTE_CHASE, S.LEUKOCYTE_SPEED)
+
+    def _chase(self, sa: SpeciesArrays, px: np.ndarray, py: np.ndarray, sense: float,
+               chase: float, speed: float) -> None:
+        n = len(sa)
+        if n == 0:
+            return
+        ang = self.gen.motion.random(n) * 2 * math.pi
+        tx, ty = np.cos(ang), np.sin(ang)
+        idx, _ = self.nearest(sa.x, sa.y, px, py, max_reach=sense)
+        found = np.flatnonzero(idx >= 0)
+        if len(found):
+            tux, tuy = unit_vectors(px[idx[found]] - sa.x[found], py[idx[found]] - sa.y[found])
+            tx[found] = chase * tux + (1.0 - chase) * tx[found]
+            ty[found] = chase * tuy + (1.0 - chase) * ty[found]
+        _, ddx, ddy = self.direction_table.quantize(tx, ty)
+        self._steer(sa, ddx * speed, ddy * speed)
+
+    def _steer(self, sa: SpeciesArrays, nvx: np.ndarray, nvy: np.ndarray, index=None) -> None:
+        smooth = S.TURN_SMOOTH
+        if index is None:
+            index = slice(None)
+        sa.vx[index] = (1.0 - smooth) * sa.vx[index] + smooth * nvx
+        sa.vy[index] = (1.0 - smooth) * sa.vy[index] + smooth * nvy
+
+    def cell_growth_and_division(self, dt: float):
+        c = self.cells
+        if len(c) == 0:
+            return
+        # 计时都是绝对模拟时刻：不再逐帧递减，只比较到期与否；半径按出生时刻插值
+        now = self.elapsed_time
+        alive = c.state != DEAD
+        large = S.CELL_R_LARGE
+        r, born, divide_at = c.r, c.born, c.divide_at
+
+        # 还没排定分裂时刻的就是仍在长大的细胞
+        growing = alive & np.isnan(divide_at)
+        if S.CELL_GROW_TIME <= 0:
+            r[growing] = large
+            need = growing
+        else:
+            age = now - born[growing]
+            progress = np.minimum(1.0, age / S.CELL_GROW_TIME)
+            r[growing] = S.CELL_R_SMALL + (large - S.CELL_R_SMALL) * progress
+            need = growing.copy()
+            need[growing] = age >= S.CELL_GROW_TIME - TIME_EPS
+        if need.any():
+            divide_at[need] = now + self.gen.growth.uniform(S.CELL_DIVIDE_TIME_MIN, S.CELL_DIVIDE_TIME_MAX,
+                                                            int(np.count_nonzero(need)))
+
+        dividing = (c.state == HEALTHY) & (divide_at <= now + TIME_EPS)
+        if not dividing.any():
+            return
+
+        # 分裂：父细胞消失，两个小细胞沿随机方向对称出现在末尾
+        px, py, pr = c.x[dividing], c.y[dividing], r[dividing]
+        k = len(px)
+        ang = self.gen.growth.random(k) * 2 * math.pi
+        offset = np.maximum(S.CELL_R_SMALL + 2, pr * 0.6)
+        dx = np.cos(ang) * offset
+        dy = np.sin(ang) * offset
+        kx = np.column_stack((px + dx, px - dx)).ravel()
+        ky = np.column_stack((py + dy, py - dy)).ravel()
+        clamp_into_circle(kx, ky, S.CELL_R_SMALL, self.centers(kx, ky))
+        ang_v = self.gen.growth.random(2 * k) * 2 * math.pi
+        c.keep(~dividing)
+        c.extend(x=kx, y=ky,
+                 vx=S.CELL_SPEED * np.cos(ang_v), vy=S.CELL_SPEED * np.sin(ang_v),
+                 r=np.full(2 * k, S.CELL_R_SMALL, dtype=np.float64),
+                 state=np.full(2 * k, HEALTHY, dtype=np.int8),
+                 born=np.full(2 * k, now))
+
+    # ---------- 感染/爆发 ----------
+    def infection_step(self, dt: float):
+        c, v = self.cells, self.viruses
+        if len(c) == 0:
+            return
+
+        # 1) 病毒贴到健康细胞 -> 感染；每个病毒找列表里第一个仍健康的细胞
+        act = self.acting(v)
+        free = act[v.attached[act] <= 0]
+        healthy = np.flatnonzero(c.state == HEALTHY)
+        if len(free) and len(healthy):
+            reach = max(S.CELL_R_SMALL, S.CELL_R_LARGE) + S.VIRUS_R + S.INFECTION_PADDING
+            ia, ib, d2 = neighbor_pairs(v.x[free], v.y[free], c.x[healthy], c.y[healthy], reach)
+            dist = c.r[healthy[ib]] + S.VIRUS_R + S.INFECTION_PADDING
+            hit = d2 <= dist * dist
+            ia, ib = ia[hit], ib[hit]
+            if len(ia):
+                infected_cells = set()
+                consumed = []
+                last = -1
+                # 只在真正接触的少数配对上按顺序结算，保持“先到先得”
+                for vi, cj in zip(ia.tolist(), ib.tolist()):
+                    if vi == last or cj in infected_cells:
+                        continue
+                    infected_cells.add(cj)
+                    consumed.append(vi)
+                    last = vi
+                cells_idx = healthy[np.fromiter(infected_cells, dtype=np.int64)]
+                c.state[cells_idx] = INFECTED
+                c.burst_at[cells_idx] = self.elapsed_time + S.VIRUS_REPLICATION_TIME
+                self.tally("infected_count", c.x[cells_idx], c.y[cells_idx])
+                keep = np.ones(len(v), dtype=bool)
+                keep[free[consumed]] = False
+                v.keep(keep)
+
+        # 2) 到期的感染细胞 -> 破裂爆发
+        bursting = (c.state == INFECTED) & (c.burst_at <= self.elapsed_time + TIME_EPS)
+        if not bursting.any():
+            return
+        self.tally("burst_count", c.x[bursting], c.y[bursting])
+        c.state[bursting] = DEAD
+        c.antibody_attached[bursting] = 0
+
+        denom = S.CELL_R_LARGE - S.CELL_R_SMALL
+        br = c.r[bursting]
+        if denom <= 0:
+            ratio = np.ones_like(br)
+        else:
+            ratio = np.clip((br - S.CELL_R_SMALL) / denom, 0.0, 1.0)
+        counts = np.round(S.BURST_VIRUS_COUNT_SMALL
+                          + (S.BURST_VIRUS_COUNT_LARGE - S.BURST_VIRUS_COUNT_SMALL) * ratio).astype(np.int64)
+        total = int(counts.sum())
+        if total <= 0:
+            return
+        src = np.repeat(np.flatnonzero(bursting), counts)
+        ang = self.gen.infection.random(total) * 2 * math.pi
+        rr = c.r[src] + S.VIRUS_R + self.gen.infection.random(total) * 6.0
+        x = c.x[src] + rr * np.cos(ang)
+        y = c.y[src] + rr * np.sin(ang)
+        clamp_into_circle(x, y, S.VIRUS_R, self.centers(x, y))
+        sp = S.VIRUS_SPEED * (0.9 + self.gen.infection.random(total) * 0.5)
+        v.extend(x=x, y=y, vx=sp * np.cos(ang), vy=sp * np.sin(ang))
+
+    # ---------- 抗体捕获 ----------
+    def capture_check(self):
+        a, v, c = self.antibodies, self.viruses, self.cells
+        if len(a) == 0 or (len(v) == 0 and len(c) == 0):
+            return
+        caught = np.zeros(len(a), dtype=bool)
+        act = self.acting(a)
+
+        # 先找病毒（每个抗体取下标最小的那个）
+        ia, ib, _ = neighbor_pairs(a.x[act], a.y[act], v.x, v.y, S.CAPTURE_DIST)
+        if len(ia):
+            first = first_per_group(ia)
+            ia, ib = ia[first], ib[first]
+            np.add.at(v.attached, ib, 1)
+            caught[act[ia]] = True
+            self.tally("captured", a.x[act[ia]], a.y[act[ia]])
+
+        # 没抓到病毒的再找感染细胞
+        rest = act[~caught[act]]
+        infected = np.flatnonzero(c.state == INFECTED)
+        if len(rest) and len(infected):
+            ia, ib, _ = neighbor_pairs(a.x[rest], a.y[rest], c.x[infected], c.y[infected], S.CAPTURE_DIST)
+            if len(ia):
+                first = first_per_group(ia)
+                ia, ib = ia[first], ib[first]
+                np.add.at(c.antibody_attached, infected[ib], 1)
+                caught[rest[ia]] = True
+
+        if caught.any():
+            a.keep(~caught)
+
+    def _spawn_antibodies(self, x: np.ndarray, y: np.ndarray) -> None:
+        # 每个清理点各生成 AB_SPAWN_MIN..AB_SPAWN_MAX 个抗体
+        if len(x) == 0:
+            return
+        counts = self.gen.immune.integers(S.AB_SPAWN_MIN, S.AB_SPAWN_MAX + 1, len(x))
+        counts = np.maximum(counts, 0)
+        total = int(counts.sum())
+        if total == 0:
+            return
+        sx = np.repeat(x, counts)
+        sy = np.repeat(y, counts)
+        ang = self.gen.immune.random(total) * 2 * math.pi
+        rr = 6 + self.gen.immune.random(total) * 8
+        px = sx + rr * np.cos(ang)
+        py = sy + rr * np.sin(ang)
+        clamp_into_circle(px, py, S.AB_R_FOR_COLLISION, self.centers(px, py))
+        ang_v = self.gen.immune.random(total) * 2 * math.pi
+        self.antibodies.extend(x=px, y=py, vx=S.AB_SPEED * np.cos(ang_v), vy=S.AB_SPEED * np.sin(ang_v))
+
+    def leukocyte_cleanup(self):
+        w, v, c = self.leukocytes, self.viruses, self.cells
+        if len(w) == 0:
+            return
+
+        act = self.acting(w)
+        wx, wy = w.x[act], w.y[act]
+        _, vb, _ = neighbor_pairs(wx, wy, v.x, v.y, S.LEUKOCYTE_R + S.VIRUS_R)
+        virus_removed = np.unique(vb)
+
+        marked = np.flatnonzero((c.state == DEAD) | (c.state == INFECTED))
+        cell_removed = np.empty(0, dtype=np.int64)
+        if len(marked):
+            reach = S.LEUKOCYTE_R + max(S.CELL_R_SMALL, S.CELL_R_LARGE)
+            _, cb, d2 = neighbor_pairs(wx, wy, c.x[marked], c.y[marked], reach)
+            lim = S.LEUKOCYTE_R + c.r[marked[cb]]
+            cell_removed = np.unique(marked[cb[d2 <= lim * lim]])
+
+        self._spawn_antibodies(np.concatenate((v.x[virus_removed], c.x[cell_removed])),
+                               np.concatenate((v.y[virus_removed], c.y[cell_removed])))
+        if len(virus_removed):
+            keep = np.ones(len(v), dtype=bool)
+            keep[virus_removed] = False
+            v.keep(keep)
+        if len(cell_removed):
+            keep = np.ones(len(c), dtype=bool)
+            keep[cell_removed] = False
+            c.keep(keep)
@@ -0,0 +1,220 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import simulation as S
+from array_sim import DEAD, ArraySimulation, nearest_neighbor
+from history import HISTORY_FIELDS, History
+
+COUNTERS = ("infected_count", "burst_count", "captured")
+
+
+def world_pitch() -> float:
+    # 相邻两个世界圆心的距离。两圆之间至少隔一个直径：不限距离的最近邻查询里，本世界的目标
+    # （最远一个直径）总比别的世界的近；同时大于各感知半径，限距查询和接触粗筛都碰不到别的世界
+    gap = max(2 * S.RADIUS, S.LEUKOCYTE_SENSE_RADIUS, S.AB_SENSE_RADIUS) + 2 * S.CELL_R_LARGE
+    return 2 * S.RADIUS + gap
+
+
+# ---------- K 个世界的 history：共用时间轴，计数列是 (条数, K) ----------
+class BatchHistory:
+    # 容量与模式的含义与 History 相同（decimate 两两合并、ring 只留最近、all 不限），
+    # world(k) 取出第 k 个世界的 History，可直接交给 write_history_csv / sweep.summarize
+    def __init__(self, worlds: int, capacity: int = 0, mode: str = "decimate"):
+        # 借 History 校验参数、取规整后的容量
+        probe = History(capacity, mode)
+        self.worlds = worlds
+        self.capacity = probe.capacity
+        self.mode = mode
+        self.clear()
+
+    def clear(self) -> None:
+        rows = min(self.capacity, 64) if self.capacity else 64
+        self.times = np.empty(rows)
+        self.counts = np.empty((rows, len(HISTORY_FIELDS) - 1, self.worlds), dtype=np.int64)
+        self.n = 0
+        self.head = 0
+        self.stride = 1
+        self.seen = 0
+        self.peaks = np.full((len(HISTORY_FIELDS) - 1, self.worlds), np.iinfo(np.int64).min)
+        self.lows = np.full((len(HISTORY_FIELDS) - 1, self.worlds), np.iinfo(np.int64).max)
+        self.first_time = math.inf
+        self.last_time = -math.inf
+
+    def __len__(self) -> int:
+        return self.n
+
+    def append(self, time: float, counts: np.ndarray) -> None:
+        # counts: (列数, K)，列顺序同 HISTORY_FIELDS[1:]
+        np.maximum(self.peaks, counts, out=self.peaks)
+        np.minimum(self.lows, counts, out=self.lows)
+        self.first_time = min(self.first_time, time)
+        self.last_time = max(self.last_time, time)
+
+        n = self.n
+        if self.mode == "ring" and n >= self.capacity:
+            pos = self.head
+            self.head = (pos + 1) % self.capacity
+        elif self.mode == "decimate" and self.seen % self.stride:
+            pos = n - 1
+        else:
+            if self.mode == "decimate" and n >= self.capacity:
+                self._decimate()
+                n = self.n
+            if n == len(self.times):
+                self._grow()
+            pos = n
+            self.n = n + 1
+        self.times[pos] = time
+        self.counts[pos] = counts
+        self.seen += 1
+
+    def _grow(self) -> None:
+        rows = len(self.times) * 2
+        if self.capacity:
+            rows = min(rows, self.capacity)
+        times = np.empty(rows)
+        counts = np.empty((rows,) + self.counts.shape[1:], dtype=np.int64)
+        times[:self.n] = self.times[:self.n]
+        counts[:self.n] = self.counts[:self.n]
+        self.times, self.counts = times, counts
+
+    def _decimate(self) -> None:
+        keep = self.n // 2 * 2
+        half = keep // 2
+        self.times[:half] = self.times[1:keep:2]
+        self.counts[:half] = self.counts[1:keep:2]
+        self.n = half
+        self.stride *= 2
+
+    def world(self, k: int) -> History:
+        # 按 History 的内部布局原样拼出来（同 checkpoint 读档的做法），ring 的 head 也照搬
+        history = History(self.capacity, self.mode)
+        n = self.n
+        history.columns["time"].extend(self.times[:n].tolist())
+        for i, name in enumerate(HISTORY_FIELDS[1:]):
+            history.columns[name].extend(self.counts[:n, i, k].tolist())
+        history.head = self.head
+        history.stride = self.stride
+        history.seen = self.seen
+        history.peaks = [self.last_time] + self.peaks[:, k].tolist()
+        history.lows = [self.first_time] + self.lows[:, k].tolist()
+        return history
+
+    def column(self, name: str) -> np.ndarray:
+        # 按时间顺序返回一列：time 是 (条数,)，其余是 (条数, K)
+        order = np.r_[self.head:self.n, 0:self.head]
+        if name == "time":
+            return self.times[order]
+        return self.counts[order, HISTORY_FIELDS.index(name) - 1]
+
+
+class WorldView:
+    # 单个世界的结果视图：history 与各计数器，字段与单世界模拟同名（sweep.summarize 可直接用）
+    def __init__(self, history: History, counters: Dict[str, int], elapsed_time: float, tick: int):
+        self.history = history
+        self.elapsed_time = elapsed_time
+        self.tick = tick
+        for name, value in counters.items():
+            setattr(self, name, value)
+
+
+# ---------- 多世界批量模拟 ----------
+class BatchSimulation(ArraySimulation):
+    # K 个互不相干的世界放在同一组结构数组里，每个阶段对所有世界一次向量化完成。
+    # 世界 k 平铺在 ceil(sqrt(K)) 列的网格上（圆心相距 world_pitch()），世界号由位置算出：
+    # 彼此离得足够远，原有的网格粗筛/最近邻查询不会跨世界配对，边界反弹与出生点按各自的圆心处理，
+    # 计数器和 history 按世界号分桶。各世界共用时钟和随机流，所以单个世界的结果取决于 (种子, K)，
+    # 与单独跑 ArraySimulation 统计上等价，但不逐位相同；初始布局按世界号依次从 placement 流抽取
+    def __init__(self, worlds: int, seed: Optional[int] = None, history_capacity: Optional[int] = None):
+        if worlds < 1:
+            raise ValueError(f"worlds must be positive, got {worlds}")
+        self.worlds = worlds
+        self.grid_columns = math.ceil(math.sqrt(worlds))
+        self.history_capacity = history_capacity
+        self.pitch = world_pitch()
+        self.tallies = {name: np.zeros(worlds, dtype=np.int64) for name in COUNTERS}
+        super().__init__(seed)
+
+    def reset(self, seed: Optional[int] = None):
+        self.pitch = world_pitch()
+        for counts in self.tallies.values():
+            counts[:] = 0
+        super().reset(seed)
+
+    def make_history(self) -> BatchHistory:
+        # 没给 history_capacity 时与单世界后端一样用 HISTORY_CAPACITY（建 history 时读取，override_params 生效）
+        capacity = S.HISTORY_CAPACITY if self.history_capacity is None else self.history_capacity
+        return BatchHistory(self.worlds, capacity, S.HISTORY_MODE)
+
+    def initial_objects(self) -> Tuple[List[Any], List[Any], List[Any], List[Any]]:
+        merged: Tuple[List[Any], ...] = ([], [], [], [])
+        for k in range(self.worlds):
+            ox, oy = self.world_offset(k)
+            for group, items in zip(merged, S.initial_world(self.rng.placement, batch=True)):
+                for item in items:
+                    item.x += ox
+                    item.y += oy
+                group.extend(items)
+        return merged
+
+    def attach_metrics(self, recorder) -> None:
+        if recorder is not None:
+            raise ValueError("per-frame metrics are not supported for batched worlds; use world(k).history")
+
+    # ---------- 世界几何 ----------
+    def world_offset(self, k: int) -> Tuple[float, float]:
+        return (k % self.grid_columns) * self.pitch, (k // self.grid_columns) * self.pitch
+
+    def world_of(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        col = np.floor((x - S.CENTER) / self.pitch + 0.5).astype(np.int64)
+        row = np.floor((y - S.CENTER) / self.pitch + 0.5).astype(np.int64)
+        return row * self.grid_columns + col
+
+    def centers(self, x: np.ndarray, y: np.ndarray):
+        col = np.floor((x - S.CENTER) / self.pitch + 0.5)
+        row = np.floor((y - S.CENTER) / self.pitch + 0.5)
+        return S.CENTER + col * self.pitch, S.CENTER + row * self.pitch
+
+    def nearest(self, ax: np.ndarray, ay: np.ndarray, bx: np.ndarray, by: np.ndarray,
+                max_reach: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        # 本世界没有目标时，不限距离的查询会找到别的世界里去：这种结果当作没找到
+        idx, d2 = nearest_neighbor(ax, ay, bx, by, max_reach)
+        found = np.flatnonzero(idx >= 0)
+        if len(found):
+            target = idx[found]
+            foreign = found[self.world_of(ax[found], ay[found]) != self.world_of(bx[target], by[target])]
+            idx[foreign] = -1
+            d2[foreign] = np.inf
+        return idx, d2
+
+    def tally(self, name: str, x: np.ndarray, y: np.ndarray) -> None:
+        super().tally(name, x, y)
+        if len(x):
+            self.tallies[name] += np.bincount(self.world_of(x, y), minlength=self.worlds)
+
+    # ---------- 按世界统计 ----------
+    def world_counts(self) -> np.ndarray:
+        # (列数, K)：各世界的白细胞 / 存活细胞 / 病毒 / 抗体数
+        k = self.worlds
+        c = self.cells
+        live = c.state != DEAD
+        return np.stack([
+            np.bincount(self.world_of(self.leukocytes.x, self.leukocytes.y), minlength=k),
+            np.bincount(self.world_of(c.x[live], c.y[live]), minlength=k),
+            np.bincount(self.world_of(self.viruses.x, self.viruses.y), minlength=k),
+            np.bincount(self.world_of(self.antibodies.x, self.antibodies.y), minlength=k),
+        ])
+
+    def record_history(self):
+        self.history.append(self.elapsed_time, self.world_counts())
+
+    def world(self, k: int) -> WorldView:
+        if not 0 <= k < self.worlds:
+            raise ValueError(f"world index out of range: {k}")
+        counters = {name: int(counts[k]) for name, counts in self.tallies.items()}
+        return WorldView(self.history.world(k), counters, self.elapsed_time, self.tick)
+
+    def world_histories(self) -> List[History]:
+        return [self.history.world(k) for k in range(self.worlds)]
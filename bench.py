@@ -0,0 +1,259 @@
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import simulation as S
+from simulation import Antibody, Cell, Leukocyte, Simulation, Virus, override_params, rand_point_in_circle
+
+# 分阶段计时的方法（animate_step 内部按实例属性调用，包一层即可计时）；
+# burst_step / find_contacts 只有对象引擎有，numpy 后端的爆发和粗筛算在 infection_step 等里面
+PHASES = ("ca_step", "cell_growth_and_division", "resolve_cell_overlaps", "burst_step",
+          "find_contacts", "infection_step", "capture_check", "leukocyte_cleanup")
+
+
+# ---------- 按规模构造世界（不做无重叠拒绝采样，任意规模都能放下） ----------
+def scaled_world(n: int, rng) -> tuple:
+    # 细胞/病毒/抗体各 n 个，白细胞按 1% 配（至少保留默认数量）；
+    # 细胞混入感染/死亡状态，让感染爆发、捕获、清理各条路径都有事可做
+    cells: List[Cell] = []
+    for _ in range(n):
+        x, y = rand_point_in_circle(S.RADIUS, margin=S.CELL_R_LARGE, rng=rng)
+        ang = rng.random() * 2 * math.pi
+        roll = rng.random()
+        if roll < 0.1:
+            state, burst = "infected", rng.uniform(0.0, S.VIRUS_REPLICATION_TIME)  # 新建世界从 0 时刻开始
+        elif roll < 0.15:
+            state, burst = "dead", 0.0
+        else:
+            state, burst = "healthy", 0.0
+        cells.append(Cell(x=x, y=y, vx=S.CELL_SPEED * math.cos(ang), vy=S.CELL_SPEED * math.sin(ang),
+                          r=S.CELL_R_LARGE, state=state, burst_at=burst,
+                          divide_at=rng.uniform(S.CELL_DIVIDE_TIME_MIN, S.CELL_DIVIDE_TIME_MAX)))
+
+    def agents(cls, count: int, speed: float, margin: float) -> list:
+        out = []
+        for _ in range(count):
+            x, y = rand_point_in_circle(S.RADIUS, margin=margin, rng=rng)
+            ang = rng.random() * 2 * math.pi
+            out.append(cls(x=x, y=y, vx=speed * math.cos(ang), vy=speed * math.sin(ang)))
+        return out
+
+    viruses = agents(Virus, n, S.VIRUS_SPEED, S.VIRUS_R)
+    antibodies = agents(Antibody, n, S.AB_SPEED, S.AB_R_FOR_COLLISION)
+    leukocytes = agents(Leukocyte, max(S.N_LEUKOCYTES, n // 100), S.LEUKOCYTE_SPEED, S.LEUKOCYTE_R)
+    return cells, viruses, antibodies, leukocytes
+
+
+def make_world(backend: str, n: int, seed: int, workers: Optional[int] = None):
+    if backend == "parallel":
+        from parallel_sim import ParallelSimulation
+        sim = ParallelSimulation(seed, workers)
+    elif backend == "numpy":
+        from array_sim import ArraySimulation
+        sim = ArraySimulation(seed)
+    else:
+        sim = Simulation(seed)
+    try:
+        sim.load_objects(*scaled_world(n, sim.rng.placement))
+    except BaseException:
+        if backend == "parallel":
+            sim.close()
+        raise
+    sim.history.clear()
+    sim.record_history()
+    return sim
+
+
+# ---------- 计时 ----------
+def _instrument(sim, samples: Dict[str, List[float]]) -> None:
+    clock = time.perf_counter
+    for name in PHASES:
+        method = getattr(sim, name, None)
+        if method is None:
+            continue
+        bucket = samples[name]
+
+        def timed(*args, _method=method, _bucket=bucket):
+            start = clock()
+            result = _method(*args)
+            _bucket.append(clock() - start)
+            return result
+
+        setattr(sim, name, timed)
+
+
+def _summary(values: Sequence[float]) -> Dict[str, Any]:
+    if not values:
+        return {"calls": 0, "mean_ms": None, "p95_ms": None}
+    ordered = sorted(values)
+    p95 = ordered[min(len(ordered) - 1, int(math.ceil(0.95 * len(ordered))) - 1)]
+    return {"calls": len(values),
+            "mean_ms": round(1000.0 * sum(values) / len(values), 4),
+            "p95_ms": round(1000.0 * p95, 4)}
+
+
+def arena_radius(n: int, arena: str) -> float:
+    # scaled：大圆面积随规模放大，保持默认世界的细胞密度，测的是算法随数量的增长；
+    # fixed：大圆不变，规模越大越拥挤（10 万级会产生海量重叠对，内存占用很大）
+    if arena == "fixed":
+        return S.RADIUS
+    return S.RADIUS * math.sqrt(max(n, 1) / S.N_CELLS)
+
+
+def bench_size(backend: str, n: int, steps: int, warmup: int, dt: float, seed: int,
+               arena: str = "scaled", workers: Optional[int] = None) -> Dict[str, Any]:
+    radius = arena_radius(n, arena)
+    with override_params({"RADIUS": radius}):
+        return _bench_world(backend, n, steps, warmup, dt, seed, radius, workers)
+
+
+def _bench_world(backend: str, n: int, steps: int, warmup: int, dt: float, seed: int,
+                 radius: float, workers: Optional[int] = None) -> Dict[str, Any]:
+    sim = make_world(backend, n, seed, workers)
+    try:
+        entities = {"cells": len(sim.cells), "viruses": len(sim.viruses),
+                    "antibodies": len(sim.antibodies), "leukocytes": len(sim.leukocytes)}
+        for _ in range(warmup):
+            sim.animate_step(dt)
+
+        samples: Dict[str, List[float]] = {name: [] for name in PHASES}
+        _instrument(sim, samples)
+        totals: List[float] = []
+        rest: List[float] = []
+        clock = time.perf_counter
+        for _ in range(steps):
+            marks = [len(samples[name]) for name in PHASES]
+            start = clock()
+            sim.animate_step(dt)
+            elapsed = clock() - start
+            totals.append(elapsed)
+            # 运动/碰撞/历史记录等未单独计时的部分
+            inner = sum(sum(samples[name][mark:]) for name, mark in zip(PHASES, marks))
+            rest.append(elapsed - inner)
+
+        phases = {"animate_step": _summary(totals)}
+        phases.update({name: _summary(samples[name]) for name in PHASES})
+        phases["other"] = _summary(rest)
+    finally:
+        if backend == "parallel":
+            # 出错时也要关掉工作进程并释放共享内存
+            sim.close()
+    return {"size": n, "radius": round(radius, 3), "entities": entities, "phases": phases,
+            "overlap_residual": round(sim.overlap_residual, 3)}
+
+
+def scaling_exponents(results: List[Dict[str, Any]]) -> Dict[str, Optional[float]]:
+    # 对 log(平均耗时) ~ log(规模) 做最小二乘，斜率即复杂度指数（1 ≈ 线性，2 ≈ 平方）
+    exponents: Dict[str, Optional[float]] = {}
+    names = results[0]["phases"].keys() if results else ()
+    for name in names:
+        pts = [(math.log(r["size"]), math.log(r["phases"][name]["mean_ms"]))
+               for r in results if r["phases"][name]["mean_ms"]]
+        if len(pts) < 2:
+            exponents[name] = None
+            continue
+        mx = sum(p[0] for p in pts) / len(pts)
+        my = sum(p[1] for p in pts) / len(pts)
+        sxx = sum((p[0] - mx) ** 2 for p in pts)
+        sxy = sum((p[0] - mx) * (p[1] - my) for p in pts)
+        exponents[name] = round(sxy / sxx, 3) if sxx > 0 else None
+    return exponents
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_benchmark(backend: str, sizes: Sequence[int], steps: int = 20, warmup: int = 3,
+                  dt: float = S.SIM_DT, seed: int = 0, budget: float = 2.0,
+                  arena: str = "scaled", log=None, workers: Optional[int] = None) -> Dict[str, Any]:
+    results = []
+    for n in sizes:
+        result = bench_size(backend, n, steps, warmup, dt, seed, arena, workers)
+        results.append(result)
+        mean_ms = result["phases"]["animate_step"]["mean_ms"]
+        if log is not None:
+            print(f"[{backend}] n={n}: animate_step mean {mean_ms:.2f} ms, "
+                  f"p95 {result['phases']['animate_step']['p95_ms']:.2f} ms", file=log)
+        if mean_ms / 1000.0 > budget:
+            # 单步已超出预算：更大的规模只会更慢，不再继续
+            if log is not None:
+                print(f"[{backend}] step budget {budget}s exceeded, skipping larger sizes", file=log)
+            break
+    return {
+        "meta": {
+            "backend": backend, "workers": workers, "seed": seed, "steps": steps, "warmup": warmup, "dt": dt, "arena": arena,
+            "commit": _git_commit(), "python": platform.python_version(),
+            "platform": platform.platform(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+        "scaling": scaling_exponents(results),
+    }
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    names = ["animate_step", *PHASES, "other"]
+    base = {r["size"]: r for r in baseline["results"]} if baseline else {}
+    print(f"backend={report['meta']['backend']} commit={report['meta']['commit']}")
+    print(f"{'phase':<26}" + "".join(f"{r['size']:>14}" for r in report["results"]) + f"{'exp':>8}")
+    for name in names:
+        cells = []
+        for r in report["results"]:
+            mean_ms = r["phases"][name]["mean_ms"]
+            text = "-" if mean_ms is None else f"{mean_ms:.3f}"
+            old = base.get(r["size"], {}).get("phases", {}).get(name, {}).get("mean_ms")
+            if old and mean_ms:
+                text += f" x{old / mean_ms:.2f}"  # 相对基线的加速比
+            cells.append(f"{text:>14}")
+        exp = report["scaling"].get(name)
+        print(f"{name:<26}" + "".join(cells) + f"{'-' if exp is None else exp:>8}")
+    # 最后一步细胞推开后剩余的最大重叠（像素）
+    print(f"{'overlap_residual_px':<26}"
+          + "".join(f"{r.get('overlap_residual', '-'):>14}" for r in report["results"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按种群规模分阶段测量单步耗时")
+    parser.add_argument("--backend", choices=("objects", "numpy", "parallel"), default="objects")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parallel 后端的工作进程数（默认 CPU 核数）")
+    parser.add_argument("--sizes", default="100,300,1000,3000,10000,30000,100000",
+                        help="每个物种的个体数，逗号分隔")
+    parser.add_argument("--steps", type=int, default=20, help="每个规模计时的步数")
+    parser.add_argument("--warmup", type=int, default=3, help="计时前先跑的步数")
+    parser.add_argument("--dt", type=float, default=S.SIM_DT)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--budget", type=float, default=2.0,
+                        help="单步平均耗时超过这么多秒后不再测更大的规模")
+    parser.add_argument("--arena", choices=("scaled", "fixed"), default="scaled",
+                        help="scaled：大圆随规模放大保持密度（默认）；fixed：大圆固定，越大越拥挤")
+    parser.add_argument("--out", default=None, help="结果 JSON 路径")
+    parser.add_argument("--compare", default=None, help="与之前保存的 JSON 对比（显示加速比）")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    report = run_benchmark(args.backend, sizes, args.steps, args.warmup, args.dt, args.seed,
+                           args.budget, args.arena, log=sys.stderr, workers=args.workers)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
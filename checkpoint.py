@@ -0,0 +1,232 @@
+import json
+import math
+import struct
+import sys
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+import simulation
+from history import HISTORY_FIELDS, History
+from simulation import Antibody, Cell, Leukocyte, Simulation, Virus
+
+# 文件布局（小端）：
+#   MAGIC(8) | 版本 u32 | 头长度 u32 | 头 JSON | 数据块...
+# 头里的 "blocks" 按顺序列出每个数据块的 [名字, array 类型码, 元素个数]，数据块紧挨着拼接
+# 细胞计时存绝对模拟时刻（born/burst_at/divide_at）；只读当前版本，其他版本报错
+MAGIC = b"CABCKPT\0"
+VERSION = 2
+_PREFIX = struct.Struct("<8sII")
+
+STATE_NAMES = ("healthy", "infected", "dead")
+STATE_CODES = {name: code for code, name in enumerate(STATE_NAMES)}
+
+# 各物种写入的列：(字段名, array 类型码)；顺序与 dataclass 字段顺序一致
+_XYV = (("x", "d"), ("y", "d"), ("vx", "d"), ("vy", "d"))
+SPECIES = {
+    "cells": _XYV + (("r", "d"), ("state", "b"), ("born", "d"), ("burst_at", "d"),
+                     ("divide_at", "d"), ("antibody_attached", "i")),
+    "viruses": _XYV + (("attached", "i"),),
+    "antibodies": _XYV + (("flash", "i"),),
+    "leukocytes": _XYV,
+}
+_NUMPY_TYPES = {"d": "<f8", "b": "<i1", "i": "<i4", "I": "<u4", "q": "<i8"}
+
+
+def _le_bytes(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+# ---------- 按后端取出/写回物种列 ----------
+def _is_array_backend(sim) -> bool:
+    return not isinstance(sim.cells, list)
+
+
+def _check_supported(sim) -> None:
+    # 只支持单世界的对象/数组后端；批量模拟（BatchHistory 没有按列存的 columns）一开始就拒绝
+    history = getattr(sim, "history", None)
+    if getattr(history, "columns", None) is None:
+        raise TypeError(f"checkpoints do not support {type(sim).__name__} "
+                        f"(history {type(history).__name__} has no columns)")
+
+
+def _object_columns(name: str, items: List[Any]) -> Dict[str, array]:
+    columns = {}
+    for field, code in SPECIES[name]:
+        if field == "state":
+            values = [STATE_CODES[item.state] for item in items]
+        elif field == "divide_at":
+            values = [math.nan if item.divide_at is None else item.divide_at for item in items]
+        else:
+            values = [getattr(item, field) for item in items]
+        columns[field] = array(code, values)
+    return columns
+
+
+def _object_items(name: str, columns: Dict[str, array]) -> List[Any]:
+    cols = [columns[field].tolist() for field, _ in SPECIES[name]]
+    if name == "cells":
+        return [Cell(x, y, vx, vy, r, STATE_NAMES[state], born, burst,
+                     None if divide != divide else divide, attached)
+                for x, y, vx, vy, r, state, born, burst, divide, attached in zip(*cols)]
+    factory = {"viruses": Virus, "antibodies": Antibody, "leukocytes": Leukocyte}[name]
+    return [factory(*row) for row in zip(*cols)]
+
+
+# ---------- 快照 ----------
+def snapshot(sim) -> bytes:
+    _check_supported(sim)
+    blocks: List[Tuple[str, str, bytes, int]] = []
+
+    def add(name: str, typecode: str, data: bytes, count: int) -> None:
+        blocks.append((name, typecode, data, count))
+
+    array_backend = _is_array_backend(sim)
+    for species in SPECIES:
+        group = getattr(sim, species)
+        if array_backend:
+            import numpy as np
+
+            # 数组后端：列本身就是连续内存，直接按小端类型取字节
+            for field, code in SPECIES[species]:
+                col = np.ascontiguousarray(getattr(group, field), dtype=_NUMPY_TYPES[code])
+                add(f"{species}.{field}", code, col.tobytes(), len(col))
+        else:
+            for field, col in _object_columns(species, group).items():
+                add(f"{species}.{field}", col.typecode, _le_bytes(col), len(col))
+
+    history = sim.history
+    for name in HISTORY_FIELDS:
+        col = history.columns[name]
+        add(f"history.{name}", col.typecode, _le_bytes(col), len(col))
+
+    rng_meta = {}
+    for name, stream in sim.rng.streams().items():
+        version, words, gauss = stream.getstate()
+        rng_meta[name] = {"version": version, "gauss": gauss}
+        col = array("I", words)
+        add(f"rng.{name}", "I", _le_bytes(col), len(col))
+
+    header = {
+        "version": VERSION,
+        "backend": "numpy" if array_backend else "objects",
+        "tick": sim.tick,
+        "elapsed_time": sim.elapsed_time,
+        "ca_accum": sim.ca_accum,
+        "captured": sim.captured,
+        "infected_count": sim.infected_count,
+        "burst_count": sim.burst_count,
+        "seed": sim.rng.seed,
+        "rng": rng_meta,
+        "history": {"capacity": history.capacity, "mode": history.mode, "head": history.head,
+                    "stride": history.stride, "seen": history.seen,
+                    "peaks": history.peaks, "lows": history.lows},
+        # 仅作记录，恢复时不会改动当前参数
+        "params": {name: getattr(simulation, name) for name in simulation.param_names()},
+        "blocks": [[name, code, count] for name, code, _, count in blocks],
+    }
+    if array_backend:
+        header["array_rng"] = sim.gen.getstate()
+    head = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return b"".join([_PREFIX.pack(MAGIC, VERSION, len(head)), head] + [data for _, _, data, _ in blocks])
+
+
+def read_header(data: bytes) -> Tuple[Dict[str, Any], Dict[str, memoryview]]:
+    if len(data) < _PREFIX.size:
+        raise ValueError("not a checkpoint: file too short")
+    magic, version, head_len = _PREFIX.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a checkpoint: bad magic")
+    if version != VERSION:
+        raise ValueError(f"unsupported checkpoint version {version} (supported: {VERSION})")
+    start = _PREFIX.size
+    header = json.loads(bytes(data[start:start + head_len]).decode("utf-8"))
+    view = memoryview(data)
+    offset = start + head_len
+    blobs = {}
+    for name, code, count in header["blocks"]:
+        size = array(code).itemsize * count
+        if offset + size > len(data):
+            raise ValueError(f"truncated checkpoint: block {name} is incomplete")
+        blobs[name] = view[offset:offset + size]
+        offset += size
+    return header, blobs
+
+
+# ---------- 恢复 ----------
+def restore(sim, data: bytes) -> None:
+    _check_supported(sim)
+    header, blobs = read_header(data)
+
+    if _is_array_backend(sim):
+        import numpy as np
+
+        for species in SPECIES:
+            group = getattr(sim, species)
+            group.clear()
+            group.extend(**{field: np.frombuffer(blobs[f"{species}.{field}"], dtype=_NUMPY_TYPES[code])
+                            for field, code in SPECIES[species]})
+    else:
+        groups = []
+        for species in SPECIES:
+            columns = {field: _from_le(code, blobs[f"{species}.{field}"]) for field, code in SPECIES[species]}
+            groups.append(_object_items(species, columns))
+        sim.load_objects(*groups)
+
+    sim.tick = header["tick"]
+    sim.elapsed_time = header["elapsed_time"]
+    sim.ca_accum = header["ca_accum"]
+    sim.captured = header["captured"]
+    sim.infected_count = header["infected_count"]
+    sim.burst_count = header["burst_count"]
+
+    meta = header["history"]
+    history = History(meta["capacity"], meta["mode"])
+    for name in HISTORY_FIELDS:
+        history.columns[name].extend(_from_le("d" if name == "time" else "q", blobs[f"history.{name}"]))
+    history.head = meta["head"]
+    history.stride = meta["stride"]
+    history.seen = meta["seen"]
+    history.peaks = meta["peaks"]
+    history.lows = meta["lows"]
+    sim.history = history
+
+    # 先按存档种子重建随机流，再把每条流的内部状态接上
+    sim.reseed(header["seed"])
+    for name, stream in sim.rng.streams().items():
+        state = header["rng"][name]
+        words = _from_le("I", blobs[f"rng.{name}"])
+        stream.setstate((state["version"], tuple(words), state["gauss"]))
+    if _is_array_backend(sim) and "array_rng" in header:
+        sim.gen.setstate(header["array_rng"])
+
+
+def save_checkpoint(sim, path: str) -> None:
+    with open(path, "wb") as f:
+        f.write(snapshot(sim))
+
+
+def load_checkpoint(path: str, sim=None, backend: Optional[str] = None):
+    # sim 为空时按 backend（默认用存档时的后端）新建一个再恢复
+    with open(path, "rb") as f:
+        data = f.read()
+    if sim is None:
+        header, _ = read_header(data)
+        backend = backend or header["backend"]
+        if backend == "numpy":
+            from array_sim import ArraySimulation
+            sim = ArraySimulation(header["seed"])
+        else:
+            sim = Simulation(header["seed"])
+    restore(sim, data)
+    return sim
@@ -0,0 +1,71 @@
+import math
+from typing import List, Tuple
+
+
+# ---------- 离散方向量化（atan2 分扇区，O(1)） ----------
+def _unit(dx: float, dy: float) -> Tuple[float, float]:
+    # 与 simulation.unit_vec 完全一致（点积必须逐位相同才能保证并列时的选择一致）
+    d = math.hypot(dx, dy)
+    if d < 1e-9:
+        return 0.0, 0.0
+    return dx / d, dy / d
+
+
+class DirectionTable:
+    def __init__(self, count: int = 16):
+        if count < 1:
+            raise ValueError(f"direction count must be positive, got {count}")
+        self.count = count
+        self.step = 2 * math.pi / count
+        self.directions: List[Tuple[float, float]] = []
+        for k in range(count):
+            ang = 2 * math.pi * k / count
+            self.directions.append((math.cos(ang), math.sin(ang)))
+        # 每个扇区要复查的相邻三个方向（按下标升序，保证并列时取下标最小的）
+        self._neighbors = [tuple((j, self.directions[j]) for j in sorted({(k - 1) % count, k, (k + 1) % count}))
+                           for k in range(count)]
+        self._arrays = None
+
+    def index(self, dx: float, dy: float) -> int:
+        # 等价于对全部方向做点积取最大（并列取下标最小）：
+        # atan2 直接定位扇区，再用同样的点积表达式比较相邻的三个方向
+        ux, uy = _unit(dx, dy)
+        if ux == 0.0 and uy == 0.0:
+            return 0
+        k = int(round(math.atan2(uy, ux) / self.step)) % self.count
+        best = -1
+        best_dot = -1e9
+        for j, (vx, vy) in self._neighbors[k]:
+            dot = ux * vx + uy * vy
+            if dot > best_dot:
+                best_dot = dot
+                best = j
+        return best
+
+    def pick(self, dx: float, dy: float) -> Tuple[float, float]:
+        return self.directions[self.index(dx, dy)]
+
+    # ---------- 批量（numpy） ----------
+    def quantize(self, tx, ty):
+        # 返回 (扇区下标, 单位向量 x, 单位向量 y)，逐元素与 index/pick 相同
+        import numpy as np
+
+        if self._arrays is None:
+            table = np.asarray(self.directions, dtype=np.float64).reshape(-1, 2)
+            self._arrays = (table[:, 0].copy(), table[:, 1].copy())
+        cos_t, sin_t = self._arrays
+        tx = np.asarray(tx, dtype=np.float64)
+        ty = np.asarray(ty, dtype=np.float64)
+        d = np.hypot(tx, ty)
+        ok = d >= 1e-9
+        safe = np.where(ok, d, 1.0)
+        ux = np.where(ok, tx / safe, 0.0)
+        uy = np.where(ok, ty / safe, 0.0)
+        n = self.count
+
+        k0 = np.rint(np.arctan2(uy, ux) / self.step).astype(np.int64) % n
+        cand = np.sort(np.stack(((k0 - 1) % n, k0, (k0 + 1) % n), axis=1), axis=1)
+        dots = ux[:, None] * cos_t[cand] + uy[:, None] * sin_t[cand]
+        k = cand[np.arange(len(k0)), np.argmax(dots, axis=1)]
+        k = np.where(ok, k, 0)
+        return k, cos_t[k], sin_t[k]
@@ -0,0 +1,59 @@
+import heapq
+import itertools
+from typing import Any, Dict, List, Tuple
+
+# 判定“到期”时容许的误差：模拟时间由 dt 逐步累加，到期时刻可能比当前时刻多出几个 ulp
+TIME_EPS = 1e-9
+
+
+# ---------- 定时事件队列：按绝对模拟时刻排序的小根堆 ----------
+class EventQueue:
+    # 堆条目为 [时刻, 序号, 种类, 目标]；同一时刻按排入顺序触发。
+    # 每个 (种类, 目标) 最多一个待触发事件，重排/取消只把旧条目的目标置空，弹出时跳过
+    def __init__(self):
+        self.heap: List[list] = []
+        self.pending: Dict[Tuple[str, int], list] = {}
+        self.kinds: set = set()
+        self.counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def clear(self) -> None:
+        self.heap.clear()
+        self.pending.clear()
+
+    def schedule(self, time: float, kind: str, target: Any) -> None:
+        key = (kind, id(target))
+        old = self.pending.get(key)
+        if old is not None:
+            old[3] = None
+        entry = [time, next(self.counter), kind, target]
+        self.pending[key] = entry
+        self.kinds.add(kind)
+        heapq.heappush(self.heap, entry)
+
+    def cancel(self, target: Any) -> None:
+        for kind in self.kinds:
+            entry = self.pending.pop((kind, id(target)), None)
+            if entry is not None:
+                entry[3] = None
+
+    def next_time(self) -> float:
+        heap = self.heap
+        while heap and heap[0][3] is None:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else float("inf")
+
+    def pop_due(self, now: float) -> List[Tuple[float, str, Any]]:
+        # 取出所有不晚于 now 的事件（按时刻先后）；处理过程中新排入的事件留到下一次
+        heap = self.heap
+        limit = now + TIME_EPS
+        due = []
+        while heap and heap[0][0] <= limit:
+            time, _, kind, target = heapq.heappop(heap)
+            if target is None:
+                continue
+            del self.pending[(kind, id(target))]
+            due.append((time, kind, target))
+        return due
@@ -0,0 +1,126 @@
+from array import array
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+HISTORY_FIELDS = ("time", "leukocytes", "cells", "viruses", "antibodies")
+HISTORY_MODES = ("all", "ring", "decimate")
+
+Row = Tuple[float, int, int, int, int]
+
+
+# ---------- 列式历史记录：每列一个紧凑的 array，可选有界 ----------
+class History:
+    # mode:
+    #   all      —— 不限长度（每条约 24 字节，而不是一个元组的上百字节）
+    #   ring     —— 只保留最近 capacity 条
+    #   decimate —— 保留整段运行：存满后相邻两格合并成一格，采样间隔翻倍
+    def __init__(self, capacity: int = 0, mode: str = "decimate"):
+        if mode not in HISTORY_MODES:
+            raise ValueError(f"unknown history mode: {mode!r}")
+        if capacity < 0 or (mode != "all" and capacity < 2):
+            raise ValueError(f"history capacity must be at least 2, got {capacity}")
+        if mode == "decimate":
+            capacity -= capacity % 2  # 两两合并，容量取偶数
+        self.capacity = capacity if mode != "all" else 0
+        self.mode = mode
+        self.clear()
+
+    def clear(self) -> None:
+        self.columns: Dict[str, array] = {name: array("d" if name == "time" else "q") for name in HISTORY_FIELDS}
+        self._cols = tuple(self.columns[name] for name in HISTORY_FIELDS)
+        self.head = 0      # ring 模式下最旧一条的位置
+        self.stride = 1    # decimate 模式下每格代表的原始采样数
+        self.seen = 0      # 累计记录过的原始采样数
+        # 全程极值（不受丢弃/抽稀影响）
+        self.peaks = [float("-inf")] * len(HISTORY_FIELDS)
+        self.lows = [float("inf")] * len(HISTORY_FIELDS)
+
+    def append(self, row: Sequence[float]) -> None:
+        peaks, lows = self.peaks, self.lows
+        for i, value in enumerate(row):
+            if value > peaks[i]:
+                peaks[i] = value
+            if value < lows[i]:
+                lows[i] = value
+
+        cols = self._cols
+        n = len(cols[0])
+        if self.mode == "ring" and n >= self.capacity:
+            pos = self.head
+            for col, value in zip(cols, row):
+                col[pos] = value
+            self.head = (pos + 1) % self.capacity
+        elif self.mode == "decimate" and self.seen % self.stride:
+            # 同一格内：只保留这一格的最新一条
+            for col, value in zip(cols, row):
+                col[-1] = value
+        else:
+            if self.mode == "decimate" and n >= self.capacity:
+                self._decimate()
+            for col, value in zip(cols, row):
+                col.append(value)
+        self.seen += 1
+
+    def _decimate(self) -> None:
+        # 第 2j、2j+1 格合并成一格，取后一格（即合并后区间的最新一条）
+        keep = len(self._cols[0]) // 2 * 2
+        for col in self._cols:
+            col[:] = col[1:keep:2]
+        self.stride *= 2
+
+    def __len__(self) -> int:
+        return len(self._cols[0])
+
+    def __getitem__(self, i: int) -> Row:
+        n = len(self._cols[0])
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("history index out of range")
+        pos = (self.head + i) % n if self.head else i
+        return tuple(col[pos] for col in self._cols)
+
+    def __iter__(self) -> Iterator[Row]:
+        cols = self._cols
+        if self.head:
+            cols = tuple(col[self.head:] + col[:self.head] for col in cols)
+        return zip(*cols)
+
+    def column(self, name: str) -> array:
+        # 按时间顺序返回一列（副本）
+        col = self.columns[name]
+        return col[self.head:] + col[:self.head]
+
+    def max(self, name: str) -> float:
+        return self.peaks[HISTORY_FIELDS.index(name)]
+
+    def min(self, name: str) -> float:
+        return self.lows[HISTORY_FIELDS.index(name)]
+
+
+# ---------- 降采样：每个像素列保留最小/最大值，尖峰不会被抹平 ----------
+def minmax_downsample(xs: Sequence[float], ys: Sequence[float], buckets: int) -> List[float]:
+    # 返回可直接交给 create_line 的扁平坐标 [x0, y0, x1, y1, ...]
+    n = len(xs)
+    if n <= 2 * buckets or buckets < 1:
+        points: List[float] = []
+        for x, y in zip(xs, ys):
+            points.append(x)
+            points.append(y)
+        return points
+
+    points = [xs[0], ys[0]]
+    get = ys.__getitem__
+    # 首尾两点单独保留，中间均分成 buckets 个桶
+    for b in range(buckets):
+        lo = 1 + (n - 2) * b // buckets
+        hi = 1 + (n - 2) * (b + 1) // buckets
+        if lo >= hi:
+            continue
+        i_min = min(range(lo, hi), key=get)
+        i_max = max(range(lo, hi), key=get)
+        for i in sorted({i_min, i_max}):
+            points.append(xs[i])
+            points.append(ys[i])
+    points.append(xs[-1])
+    points.append(ys[-1])
+    return points
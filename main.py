@@ -1,247 +1,41 @@
+import argparse
+import copy
+import time
 import tkinter as tk
-import random
-import math
-from dataclasses import dataclass
-from typing import List, Optional, Tuple
-
-# =============================
-#        参数（从这里改）
-# =============================
-CANVAS_SIZE = 720
-RADIUS = 320  # 大圆半径
-CENTER = CANVAS_SIZE // 2
-
-# 数量
-N_CELLS = 90
-N_VIRUSES = 20
-N_ANTIBODIES = 0
-N_LEUKOCYTES = 6
-
-# 尺寸
-CELL_R_SMALL = 10
-CELL_R_LARGE = 18
-VIRUS_R = 7
-AB_Y_SIZE = 3
-AB_R_FOR_COLLISION = 0.1  # 抗体碰撞半径（用于细胞障碍物）
-LEUKOCYTE_R = 10
-
-# 动画与运动
-FPS = 60
-CA_INTERVAL = 0.12        # 每隔多少秒做一次CA决策（离散方向更新）
-TURN_SMOOTH = 0.45        # 速度方向平滑系数（越小越丝滑）
-
-VIRUS_SPEED = 70.0        # px/s
-AB_SPEED = 100.0          # px/s
-CELL_SPEED = 18.0         # px/s 细胞慢速随机漂移
-LEUKOCYTE_SPEED = 80.0    # px/s 白细胞速度
-VIRUS_ATTACHED_SPEED_FACTOR = 0.8
-VIRUS_ATTACHED_SPEED_DECAY = 0.2
-VIRUS_ATTACHED_AVOID_SCALE = 0.12
-CELL_ATTACHED_SPEED_FACTOR = 0.7
-CELL_ATTACHED_SPEED_DECAY = 0.15
-
-# 行为参数
-VIRUS_ATTRACT_CELL = 0.6  # 病毒趋向细胞程度
-AB_SENSE_RADIUS = 90.0    # 抗体感知半径
-AB_CHASE = 0.15            # 抗体追逐强度
-CAPTURE_DIST = 20.0        # 抗体捕获距离
-VIRUS_AVOID_LEUKOCYTE = 0.4  # 病毒远离白细胞强度
-LEUKOCYTE_SENSE_RADIUS = 160.0
-LEUKOCYTE_CHASE = 0.9
-AB_SPAWN_MIN = 1
-AB_SPAWN_MAX = 1
-
-# 新增：感染与爆发参数
-INFECTION_PADDING = 2                   # 病毒“贴到细胞”判定阈值补偿（可调）
-VIRUS_REPLICATION_TIME = 3.0              # 病毒繁殖时间（秒）
-BURST_VIRUS_COUNT_SMALL = 2               # 小细胞破裂出现的病毒数量
-BURST_VIRUS_COUNT_LARGE = 5              # 大细胞破裂出现的病毒数量
-
-# 新增：细胞分裂/成长参数
-CELL_DIVIDE_TIME_MIN = 3              # 分裂最短时间（秒）
-CELL_DIVIDE_TIME_MAX = 10             # 分裂最长时间（秒）
-CELL_GROW_TIME = 10                     # 小细胞长成大细胞的时间（秒）
-
-# 颜色
-BG_COLOR = "white"
-CELL_COLOR = "#4C78A8"
-CELL_INFECTED_COLOR = "#B279A2"
-CELL_INFECTED_BOUND_COLOR = "#A05195"
-CELL_DEAD_COLOR = "#7F7F7F"
-
-VIRUS_COLOR = "#F58518"
-VIRUS_BOUND_COLOR = "#E45756"
-AB_COLOR = "#54A24B"
-AB_FLASH_COLOR = "#E45756"
-LEUKOCYTE_COLOR = "#F2F2F2"
-LEUKOCYTE_OUTLINE = "#333333"
-# =============================
-
-
-# ---------- 数据结构 ----------
-@dataclass
-class Cell:
-    x: float
-    y: float
-    vx: float
-    vy: float
-    r: float = CELL_R_LARGE
-    state: str = "healthy"      # healthy | infected | dead
-    burst_timer: float = 0.0    # infected -> countdown to burst
-    grow_timer: float = CELL_GROW_TIME
-    divide_timer: Optional[float] = None
-    antibody_attached: int = 0
-
-
-@dataclass
-class Virus:
-    x: float
-    y: float
-    vx: float
-    vy: float
-    attached: int = 0
-
-
-@dataclass
-class Antibody:
-    x: float
-    y: float
-    vx: float
-    vy: float
-    flash: int = 0  # 捕获后闪烁若干帧
-
-
-@dataclass
-class Leukocyte:
-    x: float
-    y: float
-    vx: float
-    vy: float
-
-
-# ---------- 工具 ----------
-def rand_point_in_circle(r: float, margin: float = 0) -> Tuple[float, float]:
-    a = random.random() * 2 * math.pi
-    rr = math.sqrt(random.random()) * (r - margin)
-    x = CENTER + rr * math.cos(a)
-    y = CENTER + rr * math.sin(a)
-    return x, y
-
-
-def dist2(ax: float, ay: float, bx: float, by: float) -> float:
-    dx = ax - bx
-    dy = ay - by
-    return dx * dx + dy * dy
-
-
-def unit_vec(dx: float, dy: float) -> Tuple[float, float]:
-    d = math.hypot(dx, dy)
-    if d < 1e-9:
-        return 0.0, 0.0
-    return dx / d, dy / d
-
-
-def clamp(value: float, low: float, high: float) -> float:
-    return max(low, min(high, value))
-
-
-def lerp(a: float, b: float, t: float) -> float:
-    return a + (b - a) * t
-
-
-def burst_count_for_cell(cell: Cell) -> int:
-    denom = CELL_R_LARGE - CELL_R_SMALL
-    ratio = 1.0 if denom <= 0 else clamp((cell.r - CELL_R_SMALL) / denom, 0.0, 1.0)
-    return int(round(lerp(BURST_VIRUS_COUNT_SMALL, BURST_VIRUS_COUNT_LARGE, ratio)))
-
-
-def pick_discrete_direction(dx: float, dy: float, directions: List[Tuple[float, float]]) -> Tuple[float, float]:
-    ux, uy = unit_vec(dx, dy)
-    best = directions[0]
-    best_dot = -1e9
-    for vx, vy in directions:
-        dot = ux * vx + uy * vy
-        if dot > best_dot:
-            best_dot = dot
-            best = (vx, vy)
-    return best
-
-
-def reflect_off_circle(x: float, y: float, vx: float, vy: float, margin: float) -> Tuple[float, float, float, float]:
-    dx = x - CENTER
-    dy = y - CENTER
-    d = math.hypot(dx, dy)
-    limit = RADIUS - margin
-    if d <= limit or d < 1e-9:
-        return x, y, vx, vy
-
-    nx, ny = dx / d, dy / d
-    x = CENTER + nx * limit
-    y = CENTER + ny * limit
-
-    dot = vx * nx + vy * ny
-    vx = vx - 2 * dot * nx
-    vy = vy - 2 * dot * ny
-    return x, y, vx, vy
-
-
-def push_out_of_cells(x: float, y: float, vx: float, vy: float, r_obj: float, cells: List[Cell]) -> Tuple[float, float, float, float]:
-    # healthy/infected 细胞作为障碍物；dead 不再阻挡（你也可以改成仍阻挡）
-    for c in cells:
-        if c.state == "dead":
-            continue
-        dx = x - c.x
-        dy = y - c.y
-        d = math.hypot(dx, dy)
-        min_d = c.r + r_obj
-        if d < min_d and d > 1e-9:
-            nx, ny = dx / d, dy / d
-            x = c.x + nx * min_d
-            y = c.y + ny * min_d
-            dot = vx * nx + vy * ny
-            vx = vx - 1.8 * dot * nx
-            vy = vy - 1.8 * dot * ny
-        elif d < 1e-9:
-            a = random.random() * 2 * math.pi
-            x = c.x + math.cos(a) * min_d
-            y = c.y + math.sin(a) * min_d
-    return x, y, vx, vy
-
-
-def push_out_of_other_cells(cell: Cell, cells: List[Cell]) -> None:
-    for other in cells:
-        if other is cell or other.state == "dead":
-            continue
-        dx = cell.x - other.x
-        dy = cell.y - other.y
-        d = math.hypot(dx, dy)
-        min_d = cell.r + other.r
-        if d < min_d and d > 1e-9:
-            nx, ny = dx / d, dy / d
-            overlap = min_d - d
-            cell.x += nx * overlap * 0.6
-            cell.y += ny * overlap * 0.6
-            cell.vx -= nx * overlap * 0.4
-            cell.vy -= ny * overlap * 0.4
-        elif d < 1e-9:
-            ang = random.random() * 2 * math.pi
-            cell.x = other.x + math.cos(ang) * min_d
-            cell.y = other.y + math.sin(ang) * min_d
+import traceback
+from tkinter import filedialog, messagebox
+from typing import Optional
+
+from checkpoint import load_checkpoint, save_checkpoint
+from history import minmax_downsample
+from metrics import MetricsRecorder, open_recorder
+from profiler import RENDER_TRACK, format_summary
+from renderer import (AB_COLOR, ARENA_COLOR, ARENA_OUTLINE, BG_COLOR, CELL_COLOR, DENSITY_FIELDS, DENSITY_THRESHOLD,
+                      LEUKOCYTE_OUTLINE, VIEW_MODES, VIRUS_COLOR, CanvasRenderer, ViewOptions)
+from runner import SimRunner
+from scheduler import FixedStepClock
+from simulation import (CANVAS_SIZE, CENTER, FPS, INTEGRATOR, INTEGRATORS, RADIUS, SIM_DT, Simulation,
+                        write_history_csv)
 
 
 class App:
-    def __init__(self, root: tk.Tk):
+    def __init__(self, root: tk.Tk, seed: Optional[int] = None, threaded: bool = False,
+                 view: ViewOptions = ViewOptions()):
         self.root = root
         root.title("丝滑 CA：抗体附着 + 白细胞清理 + 细胞感染爆发（圆形边界）")
-        root.minsize(760, 820)
+        root.minsize(760, 860)
 
         self.top = tk.Frame(root)
         self.top.pack(side="top", fill="both", expand=True)
         self.bottom = tk.Frame(root)
         self.bottom.pack(side="bottom", fill="x")
+        self.view_bar = tk.Frame(root)
+        self.view_bar.pack(side="bottom", fill="x")
 
         self.canvas = tk.Canvas(self.top, width=CANVAS_SIZE, height=CANVAS_SIZE, bg=BG_COLOR)
         self.canvas.pack(padx=10, pady=10)
+        self.renderer = CanvasRenderer(self.canvas)
+        self.renderer.view = view
 
         self.btn = tk.Button(self.bottom, text="Start", width=12, command=self.toggle)
         self.btn.pack(side="left", padx=8, pady=8)
@@ -252,209 +46,208 @@ class App:
         self.btn_reset = tk.Button(self.bottom, text="Reset", width=12, command=self.reset)
         self.btn_reset.pack(side="left", padx=8, pady=8)
 
+        self.btn_save = tk.Button(self.bottom, text="Save", width=8, command=self.save_state)
+        self.btn_save.pack(side="left", padx=4, pady=8)
+
+        self.btn_load = tk.Button(self.bottom, text="Load", width=8, command=self.load_state)
+        self.btn_load.pack(side="left", padx=4, pady=8)
+
+        # 只控制重绘频率；物理步长固定为 SIM_DT
         self.speed_scale = tk.Scale(self.bottom, from_=20, to=90, orient="horizontal",
-                                    label="FPS", length=220)
+                                    label="Render FPS", length=220, command=self.sync_speed)
         self.speed_scale.set(FPS)
         self.speed_scale.pack(side="right", padx=10)
 
+        self.max_speed = tk.BooleanVar(value=False)
+        self.chk_max_speed = tk.Checkbutton(self.bottom, text="Max speed", variable=self.max_speed,
+                                            command=self.sync_speed)
+        self.chk_max_speed.pack(side="right", padx=8)
+
+        # 分阶段计时：勾选后 HUD 下方多一行各阶段耗时，Trace 导出 Chrome trace
+        self.profile = tk.BooleanVar(value=False)
+        self.chk_profile = tk.Checkbutton(self.bottom, text="Profile", variable=self.profile,
+                                          command=self.toggle_profile)
+        self.chk_profile.pack(side="right", padx=4)
+
+        self.btn_trace = tk.Button(self.bottom, text="Trace", width=6, command=self.save_trace)
+        self.btn_trace.pack(side="right", padx=4)
+
+        # 视图：auto 在个体总数超过阈值时改画密度图；Overlay 在密度图上仍画出每个个体
+        tk.Label(self.view_bar, text="View").pack(side="left", padx=(8, 2))
+        self.view_mode = tk.StringVar(value=view.mode)
+        tk.OptionMenu(self.view_bar, self.view_mode, *VIEW_MODES, command=self.set_view).pack(side="left")
+        tk.Label(self.view_bar, text="Density").pack(side="left", padx=(8, 2))
+        self.density_field = tk.StringVar(value=view.field)
+        tk.OptionMenu(self.view_bar, self.density_field, *DENSITY_FIELDS, command=self.set_view).pack(side="left")
+        self.overlay = tk.BooleanVar(value=view.overlay)
+        tk.Checkbutton(self.view_bar, text="Overlay", variable=self.overlay,
+                       command=self.set_view).pack(side="left", padx=8)
+
         self.running = False
         self.after_id: Optional[str] = None
 
-        # 统计
-        self.captured = 0
-        self.tick = 0
-        self.infected_count = 0
-        self.burst_count = 0
-        self.elapsed_time = 0.0
-        self.history: List[Tuple[float, int, int, int, int]] = []
+        # 模拟引擎（状态与步进都在 Simulation 里）
+        self.sim = Simulation(seed)
+        self.clock = FixedStepClock()
 
-        # 离散方向（16方向）
-        self.directions = []
-        for k in range(16):
-            ang = 2 * math.pi * k / 16
-            self.directions.append((math.cos(ang), math.sin(ang)))
+        # 后台线程模式：模拟归 runner 的线程所有，这里只发命令、画它发布的快照
+        self.runner: Optional[SimRunner] = None
+        self.drawn_seq = 0
+        if threaded:
+            self.runner = SimRunner(self.sim, self.clock)
+            self.runner.view = view
+            self.runner.start()
 
-        self.cells: List[Cell] = []
-        self.viruses: List[Virus] = []
-        self.antibodies: List[Antibody] = []
-        self.leukocytes: List[Leukocyte] = []
+        self.draw_static()
+        self.render()
+        if self.runner is not None:
+            self.poll()
 
-        self.ca_accum = 0.0
+    def call(self, fn):
+        # 对模拟执行 fn(sim)：后台线程模式下在模拟线程里执行并等待结果
+        if self.runner is not None:
+            return self.runner.call(fn)
+        return fn(self.sim)
 
-        self.draw_static()
-        self.reset()
+    def close(self):
+        if self.runner is not None:
+            self.runner.stop()
 
     def draw_static(self):
         self.canvas.delete("static")
         r = RADIUS
         self.canvas.create_oval(CENTER - r, CENTER - r, CENTER + r, CENTER + r,
-                                outline="#333", width=3, fill="#f8f8ff", tags=("static",))
+                                outline=ARENA_OUTLINE, width=3, fill=ARENA_COLOR, tags=("static",))
         self.canvas.create_text(12, 12, anchor="nw",
                                 text="CA决策(离散方向) + 连续运动(丝滑) + 抗体附着 + 白细胞清理",
                                 fill="#444", font=("Helvetica", 12), tags=("static",))
 
     def reset(self):
+        self.pause()
+        if self.runner is not None:
+            self.runner.send("reset")
+        else:
+            self.sim.reset()
+        self.render()
+
+    def pause(self):
         self.running = False
         self.btn.configure(text="Start")
-        if self.after_id is not None:
+        if self.runner is not None:
+            # 绘制轮询照常进行，只让模拟线程停下
+            self.runner.send("run", False)
+        elif self.after_id is not None:
             self.root.after_cancel(self.after_id)
             self.after_id = None
 
-        self.captured = 0
-        self.tick = 0
-        self.infected_count = 0
-        self.burst_count = 0
-        self.elapsed_time = 0.0
-        self.history = []
-        self.ca_accum = 0.0
-
-        self.cells = []
-        self.viruses = []
-        self.antibodies = []
-        self.leukocytes = []
-
-        # 生成细胞（尽量不重叠）
-        attempts = 0
-        while len(self.cells) < N_CELLS and attempts < 6000:
-            attempts += 1
-            x, y = rand_point_in_circle(RADIUS, margin=70)
-            ok = True
-            for c in self.cells:
-                if math.hypot(x - c.x, y - c.y) < (CELL_R_LARGE * 2 + 14):
-                    ok = False
-                    break
-            if ok:
-                ang = random.random() * 2 * math.pi
-                vx = CELL_SPEED * math.cos(ang)
-                vy = CELL_SPEED * math.sin(ang)
-                self.cells.append(Cell(x=x, y=y, vx=vx, vy=vy, r=CELL_R_LARGE,
-                                       grow_timer=CELL_GROW_TIME,
-                                       divide_timer=random.uniform(CELL_DIVIDE_TIME_MIN, CELL_DIVIDE_TIME_MAX)))
-
-        # 生成病毒
-        while len(self.viruses) < N_VIRUSES:
-            x, y = rand_point_in_circle(RADIUS, margin=20)
-            if any(math.hypot(x - c.x, y - c.y) < (c.r + VIRUS_R + 2) for c in self.cells):
-                continue
-            ang = random.random() * 2 * math.pi
-            vx = VIRUS_SPEED * math.cos(ang)
-            vy = VIRUS_SPEED * math.sin(ang)
-            self.viruses.append(Virus(x=x, y=y, vx=vx, vy=vy))
-
-        # 生成抗体
-        while len(self.antibodies) < N_ANTIBODIES:
-            x, y = rand_point_in_circle(RADIUS, margin=15)
-            if any(math.hypot(x - c.x, y - c.y) < (c.r + AB_R_FOR_COLLISION + 2) for c in self.cells):
-                continue
-            ang = random.random() * 2 * math.pi
-            vx = AB_SPEED * math.cos(ang)
-            vy = AB_SPEED * math.sin(ang)
-            self.antibodies.append(Antibody(x=x, y=y, vx=vx, vy=vy))
-
-        # 生成白细胞
-        while len(self.leukocytes) < N_LEUKOCYTES:
-            x, y = rand_point_in_circle(RADIUS, margin=25)
-            if any(math.hypot(x - c.x, y - c.y) < (c.r + LEUKOCYTE_R + 4) for c in self.cells):
-                continue
-            ang = random.random() * 2 * math.pi
-            vx = LEUKOCYTE_SPEED * math.cos(ang)
-            vy = LEUKOCYTE_SPEED * math.sin(ang)
-            self.leukocytes.append(Leukocyte(x=x, y=y, vx=vx, vy=vy))
-
-        self.record_history()
+    # ---------- 存档 ----------
+    def save_state(self):
+        self.pause()
+        path = filedialog.asksaveasfilename(parent=self.root, defaultextension=".ckpt",
+                                            filetypes=[("Checkpoint", "*.ckpt"), ("All files", "*")])
+        if path:
+            self.call(lambda sim: save_checkpoint(sim, path))
+
+    def load_state(self):
+        self.pause()
+        path = filedialog.askopenfilename(parent=self.root,
+                                          filetypes=[("Checkpoint", "*.ckpt"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            self.call(lambda sim: load_checkpoint(path, sim))
+        except (OSError, ValueError, KeyError) as exc:
+            messagebox.showerror("Load failed", str(exc), parent=self.root)
+            return
+        self.render()
+
+    # ---------- 视图 ----------
+    def set_view(self, _value=None):
+        view = ViewOptions(self.view_mode.get(), self.density_field.get(), self.overlay.get(),
+                           self.renderer.view.threshold, self.renderer.view.grid)
+        self.renderer.view = view
+        if self.runner is not None:
+            self.runner.send("view", view)
         self.render()
 
+    # ---------- 性能分析 ----------
+    def toggle_profile(self):
+        if self.runner is not None:
+            self.runner.send("profile", self.profile.get())
+        else:
+            self.sim.profiler.set_enabled(self.profile.get())
+        self.render()
+
+    def save_trace(self):
+        path = filedialog.asksaveasfilename(parent=self.root, defaultextension=".json",
+                                            filetypes=[("Chrome trace", "*.json"), ("All files", "*")])
+        if path:
+            self.call(lambda sim: sim.profiler.dump_trace(path))
+
+    def sync_speed(self, _value=None):
+        if self.runner is not None:
+            self.runner.send("max_speed", self.max_speed.get())
+            self.runner.send("publish_fps", max(10, int(self.speed_scale.get())))
+
     def toggle(self):
         self.running = not self.running
         self.btn.configure(text="Pause" if self.running else "Start")
-        if self.running:
+        if self.runner is not None:
+            self.runner.send("run", self.running)
+            if not self.running:
+                self.show_timeline_chart()
+        elif self.running:
+            self.clock.reset()
             self.loop()
         else:
             self.show_timeline_chart()
 
     def step_ca_once(self):
-        self.ca_step()
+        if self.runner is not None:
+            self.runner.send("step_ca")
+        else:
+            self.sim.ca_step()
         self.render()
 
     def loop(self):
         if not self.running:
             return
         fps = max(10, int(self.speed_scale.get()))
-        dt = 1.0 / fps
+        frame = 1.0 / fps
+        start = time.perf_counter()
 
-        self.animate_step(dt)
+        if self.max_speed.get():
+            # 最快模式：一帧的大部分时间都拿来跑物理步，剩下的留给绘制
+            self.clock.run_for(self.sim.animate_step, frame * 0.8)
+        else:
+            self.clock.tick(self.sim.animate_step)
         self.render()
         if not self.running:
             return
-        self.after_id = self.root.after(int(1000 / fps), self.loop)
-
-    # ---------- 连续动画步 ----------
-    def animate_step(self, dt: float):
-        self.tick += 1
-        self.elapsed_time += dt
-        self.ca_accum += dt
-
-        # CA决策步
-        if self.ca_accum >= CA_INTERVAL:
-            self.ca_accum %= CA_INTERVAL
-            self.ca_step()
-
-        # 连续移动：细胞
-        for c in self.cells:
-            if c.state == "dead":
-                continue
-            speed_factor = 1.0
-            if c.antibody_attached > 0:
-                speed_factor = max(0.3, CELL_ATTACHED_SPEED_FACTOR - c.antibody_attached * CELL_ATTACHED_SPEED_DECAY)
-            c.x += c.vx * dt
-            c.y += c.vy * dt
-            c.vx *= speed_factor
-            c.vy *= speed_factor
-            c.x, c.y, c.vx, c.vy = reflect_off_circle(c.x, c.y, c.vx, c.vy, margin=c.r)
-            push_out_of_other_cells(c, self.cells)
-
-        # 细胞成长与分裂
-        self.cell_growth_and_division(dt)
-
-        # 连续移动：病毒
-        for v in self.viruses:
-            v.x += v.vx * dt
-            v.y += v.vy * dt
-            v.x, v.y, v.vx, v.vy = reflect_off_circle(v.x, v.y, v.vx, v.vy, margin=VIRUS_R)
-            v.x, v.y, v.vx, v.vy = push_out_of_cells(v.x, v.y, v.vx, v.vy, VIRUS_R, self.cells)
-
-        # 连续移动：抗体
-        for a in self.antibodies:
-            if a.flash > 0:
-                a.flash -= 1
-            a.x += a.vx * dt
-            a.y += a.vy * dt
-            a.x, a.y, a.vx, a.vy = reflect_off_circle(a.x, a.y, a.vx, a.vy, margin=AB_R_FOR_COLLISION)
-            a.x, a.y, a.vx, a.vy = push_out_of_cells(a.x, a.y, a.vx, a.vy, AB_R_FOR_COLLISION, self.cells)
-
-        # 连续移动：白细胞
-        for w in self.leukocytes:
-            w.x += w.vx * dt
-            w.y += w.vy * dt
-            w.x, w.y, w.vx, w.vy = reflect_off_circle(w.x, w.y, w.vx, w.vy, margin=LEUKOCYTE_R)
-            w.x, w.y, w.vx, w.vy = push_out_of_cells(w.x, w.y, w.vx, w.vy, LEUKOCYTE_R, self.cells)
-
-        # 新增：感染逻辑（病毒贴到细胞 → 细胞变色并开始倒计时 → 爆发）
-        self.infection_step(dt)
-
-        # 抗体附着
-        self.capture_check()
-
-        # 白细胞清理
-        self.leukocyte_cleanup()
-        self.record_history()
-
-    def record_history(self):
-        live_cells = sum(1 for c in self.cells if c.state != "dead")
-        self.history.append((self.elapsed_time, len(self.leukocytes), live_cells, len(self.viruses), len(self.antibodies)))
+        spent = time.perf_counter() - start
+        self.after_id = self.root.after(max(1, int((frame - spent) * 1000)), self.loop)
+
+    def poll(self):
+        # 后台线程模式的绘制循环：按 Render FPS 取最新快照，模拟快慢不影响界面响应
+        if self.runner.error is not None:
+            self.report_failure(self.runner.error)
+            return
+        self.render()
+        fps = max(10, int(self.speed_scale.get()))
+        self.after_id = self.root.after(max(1, int(1000 / fps)), self.poll)
+
+    def report_failure(self, exc: BaseException):
+        # 模拟线程已经因异常停下：停止轮询，打印完整回溯并弹窗说明，而不是让界面停在最后一帧
+        self.after_id = None
+        self.running = False
+        self.btn.configure(text="Start", state="disabled")
+        traceback.print_exception(type(exc), exc, exc.__traceback__)
+        messagebox.showerror("Simulation failed", f"{type(exc).__name__}: {exc}", parent=self.root)
 
     def show_timeline_chart(self):
-        if not self.history:
+        # 取一份拷贝：后台线程模式下画图时不和模拟线程共享
+        history = self.call(lambda sim: copy.deepcopy(sim.history))
+        if not history:
             return
         chart = tk.Toplevel(self.root)
         chart.title("数量时间线")
@@ -464,14 +257,11 @@ class App:
         canvas = tk.Canvas(chart, width=width, height=height, bg="white")
         canvas.pack(fill="both", expand=True)
 
-        times = [h[0] for h in self.history]
-        leukocytes = [h[1] for h in self.history]
-        cells = [h[2] for h in self.history]
-        viruses = [h[3] for h in self.history]
-        antibodies = [h[4] for h in self.history]
-
-        max_time = max(times) if times else 1.0
-        max_count = max(max(leukocytes), max(cells), max(viruses), max(antibodies), 1)
+        # 列式历史：直接取列，极值用全程记录的峰值（不受抽稀影响）
+        times = history.column("time")
+        t0 = times[0]  # ring 模式下最早一条不一定从 0 开始
+        span = (times[-1] - t0) or 1.0
+        max_count = max(max(history.max(name) for name in ("leukocytes", "cells", "viruses", "antibodies")), 1)
 
         plot_w = width - margin_left - margin_right
         plot_h = height - margin_top - margin_bottom
@@ -483,15 +273,12 @@ class App:
         canvas.create_text(x0, y0 + 25, text="时间 (s)", anchor="nw", fill="#333")
         canvas.create_text(10, margin_top - 10, text="数量", anchor="nw", fill="#333")
 
-        def to_xy(t: float, value: int) -> Tuple[float, float]:
-            x = x0 + (t / max_time) * plot_w
-            y = y0 - (value / max_count) * plot_h
-            return x, y
+        # 每个像素列只画最小/最大两点：点数与绘图宽度成正比，与运行时长无关
+        xs = [x0 + ((t - t0) / span) * plot_w for t in times]
 
-        def draw_series(values: List[int], color: str, label: str, y_offset: int):
-            points = []
-            for t, v in zip(times, values):
-                points.extend(to_xy(t, v))
+        def draw_series(name: str, color: str, label: str, y_offset: int):
+            ys = [y0 - (v / max_count) * plot_h for v in history.column(name)]
+            points = minmax_downsample(xs, ys, plot_w)
             if len(points) >= 4:
                 canvas.create_line(points, fill=color, width=2)
             legend_x = x0 + plot_w - 120
@@ -499,385 +286,167 @@ class App:
             canvas.create_line(legend_x, legend_y + 6, legend_x + 18, legend_y + 6, fill=color, width=3)
             canvas.create_text(legend_x + 26, legend_y, text=label, anchor="nw", fill="#333")
 
-        draw_series(leukocytes, LEUKOCYTE_OUTLINE, "白细胞", 0)
-        draw_series(cells, CELL_COLOR, "普通细胞", 20)
-        draw_series(viruses, VIRUS_COLOR, "病毒", 40)
-        draw_series(antibodies, AB_COLOR, "抗体", 60)
-
-    # ---------- CA决策步：只更新“速度方向” ----------
-    def ca_step(self):
-        # 细胞：慢速、无目的乱动
-        for c in self.cells:
-            if c.state == "dead":
-                continue
-            ang = random.random() * 2 * math.pi
-            tx, ty = math.cos(ang), math.sin(ang)
-            ddx, ddy = pick_discrete_direction(tx, ty, self.directions)
-            nvx, nvy = ddx * CELL_SPEED, ddy * CELL_SPEED
-            c.vx = (1.0 - TURN_SMOOTH) * c.vx + TURN_SMOOTH * nvx
-            c.vy = (1.0 - TURN_SMOOTH) * c.vy + TURN_SMOOTH * nvy
-
-        # 病毒：随机游走 + 轻微向最近“未死亡细胞”靠近 + 远离白细胞
-        live_cells = [c for c in self.cells if c.state != "dead"]
-        for v in self.viruses:
-            ang = random.random() * 2 * math.pi
-            rx, ry = math.cos(ang), math.sin(ang)
-
-            if live_cells and v.attached <= 0:
-                nearest = min(live_cells, key=lambda c: dist2(v.x, v.y, c.x, c.y))
-                cx, cy = nearest.x - v.x, nearest.y - v.y
-                cux, cuy = unit_vec(cx, cy)
-            else:
-                cux, cuy = 0.0, 0.0
-
-            if self.leukocytes:
-                nearest_w = min(self.leukocytes, key=lambda w: dist2(v.x, v.y, w.x, w.y))
-                wx, wy = v.x - nearest_w.x, v.y - nearest_w.y
-                wux, wuy = unit_vec(wx, wy)
-            else:
-                wux, wuy = 0.0, 0.0
-
-            avoid_scale = 1.0 + v.attached * VIRUS_ATTACHED_AVOID_SCALE
-            avoid_strength = VIRUS_AVOID_LEUKOCYTE * avoid_scale
-            base = max(0.0, 1.0 - VIRUS_ATTRACT_CELL - avoid_strength)
-            tx = base * rx + VIRUS_ATTRACT_CELL * cux + avoid_strength * wux
-            ty = base * ry + VIRUS_ATTRACT_CELL * cuy + avoid_strength * wuy
-
-            ddx, ddy = pick_discrete_direction(tx, ty, self.directions)
-            speed_factor = max(0.2, VIRUS_ATTACHED_SPEED_FACTOR - v.attached * VIRUS_ATTACHED_SPEED_DECAY)
-            speed = VIRUS_SPEED * speed_factor
-            nvx, nvy = ddx * speed, ddy * speed
-            v.vx = (1.0 - TURN_SMOOTH) * v.vx + TURN_SMOOTH * nvx
-            v.vy = (1.0 - TURN_SMOOTH) * v.vy + TURN_SMOOTH * nvy
-
-        # 抗体：感知半径内找最近未附着病毒，否则随机
-        sense2 = AB_SENSE_RADIUS * AB_SENSE_RADIUS
-        for a in self.antibodies:
-            target: Optional[Virus] = None
-            best_d2 = sense2
-            for v in self.viruses:
-                if v.attached:
-                    continue
-                d2 = dist2(a.x, a.y, v.x, v.y)
-                if d2 < best_d2:
-                    best_d2 = d2
-                    target = v
-
-            if target is None:
-                ang = random.random() * 2 * math.pi
-                tx, ty = math.cos(ang), math.sin(ang)
-            else:
-                dx, dy = target.x - a.x, target.y - a.y
-                tux, tuy = unit_vec(dx, dy)
-                ang = random.random() * 2 * math.pi
-                rx, ry = math.cos(ang), math.sin(ang)
-                tx = AB_CHASE * tux + (1.0 - AB_CHASE) * rx
-                ty = AB_CHASE * tuy + (1.0 - AB_CHASE) * ry
-
-            ddx, ddy = pick_discrete_direction(tx, ty, self.directions)
-            nvx, nvy = ddx * AB_SPEED, ddy * AB_SPEED
-            a.vx = (1.0 - TURN_SMOOTH) * a.vx + TURN_SMOOTH * nvx
-            a.vy = (1.0 - TURN_SMOOTH) * a.vy + TURN_SMOOTH * nvy
-
-        # 白细胞：追踪被标记目标（附着病毒/感染细胞/死亡细胞）
-        sense2 = LEUKOCYTE_SENSE_RADIUS * LEUKOCYTE_SENSE_RADIUS
-        targets: List[Tuple[float, float]] = []
-        targets.extend((v.x, v.y) for v in self.viruses if v.attached > 0)
-        targets.extend((c.x, c.y) for c in self.cells if c.state in ("infected", "dead") or c.antibody_attached > 0)
-        for w in self.leukocytes:
-            target_pos: Optional[Tuple[float, float]] = None
-            best_d2 = sense2
-            for tx_pos, ty_pos in targets:
-                d2 = dist2(w.x, w.y, tx_pos, ty_pos)
-                if d2 < best_d2:
-                    best_d2 = d2
-                    target_pos = (tx_pos, ty_pos)
-            if target_pos is None:
-                ang = random.random() * 2 * math.pi
-                tx, ty = math.cos(ang), math.sin(ang)
-            else:
-                dx, dy = target_pos[0] - w.x, target_pos[1] - w.y
-                tux, tuy = unit_vec(dx, dy)
-                ang = random.random() * 2 * math.pi
-                rx, ry = math.cos(ang), math.sin(ang)
-                tx = LEUKOCYTE_CHASE * tux + (1.0 - LEUKOCYTE_CHASE) * rx
-                ty = LEUKOCYTE_CHASE * tuy + (1.0 - LEUKOCYTE_CHASE) * ry
-            ddx, ddy = pick_discrete_direction(tx, ty, self.directions)
-            nvx, nvy = ddx * LEUKOCYTE_SPEED, ddy * LEUKOCYTE_SPEED
-            w.vx = (1.0 - TURN_SMOOTH) * w.vx + TURN_SMOOTH * nvx
-            w.vy = (1.0 - TURN_SMOOTH) * w.vy + TURN_SMOOTH * nvy
-
-    def cell_growth_and_division(self, dt: float):
-        if not self.cells:
-            return
-        updated_cells = []
-        newborn_cells: List[Cell] = []
-
-        for c in self.cells:
-            if c.state == "dead":
-                updated_cells.append(c)
-                continue
-
-            if CELL_GROW_TIME <= 0:
-                c.grow_timer = CELL_GROW_TIME
-                c.r = CELL_R_LARGE
-                if c.divide_timer is None:
-                    c.divide_timer = random.uniform(CELL_DIVIDE_TIME_MIN, CELL_DIVIDE_TIME_MAX)
-            elif c.grow_timer < CELL_GROW_TIME:
-                c.grow_timer = min(CELL_GROW_TIME, c.grow_timer + dt)
-                progress = c.grow_timer / CELL_GROW_TIME
-                c.r = lerp(CELL_R_SMALL, CELL_R_LARGE, progress)
-                if c.r >= CELL_R_LARGE - 1e-3 and c.divide_timer is None:
-                    c.divide_timer = random.uniform(CELL_DIVIDE_TIME_MIN, CELL_DIVIDE_TIME_MAX)
-
-            if c.state == "healthy" and c.r >= CELL_R_LARGE - 1e-3 and c.divide_timer is not None:
-                c.divide_timer -= dt
-                if c.divide_timer <= 0:
-                    newborn_cells.extend(self.divide_cell(c))
-                    continue
-
-            updated_cells.append(c)
-
-        if newborn_cells:
-            updated_cells.extend(newborn_cells)
-            for newborn in newborn_cells:
-                push_out_of_other_cells(newborn, updated_cells)
-        self.cells = updated_cells
-
-    def divide_cell(self, cell: Cell) -> List[Cell]:
-        ang = random.random() * 2 * math.pi
-        offset = max(CELL_R_SMALL + 2, cell.r * 0.6)
-        dx = math.cos(ang) * offset
-        dy = math.sin(ang) * offset
-        positions = [(cell.x + dx, cell.y + dy), (cell.x - dx, cell.y - dy)]
-        children = []
-        for x, y in positions:
-            if not self._inside_big_circle(x, y, margin=CELL_R_SMALL):
-                dx_c, dy_c = x - CENTER, y - CENTER
-                d = math.hypot(dx_c, dy_c) or 1.0
-                nx, ny = dx_c / d, dy_c / d
-                limit = RADIUS - CELL_R_SMALL
-                x = CENTER + nx * limit
-                y = CENTER + ny * limit
-            ang_v = random.random() * 2 * math.pi
-            vx = CELL_SPEED * math.cos(ang_v)
-            vy = CELL_SPEED * math.sin(ang_v)
-            children.append(Cell(x=x, y=y, vx=vx, vy=vy, r=CELL_R_SMALL, grow_timer=0.0))
-        return children
-
-    # ---------- 新增：感染/爆发 ----------
-    def infection_step(self, dt: float):
-        if not self.cells or not self.viruses:
-            return
-
-        # 1) 病毒贴到健康细胞 -> 感染（细胞变色）+ 该病毒“进入细胞”（删除）
-        new_viruses = []
-        removed_by_infection = 0
-
-        # 为了效率：先把细胞分组（这里只做简单遍历，规模不大够用）
-        for v in self.viruses:
-            if v.attached > 0:
-                new_viruses.append(v)
-                continue
-            infected = False
-            for c in self.cells:
-                if c.state != "healthy":
-                    continue
-                infection_dist = c.r + VIRUS_R + INFECTION_PADDING
-                if dist2(v.x, v.y, c.x, c.y) <= infection_dist * infection_dist:
-                    # 感染发生
-                    c.state = "infected"
-                    c.burst_timer = VIRUS_REPLICATION_TIME
-                    self.infected_count += 1
-                    infected = True
-                    removed_by_infection += 1
-                    break
-            if not infected:
-                new_viruses.append(v)
-
-        if removed_by_infection:
-            self.viruses = new_viruses
-
-        # 2) 感染细胞倒计时 -> 破裂爆发
-        for c in self.cells:
-            if c.state == "infected":
-                c.burst_timer -= dt
-                if c.burst_timer <= 0:
-                    self.burst_count += 1
-                    c.state = "dead"
-                    c.antibody_attached = 0
-
-                    burst_count = burst_count_for_cell(c)
-
-                    # 爆发产生病毒：从细胞附近喷出
-                    for _ in range(burst_count):
-                        ang = random.random() * 2 * math.pi
-                        # 出生点：细胞边缘附近稍微外移一点
-                        rr = c.r + VIRUS_R + random.random() * 6.0
-                        x = c.x + rr * math.cos(ang)
-                        y = c.y + rr * math.sin(ang)
-
-                        # 保证在大圆内；如果不在就往内拉一点
-                        if not self._inside_big_circle(x, y, margin=VIRUS_R):
-                            # 把点拉回到大圆内
-                            dx, dy = x - CENTER, y - CENTER
-                            d = math.hypot(dx, dy) or 1.0
-                            nx, ny = dx / d, dy / d
-                            limit = RADIUS - VIRUS_R
-                            x = CENTER + nx * limit
-                            y = CENTER + ny * limit
-
-                        # 速度：随机方向，略带“喷射”效果（速度有抖动）
-                        sp = VIRUS_SPEED * (0.9 + random.random() * 0.5)
-                        vx = sp * math.cos(ang)
-                        vy = sp * math.sin(ang)
-
-                        self.viruses.append(Virus(x=x, y=y, vx=vx, vy=vy))
-
-    def _inside_big_circle(self, x: float, y: float, margin: float = 0) -> bool:
-        dx = x - CENTER
-        dy = y - CENTER
-        return (dx * dx + dy * dy) <= (RADIUS - margin) ** 2
-
-    # ---------- 抗体捕获 ----------
-    def capture_check(self):
-        if not self.viruses and not self.cells:
-            return
-        cap2 = CAPTURE_DIST * CAPTURE_DIST
-        remaining_antibodies = []
-
-        for a in self.antibodies:
-            attached = False
-            for v in self.viruses:
-                if dist2(v.x, v.y, a.x, a.y) <= cap2:
-                    v.attached += 1
-                    a.flash = 8
-                    self.captured += 1
-                    attached = True
-                    break
-            if attached:
-                continue
-            for c in self.cells:
-                if c.state != "infected":
-                    continue
-                if dist2(c.x, c.y, a.x, a.y) <= cap2:
-                    c.antibody_attached += 1
-                    a.flash = 8
-                    attached = True
-                    break
-            if not attached:
-                remaining_antibodies.append(a)
-
-        self.antibodies = remaining_antibodies
-
-    def _spawn_antibodies(self, x: float, y: float, count: int) -> None:
-        if count <= 0:
-            return
-        for _ in range(count):
-            ang = random.random() * 2 * math.pi
-            rr = 6 + random.random() * 8
-            px = x + rr * math.cos(ang)
-            py = y + rr * math.sin(ang)
-            if not self._inside_big_circle(px, py, margin=AB_R_FOR_COLLISION):
-                dx, dy = px - CENTER, py - CENTER
-                d = math.hypot(dx, dy) or 1.0
-                nx, ny = dx / d, dy / d
-                limit = RADIUS - AB_R_FOR_COLLISION
-                px = CENTER + nx * limit
-                py = CENTER + ny * limit
-            ang_v = random.random() * 2 * math.pi
-            vx = AB_SPEED * math.cos(ang_v)
-            vy = AB_SPEED * math.sin(ang_v)
-            self.antibodies.append(Antibody(x=px, y=py, vx=vx, vy=vy))
-
-    def leukocyte_cleanup(self):
-        if not self.leukocytes:
-            return
-        virus_removed = set()
-        cell_removed = set()
-        virus_dist2 = (LEUKOCYTE_R + VIRUS_R) ** 2
-
-        for w in self.leukocytes:
-            for idx, v in enumerate(self.viruses):
-                if idx in virus_removed:
-                    continue
-                if dist2(w.x, w.y, v.x, v.y) <= virus_dist2:
-                    virus_removed.add(idx)
-                    spawn_count = random.randint(AB_SPAWN_MIN, AB_SPAWN_MAX)
-                    self._spawn_antibodies(v.x, v.y, spawn_count)
-
-            for idx, c in enumerate(self.cells):
-                if idx in cell_removed:
-                    continue
-                if c.state == "dead" or c.state == "infected":
-                    if dist2(w.x, w.y, c.x, c.y) <= (LEUKOCYTE_R + c.r) ** 2:
-                        cell_removed.add(idx)
-                        spawn_count = random.randint(AB_SPAWN_MIN, AB_SPAWN_MAX)
-                        self._spawn_antibodies(c.x, c.y, spawn_count)
-
-        if virus_removed:
-            self.viruses = [v for idx, v in enumerate(self.viruses) if idx not in virus_removed]
-        if cell_removed:
-            self.cells = [c for idx, c in enumerate(self.cells) if idx not in cell_removed]
+        draw_series("leukocytes", LEUKOCYTE_OUTLINE, "白细胞", 0)
+        draw_series("cells", CELL_COLOR, "普通细胞", 20)
+        draw_series("viruses", VIRUS_COLOR, "病毒", 40)
+        draw_series("antibodies", AB_COLOR, "抗体", 60)
 
     # ---------- 绘制 ----------
     def render(self):
-        self.canvas.delete("dyn")
-
-        # 细胞（按状态变色）
-        for c in self.cells:
-            if c.state == "healthy":
-                col = CELL_COLOR
-            elif c.state == "infected":
-                col = CELL_INFECTED_BOUND_COLOR if c.antibody_attached > 0 else CELL_INFECTED_COLOR
-            else:
-                col = CELL_DEAD_COLOR
-
-            self.canvas.create_oval(c.x - c.r, c.y - c.r, c.x + c.r, c.y + c.r,
-                                    fill=col, outline="", tags=("dyn",))
-            # 核心点
-            self.canvas.create_oval(c.x - 3, c.y - 3, c.x + 3, c.y + 3,
-                                    fill="#2F4B7C", outline="", tags=("dyn",))
-
-            # 感染倒计时显示（可选）
-            if c.state == "infected":
-                self.canvas.create_text(c.x, c.y - c.r - 10, text=f"{max(0.0, c.burst_timer):.1f}s",
-                                        fill="#333", font=("Helvetica", 10), tags=("dyn",))
-
-        # 病毒
-        for v in self.viruses:
-            v_col = VIRUS_BOUND_COLOR if v.attached > 0 else VIRUS_COLOR
-            self.canvas.create_oval(v.x - VIRUS_R, v.y - VIRUS_R, v.x + VIRUS_R, v.y + VIRUS_R,
-                                    fill=v_col, outline="", tags=("dyn",))
-
-        # 抗体（Y）
-        for a in self.antibodies:
-            col = AB_FLASH_COLOR if a.flash > 0 else AB_COLOR
-            s = AB_Y_SIZE
-            x, y = a.x, a.y
-            self.canvas.create_line(x, y, x - s, y - s, fill=col, width=2, tags=("dyn",))
-            self.canvas.create_line(x, y, x + s, y - s, fill=col, width=2, tags=("dyn",))
-            self.canvas.create_line(x, y, x, y + s + 2, fill=col, width=2, tags=("dyn",))
-
-        # 白细胞
-        for w in self.leukocytes:
-            self.canvas.create_oval(w.x - LEUKOCYTE_R, w.y - LEUKOCYTE_R,
-                                    w.x + LEUKOCYTE_R, w.y + LEUKOCYTE_R,
-                                    fill=LEUKOCYTE_COLOR, outline=LEUKOCYTE_OUTLINE, width=2, tags=("dyn",))
-
-        # HUD
-        self.canvas.create_text(12, 42, anchor="nw",
-                                text=(f"Tick:{self.tick}  Viruses:{len(self.viruses)}  "
-                                      f"Antibodies:{len(self.antibodies)}  Captured:{self.captured}  "
-                                      f"Infected:{self.infected_count}  Bursts:{self.burst_count}  "
-                                      f"Leukocytes:{len(self.leukocytes)}"),
-                                fill="#111", font=("Helvetica", 12), tags=("dyn",))
+        if self.runner is not None:
+            self.render_latest()
+            return
+        prof = self.sim.profiler
+        t = prof.start()
+        self.renderer.draw(self.sim)
+        prof.lap("render", t, RENDER_TRACK)
+
+    def render_latest(self):
+        # 只画模拟线程发布的最新快照，没有新帧就什么都不做；绘制耗时交给模拟线程记进 profiler
+        seq, snap = self.runner.snapshots.latest()
+        if snap is None or seq == self.drawn_seq:
+            return
+        start = time.perf_counter()
+        self.renderer.draw_snapshot(snap)
+        self.drawn_seq = seq
+        if self.profile.get():
+            self.runner.send("profile_span", "render", start, time.perf_counter(), RENDER_TRACK)
+
+
+def make_simulation(backend: str, seed: Optional[int] = None, integrator: str = "euler",
+                    workers: Optional[int] = None):
+    if backend in ("numpy", "parallel"):
+        if integrator != "euler":
+            raise ValueError(f"the {backend} backend only supports the euler integrator, got {integrator!r}")
+        # 数组后端依赖 numpy，只在选用时导入
+        if backend == "parallel":
+            from parallel_sim import ParallelSimulation
+            return ParallelSimulation(seed, workers)
+        from array_sim import ArraySimulation
+        return ArraySimulation(seed)
+    sim = Simulation(seed)
+    sim.set_integrator(integrator)
+    return sim
+
+
+def load_or_create(backend: str, seed: Optional[int] = None, load_path: Optional[str] = None,
+                   integrator: str = "euler", workers: Optional[int] = None):
+    sim = make_simulation(backend, seed, integrator, workers)
+    if load_path:
+        try:
+            load_checkpoint(load_path, sim)
+        except BaseException:
+            if backend == "parallel":
+                sim.close()
+            raise
+        if seed is not None:
+            # 从存档分叉：世界状态不变，只换随机流
+            sim.reseed(seed)
+    return sim
+
+
+def run_headless(seconds: float, dt: float, out_path: Optional[str], backend: str = "objects",
+                 seed: Optional[int] = None, metrics: Optional[MetricsRecorder] = None,
+                 load_path: Optional[str] = None, save_path: Optional[str] = None,
+                 profile: bool = False, trace_path: Optional[str] = None, integrator: str = "euler",
+                 workers: Optional[int] = None) -> None:
+    sim = load_or_create(backend, seed, load_path, integrator, workers)
+    try:
+        if not load_path:
+            short = [f"{name} {placed}/{requested}" for name, (placed, requested) in sim.placed.items()
+                     if placed < requested]
+            if short:
+                print("initial placement did not fit, placed: " + ", ".join(short))
+        sim.attach_metrics(metrics)
+        sim.profiler.set_enabled(profile or bool(trace_path))
+        start = time.perf_counter()
+        steps = sim.run(seconds, dt)
+        wall = time.perf_counter() - start
+        print(f"simulated {sim.elapsed_time:.2f}s in {steps} steps, wall {wall:.2f}s "
+              f"(viruses={len(sim.viruses)} antibodies={len(sim.antibodies)} "
+              f"infected={sim.infected_count} bursts={sim.burst_count} captured={sim.captured} "
+              f"overlap={sim.overlap_residual:.2f}px) "
+              f"seed={sim.rng.seed}")
+        if out_path:
+            write_history_csv(out_path, sim.history)
+        if save_path:
+            save_checkpoint(sim, save_path)
+        if sim.profiler.enabled:
+            print(format_summary(sim.profiler, "per-phase time (mean per step):"))
+        if trace_path:
+            sim.profiler.dump_trace(trace_path)
+    finally:
+        if backend == "parallel":
+            # 出错时也要关掉工作进程并释放共享内存
+            sim.close()
 
 
 def main():
-    root = tk.Tk()
-    app = App(root)
-    root.mainloop()
+    parser = argparse.ArgumentParser(description="细胞/病毒/抗体模拟")
+    parser.add_argument("--headless", action="store_true", help="无界面运行，尽可能快地推进模拟")
+    parser.add_argument("--seconds", type=float, default=60.0, help="无界面模式模拟时长（秒）")
+    parser.add_argument("--dt", type=float, default=SIM_DT, help="无界面模式的时间步长（秒）")
+    parser.add_argument("--integrator", choices=INTEGRATORS, default=INTEGRATOR,
+                        help="积分方式：euler（默认）或 substep（按速度分子步 + 扫掠接触，大 --dt 快进用；仅对象引擎）")
+    parser.add_argument("--out", default=None, help="无界面模式结束后写出 history 的 CSV 路径")
+    parser.add_argument("--backend", choices=("objects", "numpy", "parallel"), default="objects",
+                        help="无界面模式的模拟后端：逐对象（默认）、numpy 结构数组，或按条带分块的多进程 numpy")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parallel 后端的工作进程数（默认 CPU 核数；条带数与之相同）")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子（不填则随机选取；无界面模式结束时打印）")
+    parser.add_argument("--metrics-csv", default=None, help="逐帧指标流式写出到该 CSV")
+    parser.add_argument("--metrics-dir", default=None, help="逐帧指标流式写成二进制列存目录（可 memmap 读回）")
+    parser.add_argument("--metrics-every", type=int, default=1, help="每隔多少帧写一行指标")
+    parser.add_argument("--load", default=None, help="从存档开始（配合 --seed 则换随机流分叉）")
+    parser.add_argument("--save", default=None, help="无界面模式结束时把世界状态存档到该路径")
+    parser.add_argument("--profile", action="store_true", help="开启分阶段计时（界面显示在 HUD，无界面结束时打印）")
+    parser.add_argument("--trace", default=None, help="开启分阶段计时，结束时导出 Chrome trace JSON")
+    parser.add_argument("--threaded", action="store_true",
+                        help="界面模式下模拟在后台线程里跑，界面只画它发布的快照（模拟慢时按钮仍然响应）")
+    parser.add_argument("--view", choices=VIEW_MODES, default="auto",
+                        help="界面画法：auto（默认，个体多时改画密度图）、entities（逐个画）、density（密度图）")
+    parser.add_argument("--density-field", choices=DENSITY_FIELDS, default="species",
+                        help="密度图内容：各物种密度叠色（默认）、感染细胞占比、死亡细胞占比")
+    parser.add_argument("--density-threshold", type=int, default=DENSITY_THRESHOLD,
+                        help="auto 视图下个体总数超过多少改画密度图")
+    parser.add_argument("--overlay", action="store_true", help="密度图上仍然画出每个个体")
+    args = parser.parse_args()
+    if args.backend != "objects" and args.integrator != "euler":
+        parser.error("--integrator substep requires --backend objects")
+
+    metrics = open_recorder(args.metrics_csv, args.metrics_dir, args.metrics_every)
+    try:
+        if args.headless:
+            run_headless(args.seconds, args.dt, args.out, args.backend, args.seed, metrics,
+                         args.load, args.save, args.profile, args.trace, args.integrator, args.workers)
+            return
+
+        root = tk.Tk()
+        view = ViewOptions(args.view, args.density_field, args.overlay, args.density_threshold)
+        app = App(root, args.seed, args.threaded, view)
+
+        def prepare(sim):
+            sim.set_integrator(args.integrator)
+            if args.load:
+                load_checkpoint(args.load, sim)
+                if args.seed is not None:
+                    sim.reseed(args.seed)
+            sim.attach_metrics(metrics)
+
+        app.call(prepare)
+        app.render()
+        if args.profile or args.trace:
+            app.profile.set(True)
+            app.toggle_profile()
+        try:
+            root.mainloop()
+        finally:
+            app.close()
+        if args.trace:
+            app.sim.profiler.dump_trace(args.trace)
+    finally:
+        if metrics is not None:
+            metrics.close()
 
 
 if __name__ == "__main__":
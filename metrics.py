@@ -0,0 +1,142 @@
+import csv
+import json
+import os
+import sys
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 每帧指标：history 的五列 + HUD 上显示的累计计数
+METRIC_FIELDS = ("time", "tick", "leukocytes", "cells", "viruses", "antibodies",
+                 "captured", "infected", "bursts")
+METRIC_TYPES = {name: "d" if name == "time" else "q" for name in METRIC_FIELDS}
+
+_ENDIAN = "<" if sys.byteorder == "little" else ">"
+_DTYPES = {"d": "f8", "q": "i8"}
+
+
+def metrics_row(sim) -> Tuple:
+    last = sim.history[-1]
+    return (last[0], sim.tick, last[1], last[2], last[3], last[4],
+            sim.captured, sim.infected_count, sim.burst_count)
+
+
+# ---------- CSV：按批写出 ----------
+class CsvSink:
+    def __init__(self, path: str, batch: int = 1024):
+        self.path = path
+        self.batch = batch
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(METRIC_FIELDS)
+        self.rows: List[Tuple] = []
+
+    def write(self, row: Sequence) -> None:
+        self.rows.append(tuple(row))
+        if len(self.rows) >= self.batch:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.rows:
+            self.writer.writerows(self.rows)
+            self.rows.clear()
+        self.file.flush()
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+# ---------- 二进制列存：每列一个原始定长文件，可直接 memmap ----------
+class ColumnarSink:
+    # 目录结构：meta.json（字段/类型/字节序） + 每列一个 <name>.bin
+    # 行数由文件长度推出，中途崩溃也能读到已落盘的部分
+    def __init__(self, directory: str, batch: int = 4096):
+        self.directory = directory
+        self.batch = batch
+        os.makedirs(directory, exist_ok=True)
+        meta = {"fields": list(METRIC_FIELDS),
+                "dtypes": {name: _ENDIAN + _DTYPES[code] for name, code in METRIC_TYPES.items()}}
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        self.files = [open(os.path.join(directory, name + ".bin"), "wb") for name in METRIC_FIELDS]
+        self.buffers = [array(METRIC_TYPES[name]) for name in METRIC_FIELDS]
+
+    def write(self, row: Sequence) -> None:
+        buffers = self.buffers
+        for buf, value in zip(buffers, row):
+            buf.append(value)
+        if len(buffers[0]) >= self.batch:
+            self.flush()
+
+    def flush(self) -> None:
+        for buf, f in zip(self.buffers, self.files):
+            if buf:
+                buf.tofile(f)
+                del buf[:]
+            f.flush()
+
+    def close(self) -> None:
+        if self.files and not self.files[0].closed:
+            self.flush()
+            for f in self.files:
+                f.close()
+
+
+def load_columns(directory: str, mmap: bool = True) -> Dict[str, Any]:
+    # 读回 ColumnarSink 的输出：返回 {列名: numpy 数组}，默认只做内存映射不读入内存
+    import numpy as np
+
+    with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    dtypes = {name: np.dtype(code) for name, code in meta["dtypes"].items()}
+    paths = {name: os.path.join(directory, name + ".bin") for name in meta["fields"]}
+    rows = min(os.path.getsize(paths[name]) // dtypes[name].itemsize for name in meta["fields"])
+    columns = {}
+    for name in meta["fields"]:
+        if mmap and rows:
+            columns[name] = np.memmap(paths[name], dtype=dtypes[name], mode="r", shape=(rows,))
+        else:
+            columns[name] = np.fromfile(paths[name], dtype=dtypes[name], count=rows)
+    return columns
+
+
+# ---------- 记录器：每 every 帧取一行，分发给所有输出 ----------
+class MetricsRecorder:
+    def __init__(self, sinks: Sequence, every: int = 1):
+        if every < 1:
+            raise ValueError(f"metrics interval must be positive, got {every}")
+        self.sinks = list(sinks)
+        self.every = every
+        self.count = 0
+
+    def record(self, sim) -> None:
+        if self.count % self.every == 0:
+            row = metrics_row(sim)
+            for sink in self.sinks:
+                sink.write(row)
+        self.count += 1
+
+    def flush(self) -> None:
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self) -> "MetricsRecorder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_recorder(csv_path: Optional[str] = None, columns_dir: Optional[str] = None,
+                  every: int = 1) -> Optional[MetricsRecorder]:
+    sinks: List[Any] = []
+    if csv_path:
+        sinks.append(CsvSink(csv_path))
+    if columns_dir:
+        sinks.append(ColumnarSink(columns_dir))
+    return MetricsRecorder(sinks, every) if sinks else None
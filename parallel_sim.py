@@ -0,0 +1,360 @@
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import simulation as S
+from array_sim import (ANTIBODY_FIELDS, CELL_FIELDS, HEALTHY, INFECTED, LEUKOCYTE_FIELDS, VIRUS_FIELDS,
+                       ArraySimulation, SpeciesArrays)
+from directions import DirectionTable
+from profiler import Profiler
+from rng import ArrayStreams
+
+SPECIES_FIELDS = {
+    "cells": CELL_FIELDS,
+    "viruses": VIRUS_FIELDS,
+    "antibodies": ANTIBODY_FIELDS,
+    "leukocytes": LEUKOCYTE_FIELDS,
+}
+# 块里每个个体多带一列 row：装块时的行号（本块拥有的在前、借来的幽灵在后），本步新生的为 -1
+TILE_FIELDS = {"row": (np.int64, -1)}
+PARTITION_SAMPLES = 8192  # 按 x 分位数切条时最多取多少个样本
+
+
+def halo_width() -> float:
+    # 每条两侧要借进来的带宽：白细胞/抗体的感知半径，再加一个大细胞直径（推开、接触判定）
+    return max(S.LEUKOCYTE_SENSE_RADIUS, S.AB_SENSE_RADIUS) + 2 * max(S.CELL_R_SMALL, S.CELL_R_LARGE)
+
+
+def tile_seed(seed: int, tick: int, strip: int) -> int:
+    # 每个块每一步一条独立的随机流：只取决于 (种子, 步数, 条号)，与哪个进程来算、先后顺序无关
+    words = np.random.SeedSequence([seed, tick, strip]).generate_state(2)
+    return (int(words[0]) << 32) | int(words[1])
+
+
+# ---------- 共享内存里的结构数组（双缓冲） ----------
+def _release(segments: List[shared_memory.SharedMemory]) -> None:
+    for shm in segments:
+        shm.unlink()
+        try:
+            shm.close()
+        except BufferError:
+            # 还有 numpy 视图引用着这段内存：名字已经删掉，映射随最后一个视图一起释放
+            pass
+    segments.clear()
+
+
+class SharedSpeciesArrays(SpeciesArrays):
+    # 每列成对放在共享内存里：data 是本步的输入（各块只读），back 接收各块写回的结果，一步结束时交换。
+    # 扩容时两组都换成新的段，旧段在拷贝完后释放；对象被回收时剩下的段也会释放
+    def __init__(self, fields: Dict[str, Tuple[type, float]], capacity: int = 64):
+        owned: List[shared_memory.SharedMemory] = []
+        object.__setattr__(self, "owned", owned)
+        object.__setattr__(self, "segments", {})  # 列名 -> (data 段名, back 段名)
+        object.__setattr__(self, "back", {})
+        object.__setattr__(self, "finalizer", weakref.finalize(self, _release, owned))
+        super().__init__(fields, capacity)
+
+    def _allocate(self, capacity: int) -> Dict[str, np.ndarray]:
+        # 同时分配 back 那一组（back 的内容每步都会被整体重写，扩容时不必拷贝）
+        data, back, segments = {}, {}, {}
+        for name, (dtype, default) in self.fields.items():
+            names = []
+            for target in (data, back):
+                shm = shared_memory.SharedMemory(create=True, size=max(1, capacity * np.dtype(dtype).itemsize))
+                col = np.ndarray(capacity, dtype=dtype, buffer=shm.buf)
+                col.fill(default)
+                target[name] = col
+                names.append(shm.name)
+                self.owned.append(shm)
+            segments[name] = tuple(names)
+        object.__setattr__(self, "back", back)
+        object.__setattr__(self, "segments", segments)
+        return data
+
+    def _reserve(self, extra: int) -> None:
+        stale = list(self.owned)
+        super()._reserve(extra)
+        if len(self.owned) > len(stale):
+            for shm in stale:
+                self.owned.remove(shm)
+            _release(stale)
+
+    def swap(self) -> None:
+        data, back = self.data, self.back
+        object.__setattr__(self, "data", back)
+        object.__setattr__(self, "back", data)
+        object.__setattr__(self, "segments", {name: (b, d) for name, (d, b) in self.segments.items()})
+
+    def layout(self) -> Tuple[int, Dict[str, Tuple[str, str, str]]]:
+        # 工作进程按段名挂接：(容量, {列名: (data 段, back 段, dtype)})
+        return self.capacity, {name: (d, b, np.dtype(self.fields[name][0]).str)
+                               for name, (d, b) in self.segments.items()}
+
+    def release(self) -> None:
+        object.__setattr__(self, "data", {})
+        object.__setattr__(self, "back", {})
+        self.finalizer()
+
+
+# ---------- 工作进程一侧 ----------
+_ATTACHED: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = _ATTACHED.get(name)
+    if shm is None:
+        # 段由主进程创建和释放；工作进程与主进程共用同一个资源追踪器，挂接时的重复登记不会多删
+        shm = _ATTACHED[name] = shared_memory.SharedMemory(name=name)
+    return shm
+
+
+def _attached_views(layout: Dict[str, Tuple[int, Dict[str, Tuple[str, str, str]]]]):
+    live = set()
+    views = {}
+    for species, (capacity, columns) in layout.items():
+        data, back = {}, {}
+        for field, (d, b, dtype) in columns.items():
+            data[field] = np.ndarray(capacity, dtype=dtype, buffer=_attach(d).buf)
+            back[field] = np.ndarray(capacity, dtype=dtype, buffer=_attach(b).buf)
+            live.update((d, b))
+        views[species] = (data, back)
+    # 主进程扩容后旧段就不会再出现了，顺手关掉
+    for name in [name for name in _ATTACHED if name not in live]:
+        try:
+            _ATTACHED.pop(name).close()
+        except BufferError:
+            pass
+    return views
+
+
+def _run_tile(task: Dict[str, Any]) -> Dict[str, Any]:
+    with S.override_params(task["params"]):
+        return step_tile(task, _attached_views(task["layout"]))
+
+
+class TileSimulation(ArraySimulation):
+    # 一个条带块：本块拥有的个体 + 从两侧借来的幽灵个体，直接复用 ArraySimulation 的各阶段。
+    # 不调用父类构造（那会生成一个初始世界），只准备各阶段用到的属性。
+    # 幽灵只作为被动方：不发起感染/捕获/清理，计时器也不会到期（由拥有它的块负责）
+    def __init__(self, seed: int, now: float, tick: int):
+        self.gen = ArrayStreams(seed)
+        self.direction_table = DirectionTable(S.N_DIRECTIONS)
+        self.directions = self.direction_table.directions
+        self.profiler = Profiler()
+        self.captured = 0
+        self.infected_count = 0
+        self.burst_count = 0
+        self.elapsed_time = now
+        self.tick = tick
+        self.ca_accum = 0.0
+        for species, fields in SPECIES_FIELDS.items():
+            setattr(self, species, SpeciesArrays({**fields, **TILE_FIELDS}))
+
+    def acting(self, sa: SpeciesArrays) -> np.ndarray:
+        return np.flatnonzero(sa.row < sa.owned)
+
+
+def _ghost_index(task: Dict[str, Any], species: str, data: Dict[str, np.ndarray]) -> np.ndarray:
+    start, end = task["ranges"][species]
+    starts = task["starts"][species]
+    if species == "leukocytes":
+        # 白细胞很少，病毒要躲最近的那个（不限距离），所以全部借进来
+        return np.r_[np.arange(0, start), np.arange(end, starts[-1])]
+    lo, hi, halo = task["lo"], task["hi"], task["halo"]
+    bounds = task["bounds"]
+    strips = len(starts) - 1
+    first = int(np.searchsorted(bounds, lo - halo, side="right")) - 1
+    last = int(np.searchsorted(bounds, hi + halo, side="left"))
+    first, last = max(first, 0), min(last, strips)
+    index = np.r_[np.arange(starts[first], start), np.arange(end, starts[last])]
+    x = data["x"][index]
+    return index[(x >= lo - halo) & (x < hi + halo)]
+
+
+def step_tile(task: Dict[str, Any], views) -> Dict[str, Any]:
+    # 装块 -> 跑一步 -> 本块拥有且存活的个体写回 back；新生个体、对幽灵的改动（被感染、被附着、被吞）交回主进程合并
+    tile = TileSimulation(task["seed"], task["now"], task["tick"])
+    loaded = {}
+    for species, fields in SPECIES_FIELDS.items():
+        data, _ = views[species]
+        start, end = task["ranges"][species]
+        gids = np.r_[np.arange(start, end), _ghost_index(task, species, data)]
+        sa = getattr(tile, species)
+        columns = {name: data[name][gids] for name in fields}
+        owned = end - start
+        if species == "cells":
+            # 幽灵细胞不会在本块爆发、长大或分裂
+            columns["burst_at"][owned:] = np.inf
+            columns["divide_at"][owned:] = np.inf
+        sa.extend(row=np.arange(len(gids)), **columns)
+        sa.owned = owned
+        loaded[species] = (gids, owned, columns)
+
+    tile.advance(task["dt"], task["ca_due"], 0.0)
+
+    result = {"captured": tile.captured, "bursts": tile.burst_count, "overlap_residual": tile.overlap_residual,
+              "removed": {}, "born": {}, "infected": np.empty(0, dtype=np.int64), "born_infected": 0,
+              "attached": None, "antibody_attached": None}
+    for species, fields in SPECIES_FIELDS.items():
+        gids, owned, before = loaded[species]
+        sa = getattr(tile, species)
+        _, back = views[species]
+        rows = sa.row
+        kept = rows >= 0
+        survivors = rows[kept]
+        gone = np.ones(len(gids), dtype=bool)
+        gone[survivors] = False
+        result["removed"][species] = gids[gone]
+
+        mine = survivors < owned
+        targets = gids[survivors[mine]]
+        for name in fields:
+            back[name][targets] = getattr(sa, name)[kept][mine]
+        born = ~kept
+        if born.any():
+            result["born"][species] = {name: getattr(sa, name)[born].copy() for name in fields}
+
+        ghost_rows = survivors[~mine]
+        ghost_gids = gids[ghost_rows]
+        if species == "cells":
+            state = sa.state[kept]
+            was_healthy = before["state"][survivors] == HEALTHY
+            newly = was_healthy & (state == INFECTED)
+            result["infected"] = gids[survivors[newly]]
+            result["born_infected"] = int(np.count_nonzero(sa.state[born] == INFECTED))
+            delta = sa.antibody_attached[kept][~mine] - before["antibody_attached"][ghost_rows]
+            hit = delta != 0
+            result["antibody_attached"] = (ghost_gids[hit], delta[hit])
+        elif species == "viruses":
+            delta = sa.attached[kept][~mine] - before["attached"][ghost_rows]
+            hit = delta != 0
+            result["attached"] = (ghost_gids[hit], delta[hit])
+    return result
+
+
+# ---------- 主进程：按 x 切条、分发、合并 ----------
+class ParallelSimulation(ArraySimulation):
+    # 大圆按 x 切成 strips 条，每条条带连同两侧 halo_width() 宽的幽灵个体交给一个工作进程，
+    # 用与 ArraySimulation 相同的各阶段推进一步。各物种的列放在共享内存里，每步开头按条号稳定排序，
+    # 使每条拥有的个体在数组里连续；工作进程直接读共享内存、把结果写进 back 缓冲，不经过管道拷贝整列。
+    # 与串行引擎在统计意义上等价（随机流按块派生、边界上极少数同一步的争抢按先并集后计数处理），
+    # 同一种子、同样条数的结果逐位可复现，与进程数无关
+    species_arrays = SharedSpeciesArrays
+
+    def __init__(self, seed: Optional[int] = None, workers: Optional[int] = None,
+                 strips: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.strips = strips or self.workers
+        if self.workers < 1 or self.strips < 1:
+            raise ValueError(f"workers and strips must be positive, got {self.workers} and {self.strips}")
+        self.pool: Optional[ProcessPoolExecutor] = None
+        super().__init__(seed)
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        for species in SPECIES_FIELDS:
+            getattr(self, species).release()
+
+    def __enter__(self) -> "ParallelSimulation":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ---------- 切条 ----------
+    def _boundaries(self) -> np.ndarray:
+        # 条带边界取各物种 x 的分位数（抽样估计），每条的个体数大致相同；两端是 ±inf
+        xs = [getattr(self, species).x for species in ("cells", "viruses", "antibodies")]
+        stride = [max(1, len(x) * len(xs) // PARTITION_SAMPLES) for x in xs]
+        sample = np.concatenate([x[::step] for x, step in zip(xs, stride)])
+        inner = np.quantile(sample, np.arange(1, self.strips) / self.strips) if len(sample) else \
+            np.linspace(S.CENTER - S.RADIUS, S.CENTER + S.RADIUS, self.strips + 1)[1:-1]
+        return np.r_[-np.inf, inner, np.inf]
+
+    def _partition(self, bounds: np.ndarray) -> Dict[str, np.ndarray]:
+        # 各物种按条号稳定排序（已经有序就不动），返回每条的起始下标
+        starts = {}
+        for species in SPECIES_FIELDS:
+            sa = getattr(self, species)
+            strip = np.searchsorted(bounds[1:-1], sa.x, side="right").astype(np.int32)
+            if len(strip) > 1 and (strip[1:] < strip[:-1]).any():
+                order = np.argsort(strip, kind="stable")
+                n = len(sa)
+                for name in sa.fields:
+                    np.take(sa.data[name][:n], order, out=sa.back[name][:n])
+                sa.swap()
+                strip = strip[order]
+            starts[species] = np.searchsorted(strip, np.arange(self.strips + 1), side="left")
+        return starts
+
+    # ---------- 一步 ----------
+    def advance(self, dt: float, ca_due: bool, t: float) -> float:
+        prof = self.profiler
+        bounds = self._boundaries()
+        starts = self._partition(bounds)
+        t = prof.lap("partition", t)
+
+        layout = {species: getattr(self, species).layout() for species in SPECIES_FIELDS}
+        params = {name: getattr(S, name) for name in S.param_names()}
+        halo = halo_width()
+        tasks = []
+        for k in range(self.strips):
+            tasks.append({
+                "strip": k, "lo": bounds[k], "hi": bounds[k + 1], "bounds": bounds, "halo": halo,
+                "starts": starts, "ranges": {sp: (int(s[k]), int(s[k + 1])) for sp, s in starts.items()},
+                "seed": tile_seed(self.rng.seed, self.tick, k), "tick": self.tick,
+                "now": self.elapsed_time, "dt": dt, "ca_due": ca_due,
+                "layout": layout, "params": params,
+            })
+        if self.workers == 1:
+            # 单进程：直接在本进程里逐块计算（与多进程结果逐位相同，便于调试）
+            views = {species: (getattr(self, species).data, getattr(self, species).back)
+                     for species in SPECIES_FIELDS}
+            results = [step_tile(task, views) for task in tasks]
+        else:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            results = list(self.pool.map(_run_tile, tasks))
+        t = prof.lap("tiles", t)
+
+        self._merge(results)
+        return prof.lap("merge", t)
+
+    def _merge(self, results: List[Dict[str, Any]]) -> None:
+        # back 里已是各块写回的存活个体，换成当前数据后再叠加跨块的改动、删除、新生
+        for species in SPECIES_FIELDS:
+            getattr(self, species).swap()
+        c, v = self.cells, self.viruses
+
+        # 被感染：多个块同一步感染同一个细胞只算一次
+        infected = np.unique(np.concatenate([r["infected"] for r in results]))
+        fresh = infected[c.state[infected] == HEALTHY]
+        c.state[fresh] = INFECTED
+        c.burst_at[fresh] = self.elapsed_time + S.VIRUS_REPLICATION_TIME
+        self.infected_count += len(infected) + sum(r["born_infected"] for r in results)
+        self.overlap_residual = max(r["overlap_residual"] for r in results)
+
+        for r in results:
+            gids, delta = r["attached"]
+            np.add.at(v.attached, gids, delta)
+            gids, delta = r["antibody_attached"]
+            np.add.at(c.antibody_attached, gids, delta)
+            self.captured += r["captured"]
+            self.burst_count += r["bursts"]
+
+        for species, fields in SPECIES_FIELDS.items():
+            sa = getattr(self, species)
+            removed = np.concatenate([r["removed"][species] for r in results])
+            if len(removed):
+                keep = np.ones(len(sa), dtype=bool)
+                keep[removed] = False
+                sa.keep(keep)
+            born = [r["born"][species] for r in results if species in r["born"]]
+            if born:
+                sa.extend(**{name: np.concatenate([b[name] for b in born]) for name in fields})
@@ -0,0 +1,310 @@
+import math
+import random
+from typing import Any, List, Sequence, Tuple
+
+# 同种点的网格：格长取 间距/√2，每格最多一个点；候选点只需看周围 5×5 去掉四角的 21 格（近的先看）
+_NEAR = sorted(((dx, dy) for dx in range(-2, 3) for dy in range(-2, 3) if abs(dx) + abs(dy) < 4),
+               key=lambda d: d[0] * d[0] + d[1] * d[1])
+_FAR = 1e30     # 空格子里放的坐标：离谁都远
+SEEDS = 32      # 铺满之前先在圆里随机撒多少个起点（被障碍隔开的空隙也能长到）
+FILL_AREA = 1.3  # 按间距 g 铺满时每个点大约占 FILL_AREA·g² 的面积
+SPARSE = 4      # 要求的数量不到铺满时点数的 1/SPARSE 时，直接均匀撒点，不必先铺满
+DART_TRIES = 20  # 均匀撒点时平均每个点最多试几次；试完还不够（障碍占掉了大半面积）就改为铺满再挑
+
+
+# ---------- 障碍点（别的物种）网格：格长取避让距离，只看周围 3×3 格 ----------
+class _Obstacles:
+    def __init__(self, points: Sequence[Tuple[float, float]], clearance: float):
+        self.clear2 = clearance * clearance
+        self.points = list(points)
+        self.buckets = {}
+        self.inv = 1.0 / clearance if clearance > 0 and self.points else 0.0
+        self._sorted = None
+        if self.inv:
+            for x, y in self.points:
+                key = (math.floor(x * self.inv), math.floor(y * self.inv))
+                self.buckets.setdefault(key, []).append((x, y))
+
+    def blocks(self, x: float, y: float) -> bool:
+        if not self.inv:
+            return False
+        ix, iy = math.floor(x * self.inv), math.floor(y * self.inv)
+        buckets, clear2 = self.buckets, self.clear2
+        for kx in (ix - 1, ix, ix + 1):
+            for ky in (iy - 1, iy, iy + 1):
+                for ox, oy in buckets.get((kx, ky), ()):
+                    if (x - ox) * (x - ox) + (y - oy) * (y - oy) < clear2:
+                        return True
+        return False
+
+    # ---------- 批量（numpy） ----------
+    def blocks_many(self, x, y):
+        # 逐元素与 blocks 相同。格子编成一个整数 kx·2³² + ky；每个障碍点登记到自己和周围 8 格里，
+        # 按键排好序，查询点只需用 searchsorted 找自己那一格
+        import numpy as np
+
+        hit = np.zeros(len(x), dtype=bool)
+        if not self.inv or not len(x):
+            return hit
+        if self._sorted is None:
+            ox = np.array([p[0] for p in self.points])
+            oy = np.array([p[1] for p in self.points])
+            base = _cell_keys(np.floor(ox * self.inv), np.floor(oy * self.inv))
+            keys = np.concatenate([base + dx * (1 << 32) + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+            order = np.argsort(keys, kind="stable")
+            self._sorted = (keys[order], np.tile(ox, 9)[order], np.tile(oy, 9)[order])
+        keys, ox, oy = self._sorted
+        for i, j in _bucket_matches(keys, _cell_keys(np.floor(x * self.inv), np.floor(y * self.inv))):
+            ex = x[i] - ox[j]
+            ey = y[i] - oy[j]
+            hit[i[ex * ex + ey * ey < self.clear2]] = True
+        return hit
+
+
+def _cell_keys(kx, ky):
+    return kx.astype("int64") * (1 << 32) + ky.astype("int64") + (1 << 31)
+
+
+def _bucket_matches(sorted_keys, queries):
+    # 对每个查询键列出排好序的键里与它相等的全部位置：逐层产出 (查询下标, 键下标)
+    import numpy as np
+
+    lo = np.searchsorted(sorted_keys, queries, "left")
+    span = np.searchsorted(sorted_keys, queries, "right") - lo
+    for r in range(int(span.max()) if len(span) else 0):
+        i = np.flatnonzero(span > r)
+        yield i, lo[i] + r
+
+
+def _rank_in_cell(keys):
+    # 每个键在相同键里按出现先后的名次（0 起）
+    import numpy as np
+
+    order = np.argsort(keys, kind="stable")
+    sk = keys[order]
+    index = np.arange(len(keys))
+    starts = np.maximum.accumulate(np.where(np.r_[True, sk[1:] != sk[:-1]], index, 0))
+    rank = np.empty(len(keys), dtype=np.int64)
+    rank[order] = index - starts
+    return rank
+
+
+def _first_fit(n: int, lo, hi):
+    # 按下标顺序贪心取独立集（与逐个判定、先到先得的结果相同）：lo[k] < hi[k] 是一对冲突。
+    # 每轮里前面冲突方都已淘汰的点入选，前面有冲突方入选的点淘汰，直到全部定下来
+    import numpy as np
+
+    state = np.zeros(n, dtype=np.int8)  # 0 未定，1 入选，-1 淘汰
+    while True:
+        open_ = state == 0
+        if not open_.any():
+            return state > 0
+        taken = np.zeros(n, dtype=bool)
+        taken[hi[state[lo] > 0]] = True
+        waiting = np.zeros(n, dtype=bool)
+        waiting[hi[state[lo] == 0]] = True
+        state[open_ & taken] = -1
+        state[open_ & ~taken & ~waiting] = 1
+
+
+def _frame(gap: float, radius: float, center: Tuple[float, float]):
+    # 网格参数：格长的倒数、左下角、每行格数（四周各留 2 格，邻格下标不会越界）、21 个邻格的下标偏移
+    inv = math.sqrt(2) / gap
+    x0, y0 = center[0] - radius, center[1] - radius
+    width = int(2 * radius * inv) + 5
+    near = [dx * width + dy for dx, dy in _NEAR]
+    return inv, x0, y0, width, near
+
+
+def _darts(rng: Any, tries: int, radius: float, center: Tuple[float, float]):
+    # 在圆里均匀撒 tries 个点（每个点先抽角度、再抽半径），两种实现共用，保证抽数顺序相同
+    rand = rng.random
+    cx, cy = center
+    cos, sin, sqrt, two_pi = math.cos, math.sin, math.sqrt, 2 * math.pi
+    for _ in range(tries):
+        a = rand() * two_pi
+        rr = sqrt(rand()) * radius
+        yield cx + rr * cos(a), cy + rr * sin(a)
+
+
+# ---------- 逐点放置（纯 Python） ----------
+def _sampler(gap: float, radius: float, center: Tuple[float, float], rng: Any, obstacles: _Obstacles):
+    # 返回 (throw, grow, result)：throw 均匀撒点直到放够 count 个或试满 tries 次；
+    # grow 是 Bridson：按放下的先后依次取出每个点，在它周围距离刚好 gap 的圆上试互成 90° 的 4 个候选
+    # （起始角随机），放得下的全部放下，所有点都取过一遍时圆就铺满了。同一个点的 4 个候选两两相距至少
+    # √2·gap，彼此不会冲突
+    cx, cy = center
+    r2 = radius * radius
+    gap2 = gap * gap
+    inv, x0, y0, width, near = _frame(gap, radius, center)
+    gx = [_FAR] * (width * width)
+    gy = [_FAR] * (width * width)
+    points: List[Tuple[float, float]] = []
+    blocks = obstacles.blocks
+
+    def place(x: float, y: float) -> None:
+        dx, dy = x - cx, y - cy
+        if dx * dx + dy * dy > r2:
+            return
+        key = (int((x - x0) * inv) + 2) * width + int((y - y0) * inv) + 2
+        for off in near:
+            dx, dy = x - gx[key + off], y - gy[key + off]
+            if dx * dx + dy * dy < gap2:
+                return
+        if blocks(x, y):
+            return
+        gx[key] = x
+        gy[key] = y
+        points.append((x, y))
+
+    def throw(count: float, tries: int) -> None:
+        done = 0
+        while len(points) < count and done < tries:
+            step = min(count - len(points), tries - done)
+            done += step
+            for x, y in _darts(rng, step, radius, center):
+                place(x, y)
+
+    def grow() -> None:
+        # 距离略大于 gap，免得舍入误差把恰好相距 gap 的候选判成冲突
+        reach = gap * (1.0 + 1e-9)
+        rand = rng.random
+        cos, sin, two_pi = math.cos, math.sin, 2 * math.pi
+        i = 0
+        while i < len(points):
+            px, py = points[i]
+            i += 1
+            a = rand() * two_pi
+            ux, uy = reach * cos(a), reach * sin(a)
+            place(px + ux, py + uy)
+            place(px - uy, py + ux)
+            place(px - ux, py - uy)
+            place(px + uy, py - ux)
+
+    def result() -> List[Tuple[float, float]]:
+        return points
+
+    return throw, grow, result
+
+
+# ---------- 逐批放置（numpy） ----------
+def _sampler_batch(gap: float, radius: float, center: Tuple[float, float], rng: Any, obstacles: _Obstacles):
+    # 与 _sampler 逐位相同：一批候选（throw 的一批随机点，或 grow 里上一代放下的点生成的下一代候选）
+    # 先整组对照已放好的点、圆和障碍判定，批内候选之间的冲突再按候选顺序先到先得（_first_fit）。
+    # 随机数仍从 rng 按同样的顺序逐个抽取，三角函数也用 math 算，保证取到完全相同的浮点数
+    import numpy as np
+
+    cx, cy = center
+    r2 = radius * radius
+    gap2 = gap * gap
+    inv, x0, y0, width, near = _frame(gap, radius, center)
+    near = np.array(near, dtype=np.int64)
+    gx = np.full(width * width, _FAR)
+    gy = np.full(width * width, _FAR)
+    owner = np.full(width * width, -1, dtype=np.int64)
+    out_x: List[Any] = []
+    out_y: List[Any] = []
+    placed = [0]
+
+    def place(x, y):
+        # 放下这批候选里放得下的，返回放下的坐标
+        dx, dy = x - cx, y - cy
+        inside = np.flatnonzero(dx * dx + dy * dy <= r2)
+        x, y = x[inside], y[inside]
+        keys = (((x - x0) * inv).astype(np.int64) + 2) * width + ((y - y0) * inv).astype(np.int64) + 2
+        cells = keys[:, None] + near
+        ex = x[:, None] - gx[cells]
+        ey = y[:, None] - gy[cells]
+        free = ~(ex * ex + ey * ey < gap2).any(axis=1)
+        free &= ~obstacles.blocks_many(x, y)
+        x, y, keys = x[free], y[free], keys[free]
+        if not len(x):
+            return x, y
+
+        # 批内冲突对：一格里可能有好几个候选，按格内名次分层，每层把候选编号写进 owner 网格，
+        # 再对 21 个邻格各取一次编号
+        rank = _rank_in_cell(keys)
+        index = np.arange(len(x))
+        lo_parts, hi_parts = [], []
+        for layer in range(int(rank.max()) + 1):
+            members = np.flatnonzero(rank == layer)
+            owner[keys[members]] = members
+            for off in near:
+                j = owner[keys + off]
+                i = np.flatnonzero(j > index)
+                j = j[i]
+                ex = x[j] - x[i]
+                ey = y[j] - y[i]
+                close = ex * ex + ey * ey < gap2
+                lo_parts.append(i[close])
+                hi_parts.append(j[close])
+            owner[keys[members]] = -1
+        keep = _first_fit(len(x), np.concatenate(lo_parts), np.concatenate(hi_parts))
+        x, y, keys = x[keep], y[keep], keys[keep]
+        gx[keys] = x
+        gy[keys] = y
+        out_x.append(x)
+        out_y.append(y)
+        placed[0] += len(x)
+        return x, y
+
+    def throw(count: float, tries: int) -> None:
+        done = 0
+        while placed[0] < count and done < tries:
+            step = min(count - placed[0], tries - done)
+            done += step
+            darts = list(_darts(rng, step, radius, center))
+            place(np.array([d[0] for d in darts]), np.array([d[1] for d in darts]))
+
+    def grow() -> None:
+        if not out_x:
+            return
+        reach = gap * (1.0 + 1e-9)
+        rand = rng.random
+        cos, sin, two_pi = math.cos, math.sin, 2 * math.pi
+        # 所有已放下的点按先后作为第一代父点
+        x, y = np.concatenate(out_x), np.concatenate(out_y)
+        while len(x):
+            angles = [rand() * two_pi for _ in range(len(x))]
+            ux = np.array([reach * cos(a) for a in angles])
+            uy = np.array([reach * sin(a) for a in angles])
+            x, y = place(np.stack((x + ux, x - uy, x - ux, x + uy), axis=1).ravel(),
+                         np.stack((y + uy, y + ux, y - uy, y - ux), axis=1).ravel())
+
+    def result() -> List[Tuple[float, float]]:
+        if not out_x:
+            return []
+        return list(zip(np.concatenate(out_x).tolist(), np.concatenate(out_y).tolist()))
+
+    return throw, grow, result
+
+
+# ---------- 圆内泊松圆盘采样 ----------
+def poisson_disk(count: int, spacing: float, radius: float, center: Tuple[float, float],
+                 rng: Any = random, obstacles: Sequence[Tuple[float, float]] = (),
+                 clearance: float = 0.0, batch: bool = False) -> List[Tuple[float, float]]:
+    # 在圆里放最多 count 个点：两两相距不小于 spacing，离每个障碍点不小于 clearance，
+    # 分布与在圆里均匀随机撒点一样（只是多了最小间距）：
+    # - 要的点远少于圆里放得下的（不到铺满时的 1/SPARSE），直接均匀撒点（带网格的拒绝采样）；
+    # - 否则先按 spacing 把整个圆铺满（Bridson），再从中随机挑 count 个。
+    # 放不下时返回的点少于 count，由调用方决定怎么报告。
+    # batch=True 用 numpy 整批判定（给数组后端用），结果与纯 Python 版逐位相同
+    if spacing <= 0:
+        raise ValueError(f"spacing must be positive, got {spacing}")
+    if count <= 0 or radius <= 0:
+        return []
+    blocked = _Obstacles(obstacles, clearance)
+    make = _sampler_batch if batch else _sampler
+    if count * SPARSE <= math.pi * radius * radius / (FILL_AREA * spacing * spacing):
+        throw, _, result = make(spacing, radius, center, rng, blocked)
+        throw(count, DART_TRIES * count)
+        placed = result()
+        if len(placed) >= count:
+            return placed
+    throw, grow, result = make(spacing, radius, center, rng, blocked)
+    throw(math.inf, SEEDS)
+    grow()
+    placed = result()
+    if len(placed) > count:
+        placed = rng.sample(placed, count)
+    return placed
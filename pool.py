@@ -0,0 +1,72 @@
+from typing import Any, Callable, Iterable, List, Optional
+
+from spatial import SpatialHash
+
+
+# ---------- 个体池：活跃个体 + 空闲表，删除为 O(1) 交换删除 ----------
+class EntityPool(list):
+    # 活跃个体就是列表本身（下标访问、遍历保持 list 的速度）；每个个体的 slot 记着自己的下标。
+    # 删除时把末尾个体换到空位再弹出，腾出的对象放进空闲表，spawn 时原地重新初始化复用，
+    # 稳态下每帧不产生新对象。注意：交换删除会改变个体顺序
+    def __init__(self, factory: Callable[..., Any]):
+        super().__init__()
+        self.factory = factory
+        self.free: List[Any] = []
+        self.doomed: set = set()  # 本帧标记待删除的下标，sweep 时统一删除
+
+    def load(self, items: Iterable[Any]) -> None:
+        self.clear()
+        self.extend(items)
+        for idx, item in enumerate(self):
+            item.slot = idx
+        self.doomed.clear()
+
+    def spawn(self, *args, **kwargs) -> Any:
+        if self.free:
+            item = self.free.pop()
+            item.__init__(*args, **kwargs)
+        else:
+            item = self.factory(*args, **kwargs)
+        item.slot = len(self)
+        self.append(item)
+        return item
+
+    def spawn_many(self, *columns: Iterable) -> None:
+        # 批量生成：每一列是一个字段（按位置参数顺序），逐行复用空闲对象
+        spawn = self.spawn
+        for row in zip(*columns):
+            spawn(*row)
+
+    def respawn(self, item: Any, *args, **kwargs) -> Any:
+        # 原地把一个活跃个体重新初始化成新个体（下标不变）
+        slot = item.slot
+        item.__init__(*args, **kwargs)
+        item.slot = slot
+        return item
+
+    def swap_remove(self, idx: int, grid: Optional[SpatialHash] = None) -> Any:
+        last = len(self) - 1
+        item = self[idx]
+        if idx != last:
+            moved = self[last]
+            self[idx] = moved
+            moved.slot = idx
+        self.pop()
+        if grid is not None:
+            grid.remove(idx)
+            if idx != last:
+                grid.relabel(last, idx)
+        self.free.append(item)
+        return item
+
+    def mark(self, idx: int) -> None:
+        self.doomed.add(idx)
+
+    def sweep(self, grid: Optional[SpatialHash] = None) -> int:
+        # 从大到小删除：被换进来的末尾个体下标总比当前下标大，不会是还没处理的待删除项
+        count = len(self.doomed)
+        if count:
+            for idx in sorted(self.doomed, reverse=True):
+                self.swap_remove(idx, grid)
+            self.doomed.clear()
+        return count
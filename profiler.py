@@ -0,0 +1,101 @@
+import json
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# HUD 上显示的短名（其余阶段原名显示）
+SHORT_NAMES = {
+    "ca_step": "ca", "move_cells": "cells", "growth": "grow", "overlaps": "overlap",
+    "move_agents": "agents", "bursts": "burst", "contacts": "contact", "infection": "infect",
+    "capture": "capture", "cleanup": "cleanup", "history": "hist",
+    "render": "render",
+}
+SIM_TRACK = 1     # trace 里模拟阶段所在的线程轨道
+RENDER_TRACK = 2  # 绘制阶段所在的轨道
+
+
+# ---------- 分阶段计时：关闭时每个打点只是一次方法调用 + 一次属性判断 ----------
+class Profiler:
+    # 用法（各阶段首尾相接）：
+    #   t = prof.start()
+    #   ...阶段 A...
+    #   t = prof.lap("A", t)
+    #   ...阶段 B...
+    #   t = prof.lap("B", t)
+    def __init__(self, window: int = 120, max_events: int = 200000):
+        self.enabled = False
+        self.window = window
+        self.samples: Dict[str, Deque[float]] = {}
+        self.totals: Dict[str, Tuple[float, int]] = {}  # 开启以来的 (总耗时, 次数)
+        self.events: Deque[tuple] = deque(maxlen=max_events)
+        self.origin = time.perf_counter()
+        self.clock = time.perf_counter
+
+    def set_enabled(self, enabled: bool) -> None:
+        self.enabled = enabled
+
+    def reset(self) -> None:
+        self.samples.clear()
+        self.totals.clear()
+        self.events.clear()
+
+    def start(self) -> float:
+        if not self.enabled:
+            return 0.0
+        return self.clock()
+
+    def lap(self, name: str, start: float, track: int = SIM_TRACK) -> float:
+        if not self.enabled:
+            return 0.0
+        now = self.clock()
+        if start:
+            self.add(name, start, now, track)
+        return now
+
+    def add(self, name: str, start: float, end: float, track: int = SIM_TRACK) -> None:
+        elapsed = end - start
+        bucket = self.samples.get(name)
+        if bucket is None:
+            bucket = self.samples[name] = deque(maxlen=self.window)
+        bucket.append(elapsed)
+        total, count = self.totals.get(name, (0.0, 0))
+        self.totals[name] = (total + elapsed, count + 1)
+        self.events.append((name, start, elapsed, track))
+
+    # ---------- 统计 ----------
+    def rolling(self) -> Dict[str, Tuple[float, float]]:
+        # 最近 window 次的 (平均, 最大)，单位秒
+        return {name: (sum(values) / len(values), max(values))
+                for name, values in self.samples.items() if values}
+
+    def hud_text(self) -> str:
+        parts = [f"{SHORT_NAMES.get(name, name)} {mean * 1000:.2f}"
+                 for name, (mean, _) in self.rolling().items()]
+        return "Profile ms: " + "  ".join(parts) if parts else "Profile ms: (collecting)"
+
+    def summary(self) -> List[Tuple[str, float, int]]:
+        # 开启以来各阶段 (名字, 平均毫秒, 次数)，按总耗时从大到小
+        rows = [(name, total / count * 1000, count) for name, (total, count) in self.totals.items() if count]
+        rows.sort(key=lambda row: -row[1] * row[2])
+        return rows
+
+    # ---------- Chrome trace（chrome://tracing / Perfetto 可直接打开） ----------
+    def trace_events(self) -> List[dict]:
+        origin = self.origin
+        events = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": SIM_TRACK, "args": {"name": "simulation"}},
+                  {"name": "thread_name", "ph": "M", "pid": 1, "tid": RENDER_TRACK, "args": {"name": "render"}}]
+        for name, start, elapsed, track in self.events:
+            events.append({"name": name, "ph": "X", "pid": 1, "tid": track,
+                           "ts": round((start - origin) * 1e6, 3), "dur": round(elapsed * 1e6, 3)})
+        return events
+
+    def dump_trace(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+
+
+def format_summary(profiler: Profiler, title: Optional[str] = None) -> str:
+    lines = [title] if title else []
+    for name, mean_ms, count in profiler.summary():
+        lines.append(f"  {name:<12} {mean_ms:9.3f} ms  x{count}")
+    return "\n".join(lines)
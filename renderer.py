@@ -0,0 +1,446 @@
+import math
+import tkinter as tk
+from array import array
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from simulation import AB_Y_SIZE, CENTER, LEUKOCYTE_R, RADIUS, VIRUS_R
+
+# =============================
+#        颜色
+# =============================
+BG_COLOR = "white"
+CELL_COLOR = "#4C78A8"
+CELL_INFECTED_COLOR = "#B279A2"
+CELL_INFECTED_BOUND_COLOR = "#A05195"
+CELL_DEAD_COLOR = "#7F7F7F"
+CELL_CORE_COLOR = "#2F4B7C"
+
+VIRUS_COLOR = "#F58518"
+VIRUS_BOUND_COLOR = "#E45756"
+AB_COLOR = "#54A24B"
+AB_FLASH_COLOR = "#E45756"
+LEUKOCYTE_COLOR = "#F2F2F2"
+LEUKOCYTE_OUTLINE = "#333333"
+ARENA_COLOR = "#f8f8ff"
+ARENA_OUTLINE = "#333"
+# =============================
+
+# 密度图：个体很多时把各物种按网格分桶，整张图一次 put 进 PhotoImage，绘制开销只与格数有关
+DENSITY_THRESHOLD = 5000  # auto 视图下个体总数超过多少改画密度图
+DENSITY_GRID = 128        # 密度图每边最多多少格
+DENSITY_LEVELS = 16       # 每层浓淡量化成多少级（颜色按级缓存）
+VIEW_MODES = ("auto", "entities", "density")
+DENSITY_FIELDS = ("species", "infected", "dead")  # 各物种密度叠色 / 感染细胞占比 / 死亡细胞占比
+
+# 图层从下到上的顺序（新建条目后按这个顺序重新叠放）
+LAYERS = ("density", "cell", "core", "label", "virus", "ab", "leukocyte", "hud")
+
+
+# ---------- 画布条目池：条目常驻，只改坐标/颜色/显隐 ----------
+class ItemPool:
+    def __init__(self, canvas: tk.Canvas, layer: str, factory: Callable[[tk.Canvas, Tuple[str, ...]], int]):
+        self.canvas = canvas
+        self.layer = layer
+        self.factory = factory
+        self.items: List[int] = []
+        self.coords: List[Optional[tuple]] = []
+        self.fills: List[Optional[str]] = []
+        self.texts: List[Optional[str]] = []
+        self.visible = 0
+
+    def resize(self, n: int) -> bool:
+        # 前 n 个条目可见，其余隐藏；条目不够就新建，返回是否新建过
+        grew = False
+        canvas = self.canvas
+        while len(self.items) < n:
+            item = self.factory(canvas, ("dyn", self.layer))
+            canvas.itemconfigure(item, state="hidden")
+            self.items.append(item)
+            self.coords.append(None)
+            self.fills.append(None)
+            self.texts.append(None)
+            grew = True
+        if n > self.visible:
+            for item in self.items[self.visible:n]:
+                canvas.itemconfigure(item, state="normal")
+        elif n < self.visible:
+            for item in self.items[n:self.visible]:
+                canvas.itemconfigure(item, state="hidden")
+        self.visible = n
+        return grew
+
+    def place(self, i: int, coords: tuple, fill: Optional[str] = None, text: Optional[str] = None) -> None:
+        item = self.items[i]
+        if self.coords[i] != coords:
+            self.canvas.coords(item, *coords)
+            self.coords[i] = coords
+        if fill is not None and self.fills[i] != fill:
+            self.canvas.itemconfigure(item, fill=fill)
+            self.fills[i] = fill
+        if text is not None and self.texts[i] != text:
+            self.canvas.itemconfigure(item, text=text)
+            self.texts[i] = text
+
+    def clear(self) -> None:
+        for item in self.items:
+            self.canvas.delete(item)
+        self.items.clear()
+        self.coords.clear()
+        self.fills.clear()
+        self.texts.clear()
+        self.visible = 0
+
+
+def _oval(**options) -> Callable[[tk.Canvas, Tuple[str, ...]], int]:
+    return lambda canvas, tags: canvas.create_oval(0, 0, 0, 0, tags=tags, **options)
+
+
+# 细胞颜色编码（快照里每个细胞一个字节）
+CELL_HEALTHY, CELL_INFECTED, CELL_INFECTED_BOUND, CELL_DEAD = range(4)
+CELL_COLORS = (CELL_COLOR, CELL_INFECTED_COLOR, CELL_INFECTED_BOUND_COLOR, CELL_DEAD_COLOR)
+
+
+def cell_code(c) -> int:
+    if c.state == "healthy":
+        return CELL_HEALTHY
+    if c.state == "infected":
+        return CELL_INFECTED_BOUND if c.antibody_attached > 0 else CELL_INFECTED
+    return CELL_DEAD
+
+
+def cell_color(c) -> str:
+    return CELL_COLORS[cell_code(c)]
+
+
+# ---------- 视图选项：画每个个体还是密度图 ----------
+@dataclass(frozen=True)
+class ViewOptions:
+    mode: str = "auto"        # auto：个体总数超过 threshold 时画密度图；entities / density：固定
+    field: str = "species"    # 密度图画什么，见 DENSITY_FIELDS
+    overlay: bool = False     # 密度图上仍然画出每个个体
+    threshold: int = DENSITY_THRESHOLD
+    grid: int = DENSITY_GRID
+
+    def __post_init__(self):
+        if self.mode not in VIEW_MODES:
+            raise ValueError(f"unknown view mode: {self.mode!r}")
+        if self.field not in DENSITY_FIELDS:
+            raise ValueError(f"unknown density field: {self.field!r}")
+        if self.grid < 1:
+            raise ValueError(f"density grid must be positive, got {self.grid}")
+
+    def density(self, population: int) -> bool:
+        if self.mode == "auto":
+            return population > self.threshold
+        return self.mode == "density"
+
+
+# ---------- 分桶后的密度场 ----------
+@dataclass(frozen=True)
+class DensityField:
+    field: str
+    size: int       # 每边格数
+    step: int       # 格长（像素，整数：图像按整数倍放大后与画布对齐）
+    x0: float       # 网格左上角
+    y0: float
+    layers: Tuple[array, ...]  # species：细胞/病毒/抗体/白细胞的计数；infected/dead：细胞总数、目标状态细胞数
+
+
+def bin_density(sim, field: str, grid: int) -> DensityField:
+    step = max(1, math.ceil(2 * RADIUS / grid))
+    size = math.ceil(2 * RADIUS / step)
+    x0, y0 = CENTER - RADIUS, CENTER - RADIUS
+    if not isinstance(sim.cells, list):
+        return _bin_density_arrays(sim, field, size, step, x0, y0)
+    inv = 1.0 / step
+
+    def count(items, keep=None) -> array:
+        counts = array("l", bytes(array("l").itemsize * size * size))
+        for e in items:
+            if keep is not None and not keep(e):
+                continue
+            ix = int((e.x - x0) * inv)
+            iy = int((e.y - y0) * inv)
+            if 0 <= ix < size and 0 <= iy < size:
+                counts[iy * size + ix] += 1
+        return counts
+
+    if field == "species":
+        layers = (count(sim.cells, lambda c: c.state != "dead"), count(sim.viruses),
+                  count(sim.antibodies), count(sim.leukocytes))
+    else:
+        layers = (count(sim.cells), count(sim.cells, lambda c: c.state == field))
+    return DensityField(field, size, step, x0, y0, layers)
+
+
+def _bin_density_arrays(sim, field: str, size: int, step: int, x0: float, y0: float) -> DensityField:
+    # 数组后端（numpy / 多世界批量）：直接拿各物种的坐标列整组分桶（np.bincount），逐格与上面的逐个体循环相同。
+    # 批量模拟里只有落在第 0 个世界大圆范围内的个体会被计入
+    import numpy as np
+
+    from array_sim import DEAD, STATE_CODES
+
+    inv = 1.0 / step
+
+    def count(sa, keep=None) -> array:
+        x, y = sa.x, sa.y
+        if keep is not None:
+            x, y = x[keep], y[keep]
+        ix = ((x - x0) * inv).astype(np.int64)
+        iy = ((y - y0) * inv).astype(np.int64)
+        ok = (ix >= 0) & (ix < size) & (iy >= 0) & (iy < size)
+        return array("l", np.bincount(iy[ok] * size + ix[ok], minlength=size * size).tolist())
+
+    cells = sim.cells
+    if field == "species":
+        layers = (count(cells, cells.state != DEAD), count(sim.viruses),
+                  count(sim.antibodies), count(sim.leukocytes))
+    else:
+        layers = (count(cells), count(cells, cells.state == STATE_CODES[field]))
+    return DensityField(field, size, step, x0, y0, layers)
+
+
+def _rgb(color: str) -> Tuple[int, int, int]:
+    return int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
+
+
+def _mix(levels: Tuple[int, ...], colors: Tuple[Tuple[int, int, int], ...]) -> str:
+    # 从大圆底色开始，按层依次以 级数/最大级 的不透明度叠上各层颜色
+    r, g, b = _rgb(ARENA_COLOR)
+    top = DENSITY_LEVELS - 1
+    for level, (cr, cg, cb) in zip(levels, colors):
+        if level:
+            t = level / top
+            r, g, b = r + (cr - r) * t, g + (cg - g) * t, b + (cb - b) * t
+    return f"#{int(r):02x}{int(g):02x}{int(b):02x}"
+
+
+_SPECIES_RGB = tuple(_rgb(c) for c in (CELL_COLOR, VIRUS_COLOR, AB_COLOR, LEUKOCYTE_OUTLINE))
+_FRACTION_RGB = {"infected": (_rgb(CELL_INFECTED_COLOR),), "dead": (_rgb(CELL_DEAD_COLOR),)}
+
+
+def density_image_data(field: DensityField, cache: Dict[Tuple[int, ...], str]) -> str:
+    # 整张图的 Tk 图像数据（每行 "{#rrggbb ...}"）。species 每层按 sqrt(计数/本层最大值) 定浓淡；
+    # 占比图按 目标细胞数/细胞数 定浓淡，没有细胞的格子留底色。大圆外的格子画成画布底色。
+    # 颜色按各层的级数缓存在 cache 里（每种 field 一份），跨帧复用
+    size, step = field.size, field.step
+    top = DENSITY_LEVELS - 1
+    r2 = RADIUS * RADIUS
+    species = field.field == "species"
+    if species:
+        colors = _SPECIES_RGB
+        scales = [top / math.sqrt(max(layer) or 1) for layer in field.layers]
+    else:
+        colors = _FRACTION_RGB[field.field]
+    rows = []
+    for iy in range(size):
+        dy = field.y0 + (iy + 0.5) * step - CENTER
+        row = []
+        base = iy * size
+        for ix in range(size):
+            dx = field.x0 + (ix + 0.5) * step - CENTER
+            if dx * dx + dy * dy > r2:
+                row.append(BG_COLOR)
+                continue
+            i = base + ix
+            if species:
+                key = tuple(math.ceil(math.sqrt(layer[i]) * scale) for layer, scale in zip(field.layers, scales))
+            else:
+                total = field.layers[0][i]
+                key = (math.ceil(field.layers[1][i] / total * top) if total else 0,)
+            color = cache.get(key)
+            if color is None:
+                color = cache[key] = _mix(key, colors)
+            row.append(color)
+        rows.append("{" + " ".join(row) + "}")
+    return " ".join(rows)
+
+
+# ---------- 一帧的绘制快照：只含绘制用到的数据，生成后不再改动 ----------
+@dataclass(frozen=True)
+class Snapshot:
+    tick: int
+    elapsed_time: float
+    captured: int
+    infected_count: int
+    burst_count: int
+    cells: array            # x, y, r 交错
+    cell_codes: bytes       # 每个细胞一个颜色编码
+    labels: array           # 感染细胞的倒计时：x, y, 剩余秒 交错
+    viruses: array          # x, y 交错
+    virus_bound: bytes      # 每个病毒是否有抗体附着
+    antibodies: array       # x, y 交错
+    antibody_flash: bytes   # 每个抗体是否在闪烁
+    leukocytes: array       # x, y 交错
+    profile_text: Optional[str] = None
+    population: Tuple[int, int, int, int] = (0, 0, 0, 0)  # 细胞/病毒/抗体/白细胞数（HUD 用）
+    density: Optional[DensityField] = None  # 画密度图时的分桶结果；不叠加个体时上面各个体数组为空
+
+
+def take_snapshot(sim, view: ViewOptions = ViewOptions()) -> Snapshot:
+    now = sim.elapsed_time
+    population = (len(sim.cells), len(sim.viruses), len(sim.antibodies), len(sim.leukocytes))
+    density = bin_density(sim, view.field, view.grid) if view.density(sum(population)) else None
+    # 密度图不叠加个体时，逐个体的数组留空：快照和绘制都不随个体数增长
+    shown = density is None or view.overlay
+    cells = array("d")
+    codes = bytearray(len(sim.cells) if shown else 0)
+    labels = array("d")
+    viruses = array("d")
+    antibodies = array("d")
+    leukocytes = array("d")
+    if shown:
+        for i, c in enumerate(sim.cells):
+            cells.extend((c.x, c.y, c.r))
+            code = codes[i] = cell_code(c)
+            if code == CELL_INFECTED or code == CELL_INFECTED_BOUND:
+                labels.extend((c.x, c.y - c.r - 10, max(0.0, c.burst_at - now)))
+        for v in sim.viruses:
+            viruses.extend((v.x, v.y))
+        for a in sim.antibodies:
+            antibodies.extend((a.x, a.y))
+        for w in sim.leukocytes:
+            leukocytes.extend((w.x, w.y))
+    profiler = getattr(sim, "profiler", None)
+    return Snapshot(
+        tick=sim.tick, elapsed_time=now, captured=sim.captured,
+        infected_count=sim.infected_count, burst_count=sim.burst_count,
+        cells=cells, cell_codes=bytes(codes), labels=labels,
+        viruses=viruses, virus_bound=bytes(v.attached > 0 for v in sim.viruses) if shown else b"",
+        antibodies=antibodies, antibody_flash=bytes(a.flash > 0 for a in sim.antibodies) if shown else b"",
+        leukocytes=leukocytes,
+        profile_text=profiler.hud_text() if profiler is not None and profiler.enabled else None,
+        population=population, density=density,
+    )
+
+
+# ---------- 保留模式渲染器 ----------
+class CanvasRenderer:
+    def __init__(self, canvas: tk.Canvas):
+        self.canvas = canvas
+        self.cells = ItemPool(canvas, "cell", _oval(outline=""))
+        self.cores = ItemPool(canvas, "core", _oval(fill=CELL_CORE_COLOR, outline=""))
+        self.labels = ItemPool(canvas, "label", lambda cv, tags: cv.create_text(
+            0, 0, text="", fill="#333", font=("Helvetica", 10), tags=tags))
+        self.viruses = ItemPool(canvas, "virus", _oval(outline=""))
+        # 抗体 Y 用一条折线画完（两臂 + 竖杆），每个抗体一个条目
+        self.antibodies = ItemPool(canvas, "ab", lambda cv, tags: cv.create_line(
+            0, 0, 0, 0, width=2, tags=tags))
+        self.leukocytes = ItemPool(canvas, "leukocyte", _oval(
+            fill=LEUKOCYTE_COLOR, outline=LEUKOCYTE_OUTLINE, width=2))
+        self.pools = (self.cells, self.cores, self.labels, self.viruses, self.antibodies, self.leukocytes)
+        self.hud = canvas.create_text(12, 42, anchor="nw", text="", fill="#111",
+                                      font=("Helvetica", 12), tags=("dyn", "hud"))
+        self.hud_text = ""
+        # 可选的性能统计行（开启分阶段计时时显示在 HUD 下面）
+        self.profile_hud = canvas.create_text(12, 62, anchor="nw", text="", fill="#8A2BE2",
+                                              font=("Helvetica", 11), state="hidden", tags=("dyn", "hud"))
+        self.profile_text: Optional[str] = None
+        # 密度图：field_image 每帧整张 put 一次，按格长整数倍放大进 view_image 显示；大圆边线画在图上面
+        self.view = ViewOptions()
+        self.field_image = tk.PhotoImage(master=canvas)
+        self.view_image = tk.PhotoImage(master=canvas)
+        self.density_item = canvas.create_image(0, 0, anchor="nw", image=self.view_image, state="hidden",
+                                                tags=("dyn", "density"))
+        self.rim = canvas.create_oval(CENTER - RADIUS, CENTER - RADIUS, CENTER + RADIUS, CENTER + RADIUS,
+                                      outline=ARENA_OUTLINE, width=3, state="hidden", tags=("dyn", "density"))
+        self.density_colors: Dict[str, Dict[Tuple[int, ...], str]] = {}
+        self.density_shown = False
+
+    def clear(self) -> None:
+        for pool in self.pools:
+            pool.clear()
+
+    def draw(self, sim) -> None:
+        self.draw_snapshot(take_snapshot(sim, self.view))
+
+    def draw_density(self, field: Optional[DensityField]) -> bool:
+        # 返回密度图是否刚刚出现（需要重新叠放图层）
+        shown = field is not None
+        appeared = shown and not self.density_shown
+        if shown != self.density_shown:
+            state = "normal" if shown else "hidden"
+            self.canvas.itemconfigure(self.density_item, state=state)
+            self.canvas.itemconfigure(self.rim, state=state)
+            self.density_shown = shown
+        if field is None:
+            return False
+        data = density_image_data(field, self.density_colors.setdefault(field.field, {}))
+        if self.field_image.width() != field.size:
+            self.field_image.configure(width=field.size, height=field.size)
+            self.view_image.configure(width=field.size * field.step, height=field.size * field.step)
+        self.field_image.put(data, to=(0, 0))
+        self.view_image.tk.call(self.view_image.name, "copy", self.field_image.name,
+                                "-zoom", field.step, field.step)
+        self.canvas.coords(self.density_item, field.x0, field.y0)
+        return appeared
+
+    def draw_snapshot(self, snap: Snapshot) -> None:
+        # 密度图（个体很多时）
+        grew = self.draw_density(snap.density)
+
+        # 细胞（按状态变色）
+        cells, codes = snap.cells, snap.cell_codes
+        n = len(codes)
+        grew |= self.cells.resize(n)
+        grew |= self.cores.resize(n)
+        for i in range(n):
+            x, y, r = cells[3 * i], cells[3 * i + 1], cells[3 * i + 2]
+            self.cells.place(i, (x - r, y - r, x + r, y + r), fill=CELL_COLORS[codes[i]])
+            # 核心点
+            self.cores.place(i, (x - 3, y - 3, x + 3, y + 3))
+
+        # 感染倒计时显示
+        labels = snap.labels
+        grew |= self.labels.resize(len(labels) // 3)
+        for i in range(len(labels) // 3):
+            self.labels.place(i, (labels[3 * i], labels[3 * i + 1]), text=f"{labels[3 * i + 2]:.1f}s")
+
+        # 病毒
+        viruses, bound = snap.viruses, snap.virus_bound
+        r = VIRUS_R
+        grew |= self.viruses.resize(len(bound))
+        for i in range(len(bound)):
+            x, y = viruses[2 * i], viruses[2 * i + 1]
+            self.viruses.place(i, (x - r, y - r, x + r, y + r),
+                               fill=VIRUS_BOUND_COLOR if bound[i] else VIRUS_COLOR)
+
+        # 抗体（Y）
+        s = AB_Y_SIZE
+        antibodies, flash = snap.antibodies, snap.antibody_flash
+        grew |= self.antibodies.resize(len(flash))
+        for i in range(len(flash)):
+            x, y = antibodies[2 * i], antibodies[2 * i + 1]
+            self.antibodies.place(i, (x - s, y - s, x, y, x + s, y - s, x, y, x, y + s + 2),
+                                  fill=AB_FLASH_COLOR if flash[i] else AB_COLOR)
+
+        # 白细胞
+        leukocytes = snap.leukocytes
+        r = LEUKOCYTE_R
+        grew |= self.leukocytes.resize(len(leukocytes) // 2)
+        for i in range(len(leukocytes) // 2):
+            x, y = leukocytes[2 * i], leukocytes[2 * i + 1]
+            self.leukocytes.place(i, (x - r, y - r, x + r, y + r))
+
+        # HUD
+        _, n_viruses, n_antibodies, n_leukocytes = snap.population
+        text = (f"Tick:{snap.tick}  Viruses:{n_viruses}  "
+                f"Antibodies:{n_antibodies}  Captured:{snap.captured}  "
+                f"Infected:{snap.infected_count}  Bursts:{snap.burst_count}  "
+                f"Leukocytes:{n_leukocytes}")
+        if text != self.hud_text:
+            self.canvas.itemconfigure(self.hud, text=text)
+            self.hud_text = text
+
+        profile_text = snap.profile_text
+        if profile_text != self.profile_text:
+            if profile_text is None:
+                self.canvas.itemconfigure(self.profile_hud, state="hidden")
+            else:
+                self.canvas.itemconfigure(self.profile_hud, text=profile_text, state="normal")
+            self.profile_text = profile_text
+
+        if grew:
+            for layer in LAYERS:
+                self.canvas.tag_raise(layer)
@@ -0,0 +1,77 @@
+import math
+import random
+from typing import Any, Dict, List, Optional
+
+TWO_PI = 2 * math.pi
+
+# 每个子系统一条独立的随机流：某个子系统多抽/少抽几个数，不会打乱其他子系统的序列
+STREAMS = ("placement", "motion", "growth", "infection", "immune")
+
+
+def fresh_seed() -> int:
+    # 未指定种子时从系统熵源取一个，并记录下来，事后仍可复现
+    return random.SystemRandom().getrandbits(63)
+
+
+# ---------- 单条随机流（纯 Python，对象引擎用） ----------
+class RandomStream(random.Random):
+    def __init__(self, seed: Any = None, name: str = ""):
+        # 字符串种子经 sha512 展开，与 PYTHONHASHSEED 无关；不同名字得到互不相关的 MT 状态
+        self.name = name
+        super().__init__(f"{seed}:{name}")
+
+    def angle(self) -> float:
+        return self.random() * TWO_PI
+
+    # ---------- 批量抽取：一次取 n 个，热循环里按下标使用 ----------
+    def angles(self, n: int) -> List[float]:
+        r = self.random
+        return [r() * TWO_PI for _ in range(n)]
+
+    def uniforms(self, n: int, low: float = 0.0, high: float = 1.0) -> List[float]:
+        r = self.random
+        span = high - low
+        return [low + span * r() for _ in range(n)]
+
+    def integers(self, n: int, low: int, high: int) -> List[int]:
+        # 闭区间 [low, high]，与 randint 一致
+        r = self.randint
+        return [r(low, high) for _ in range(n)]
+
+
+class SimRandom:
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = fresh_seed() if seed is None else seed
+        self.placement = RandomStream(self.seed, "placement")  # 初始布局
+        self.motion = RandomStream(self.seed, "motion")        # CA 方向噪声、重合推开
+        self.growth = RandomStream(self.seed, "growth")        # 分裂计时与分裂方向
+        self.infection = RandomStream(self.seed, "infection")  # 爆发喷出的病毒
+        self.immune = RandomStream(self.seed, "immune")        # 白细胞清理后生成抗体
+
+    def streams(self) -> Dict[str, RandomStream]:
+        return {name: getattr(self, name) for name in STREAMS}
+
+    def getstate(self) -> Dict[str, Any]:
+        return {name: stream.getstate() for name, stream in self.streams().items()}
+
+    def setstate(self, state: Dict[str, Any]) -> None:
+        for name, stream in self.streams().items():
+            stream.setstate(state[name])
+
+
+# ---------- numpy 随机流（数组后端用） ----------
+class ArrayStreams:
+    def __init__(self, seed: int):
+        import numpy as np
+
+        # SeedSequence.spawn 保证各子流互不重叠
+        children = np.random.SeedSequence(seed).spawn(len(STREAMS))
+        for name, child in zip(STREAMS, children):
+            setattr(self, name, np.random.default_rng(child))
+
+    def getstate(self) -> Dict[str, Any]:
+        return {name: getattr(self, name).bit_generator.state for name in STREAMS}
+
+    def setstate(self, state: Dict[str, Any]) -> None:
+        for name in STREAMS:
+            getattr(self, name).bit_generator.state = state[name]
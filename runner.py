@@ -0,0 +1,170 @@
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Optional, Tuple
+
+from renderer import Snapshot, ViewOptions, take_snapshot
+from scheduler import FixedStepClock
+from simulation import FPS
+
+
+# ---------- 快照双缓冲：写方在后槽里放好完整的一帧再交换，读方只拿前槽里最新的一帧 ----------
+class SnapshotBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.front: Optional[Snapshot] = None
+        self.back: Optional[Snapshot] = None
+        self.seq = 0  # 已发布的帧数，读方据此判断有没有新帧
+
+    def publish(self, snap: Snapshot) -> None:
+        self.back = snap
+        with self.lock:
+            self.front, self.back = self.back, self.front
+            self.seq += 1
+
+    def latest(self) -> Tuple[int, Optional[Snapshot]]:
+        with self.lock:
+            return self.seq, self.front
+
+
+# ---------- 后台线程独占模拟 ----------
+class SimRunner:
+    # 模拟对象只在后台线程里被访问：Tk 线程通过命令队列发 run/step_ca/reset/view 等命令，
+    # 需要结果的操作（存档、读档、取历史）用 call() 在后台线程里执行并等待返回；
+    # 后台线程每跑完一批步就把快照发布到 snapshots，Tk 线程按自己的帧率取最新一帧来画
+    def __init__(self, sim, clock: Optional[FixedStepClock] = None, publish_fps: float = FPS):
+        self.sim = sim
+        self.clock = clock or FixedStepClock()
+        self.snapshots = SnapshotBuffer()
+        self.commands: "queue.Queue[Tuple[str, tuple]]" = queue.Queue()
+        self.running = False
+        self.max_speed = False
+        self.publish_interval = 1.0 / publish_fps
+        self.dirty = True  # 模拟状态变了但还没发布快照
+        self.view = ViewOptions()  # 快照按它决定画个体还是密度图
+        # 后台线程因异常退出时记在这里，由 Tk 线程在绘制轮询里发现并报告；
+        # lock 保证 call() 入队与线程失败后清空队列不会交错（否则调用方会永远等下去）
+        self.error: Optional[BaseException] = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="simulation", daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def send(self, name: str, *args) -> None:
+        self.commands.put((name, args))
+
+    def call(self, fn: Callable[[Any], Any]) -> Any:
+        # 在后台线程里执行 fn(sim) 并等结果（异常原样抛回调用方）
+        future: Future = Future()
+        with self.lock:
+            if self.error is not None:
+                raise RuntimeError("simulation thread failed") from self.error
+            if not self.thread.is_alive():
+                raise RuntimeError("simulation thread is not running")
+            self.send("call", fn, future)
+        return future.result()
+
+    def stop(self) -> None:
+        if self.thread.is_alive():
+            self.send("stop")
+            self.thread.join()
+
+    # ---------- 后台线程 ----------
+    def _run(self) -> None:
+        while True:
+            try:
+                if not self._iterate():
+                    return
+            except Exception as exc:  # 记下异常后停止，交给 Tk 线程报告
+                self._fail(exc)
+                return
+
+    def _iterate(self) -> bool:
+        # 处理一条命令，或推进一批步并发布快照；收到 stop 时返回 False
+        try:
+            name, args = self.commands.get(timeout=self._wait())
+        except queue.Empty:
+            pass
+        else:
+            if name == "stop":
+                return False
+            getattr(self, "_cmd_" + name)(*args)
+            return True  # 先把积压的命令处理完
+        if self.running:
+            if self.max_speed:
+                # 最快模式：每次发布之间尽量多跑步
+                done = self.clock.run_for(self.sim.animate_step, self.publish_interval)
+            else:
+                done = self.clock.tick(self.sim.animate_step)
+            self.dirty |= done > 0
+        if self.dirty:
+            self.snapshots.publish(take_snapshot(self.sim, self.view))
+            self.dirty = False
+        return True
+
+    def _fail(self, exc: BaseException) -> None:
+        # 记下异常；队列里还在等结果的 call 一并以这个异常失败
+        with self.lock:
+            self.error = exc
+            self.running = False
+            while True:
+                try:
+                    name, args = self.commands.get_nowait()
+                except queue.Empty:
+                    break
+                if name == "call":
+                    args[1].set_exception(exc)
+
+    def _wait(self) -> Optional[float]:
+        # 取命令时最多等多久：有待发布的快照或最快模式不等；暂停时一直等命令；
+        # 实时模式等到下一物理步到期
+        if self.dirty or (self.running and self.max_speed):
+            return 0
+        if not self.running:
+            return None
+        clock = self.clock
+        if clock.last is None:
+            return 0
+        return max(0.0, clock.dt - clock.accum - (clock.clock() - clock.last))
+
+    # ---------- 命令 ----------
+    def _cmd_run(self, running: bool) -> None:
+        self.running = running
+        self.clock.reset()
+
+    def _cmd_max_speed(self, enabled: bool) -> None:
+        self.max_speed = enabled
+        self.clock.reset()
+
+    def _cmd_publish_fps(self, fps: float) -> None:
+        self.publish_interval = 1.0 / fps
+
+    def _cmd_view(self, view: ViewOptions) -> None:
+        self.view = view
+        self.dirty = True
+
+    def _cmd_step_ca(self) -> None:
+        self.sim.ca_step()
+        self.dirty = True
+
+    def _cmd_reset(self) -> None:
+        self.running = False
+        self.sim.reset()
+        self.dirty = True
+
+    def _cmd_profile(self, enabled: bool) -> None:
+        self.sim.profiler.set_enabled(enabled)
+        self.dirty = True
+
+    def _cmd_profile_span(self, name: str, start: float, end: float, track: int) -> None:
+        # Tk 线程上的阶段（绘制）计时也记进同一个 profiler，只在这里写，避免两个线程同时改
+        if self.sim.profiler.enabled:
+            self.sim.profiler.add(name, start, end, track)
+
+    def _cmd_call(self, fn: Callable[[Any], Any], future: Future) -> None:
+        try:
+            future.set_result(fn(self.sim))
+        except Exception as exc:  # 交给调用方处理
+            future.set_exception(exc)
+        self.dirty = True  # 可能读了档
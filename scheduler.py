@@ -0,0 +1,60 @@
+import time
+from typing import Callable, Optional
+
+from simulation import MAX_CATCHUP_STEPS, SIM_DT
+
+
+# ---------- 固定步长调度：物理步长恒定，与绘制帧率解耦 ----------
+class FixedStepClock:
+    def __init__(self, dt: float = SIM_DT, max_catchup: int = MAX_CATCHUP_STEPS,
+                 clock: Callable[[], float] = time.perf_counter):
+        self.dt = dt
+        self.max_catchup = max_catchup
+        self.clock = clock
+        self.accum = 0.0
+        self.last: Optional[float] = None
+        self.steps = 0      # 累计物理步数
+        self.dropped = 0.0  # 追不上而丢弃的模拟时间（秒）
+
+    def reset(self) -> None:
+        # 暂停/重置后调用，避免把暂停期间的墙钟时间一次性补回来
+        self.accum = 0.0
+        self.last = None
+
+    def tick(self, step: Callable[[float], None]) -> int:
+        # 按实际经过的墙钟时间推进：每步固定 dt，每帧最多追 max_catchup 步
+        now = self.clock()
+        if self.last is not None:
+            self.accum += now - self.last
+        self.last = now
+        done = 0
+        while self.accum >= self.dt and done < self.max_catchup:
+            step(self.dt)
+            self.accum -= self.dt
+            done += 1
+        if self.accum >= self.dt:
+            # 积压太多：丢掉整步部分，模拟变慢但保持确定性，画面平滑降级
+            backlog = (self.accum // self.dt) * self.dt
+            self.dropped += backlog
+            self.accum -= backlog
+        self.steps += done
+        return done
+
+    def run_for(self, step: Callable[[float], None], budget: float) -> int:
+        # 最快模式：在 budget 秒墙钟预算内尽量多跑步（至少一步）
+        start = self.clock()
+        done = 0
+        while True:
+            step(self.dt)
+            done += 1
+            if self.clock() - start >= budget:
+                break
+        self.steps += done
+        self.last = self.clock()
+        self.accum = 0.0
+        return done
+
+    @property
+    def alpha(self) -> float:
+        # 距离下一物理步的比例（0..1），可用于插值绘制
+        return self.accum / self.dt
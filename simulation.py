@@ -0,0 +1,1089 @@
+import csv
+import math
+import random
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from directions import DirectionTable
+from events import EventQueue
+from history import History
+from placement import poisson_disk
+from pool import EntityPool
+from profiler import Profiler
+from rng import SimRandom
+from spatial import SpatialHash, TargetIndex
+
+INTEGRATORS = ("euler", "substep")
+
+# =============================
+#        参数（从这里改）
+# =============================
+CANVAS_SIZE = 720
+RADIUS = 320  # 大圆半径
+CENTER = CANVAS_SIZE // 2
+
+# 数量
+N_CELLS = 90
+N_VIRUSES = 20
+N_ANTIBODIES = 0
+N_LEUKOCYTES = 6
+
+# 尺寸
+CELL_R_SMALL = 10
+CELL_R_LARGE = 18
+VIRUS_R = 7
+AB_Y_SIZE = 3
+AB_R_FOR_COLLISION = 0.1  # 抗体碰撞半径（用于细胞障碍物）
+LEUKOCYTE_R = 10
+
+# 初始布局（泊松圆盘采样）：同种个体圆心之间的最小间距 = 2×半径 + 这里的留白（半径在 reset 时读取）；
+# 要求的数量放不下时放多少算多少（见 sim.placed）
+CELL_SPACING_PAD = 14
+VIRUS_SPACING_PAD = 0
+AB_SPACING_PAD = 0
+LEUKOCYTE_SPACING_PAD = 0
+
+# 动画与运动
+FPS = 60
+SIM_DT = 1.0 / FPS         # 固定物理步长（秒），与界面绘制帧率无关
+MAX_CATCHUP_STEPS = 5     # 界面卡顿时每帧最多补几步物理步
+INTEGRATOR = "euler"      # euler：每步直接积分；substep：按速度分子步移动 + 扫掠接触判定（大步长快进用）
+SUBSTEP_TRAVEL = 0.5      # substep 模式下每个子步最多走“最薄障碍厚度”的多少倍
+CA_INTERVAL = 0.12        # 每隔多少秒做一次CA决策（离散方向更新）
+TURN_SMOOTH = 0.45        # 速度方向平滑系数（越小越丝滑）
+N_DIRECTIONS = 16         # CA 离散方向数量（8/16/32/64）
+
+VIRUS_SPEED = 70.0        # px/s
+AB_SPEED = 100.0          # px/s
+CELL_SPEED = 18.0         # px/s 细胞慢速随机漂移
+LEUKOCYTE_SPEED = 80.0    # px/s 白细胞速度
+VIRUS_ATTACHED_SPEED_FACTOR = 0.8
+VIRUS_ATTACHED_SPEED_DECAY = 0.2
+VIRUS_ATTACHED_AVOID_SCALE = 0.12
+CELL_ATTACHED_SPEED_FACTOR = 0.7
+CELL_ATTACHED_SPEED_DECAY = 0.15
+OVERLAP_ITERATIONS = 4       # 细胞重叠每步最多迭代几轮（位置式 Jacobi，所有重叠对同时修正）
+OVERLAP_VELOCITY_RATIO = 0.4 / 0.6  # 细胞被推开多少像素，速度沿推开方向反向减去多少倍
+
+# 行为参数
+VIRUS_ATTRACT_CELL = 0.6  # 病毒趋向细胞程度
+AB_SENSE_RADIUS = 90.0    # 抗体感知半径
+AB_CHASE = 0.15            # 抗体追逐强度
+CAPTURE_DIST = 20.0        # 抗体捕获距离
+VIRUS_AVOID_LEUKOCYTE = 0.4  # 病毒远离白细胞强度
+LEUKOCYTE_SENSE_RADIUS = 160.0
+LEUKOCYTE_CHASE = 0.9
+AB_SPAWN_MIN = 1
+AB_SPAWN_MAX = 1
+
+# 新增：感染与爆发参数
+INFECTION_PADDING = 2                   # 病毒“贴到细胞”判定阈值补偿（可调）
+VIRUS_REPLICATION_TIME = 3.0              # 病毒繁殖时间（秒）
+BURST_VIRUS_COUNT_SMALL = 2               # 小细胞破裂出现的病毒数量
+BURST_VIRUS_COUNT_LARGE = 5              # 大细胞破裂出现的病毒数量
+
+# 新增：细胞分裂/成长参数
+CELL_DIVIDE_TIME_MIN = 3              # 分裂最短时间（秒）
+CELL_DIVIDE_TIME_MAX = 10             # 分裂最长时间（秒）
+CELL_GROW_TIME = 10                     # 小细胞长成大细胞的时间（秒）
+
+# 历史记录（时间线图/CSV 用）
+HISTORY_CAPACITY = 65536   # 最多保留多少条（60 FPS 约 18 分钟），超出后按 HISTORY_MODE 处理
+HISTORY_MODE = "decimate"  # decimate：抽稀保留整段；ring：只留最近；all：不限长度
+# =============================
+
+
+# ---------- 数据结构 ----------
+# 个体由 EntityPool 管理并复用；slot 是个体在池里的下标，由池维护，不参与比较和存档
+@dataclass(slots=True)
+class Cell:
+    x: float
+    y: float
+    vx: float
+    vy: float
+    r: float = CELL_R_LARGE
+    state: str = "healthy"      # healthy | infected | dead
+    born: float = -math.inf     # 开始长大的模拟时刻，半径由它插值；-inf 表示生来就是大细胞
+    burst_at: float = 0.0       # infected -> 爆发的模拟时刻
+    divide_at: Optional[float] = None  # 长成大细胞后排定的分裂时刻
+    antibody_attached: int = 0
+    slot: int = field(default=-1, repr=False, compare=False)
+
+
+@dataclass(slots=True)
+class Virus:
+    x: float
+    y: float
+    vx: float
+    vy: float
+    attached: int = 0
+    slot: int = field(default=-1, repr=False, compare=False)
+
+
+@dataclass(slots=True)
+class Antibody:
+    x: float
+    y: float
+    vx: float
+    vy: float
+    flash: int = 0  # 捕获后闪烁若干帧
+    slot: int = field(default=-1, repr=False, compare=False)
+
+
+@dataclass(slots=True)
+class Leukocyte:
+    x: float
+    y: float
+    vx: float
+    vy: float
+    slot: int = field(default=-1, repr=False, compare=False)
+
+
+@dataclass
+class Contacts:
+    # 本帧几何上已接触的配对，按主动方下标升序；被接触方的下标列表也是升序（即“列表里的先后”）
+    infection: List[Tuple[int, List[int]]] = field(default_factory=list)             # (病毒, 健康细胞)
+    capture: List[Tuple[int, List[int], List[int]]] = field(default_factory=list)    # (抗体, 病毒, 细胞)
+    cleanup: List[Tuple[int, List[int], List[int]]] = field(default_factory=list)    # (白细胞, 病毒, 细胞)
+
+
+# ---------- 工具 ----------
+def rand_point_in_circle(r: float, margin: float = 0, rng: Any = random) -> Tuple[float, float]:
+    a = rng.random() * 2 * math.pi
+    rr = math.sqrt(rng.random()) * (r - margin)
+    x = CENTER + rr * math.cos(a)
+    y = CENTER + rr * math.sin(a)
+    return x, y
+
+
+def dist2(ax: float, ay: float, bx: float, by: float) -> float:
+    dx = ax - bx
+    dy = ay - by
+    return dx * dx + dy * dy
+
+
+def closest_approach2(rx: float, ry: float, dx: float, dy: float) -> float:
+    # 两个个体本步内都匀速直线运动：起点相对位置 (rx, ry)、相对位移 (dx, dy)，返回步内最近距离的平方。
+    # 没有位移时就是当前距离的平方（与 dist2 逐位相同）
+    dd = dx * dx + dy * dy
+    if dd > 1e-12:
+        t = clamp(-(rx * dx + ry * dy) / dd, 0.0, 1.0)
+        rx += t * dx
+        ry += t * dy
+    return rx * rx + ry * ry
+
+
+def unit_vec(dx: float, dy: float) -> Tuple[float, float]:
+    d = math.hypot(dx, dy)
+    if d < 1e-9:
+        return 0.0, 0.0
+    return dx / d, dy / d
+
+
+def clamp(value: float, low: float, high: float) -> float:
+    return max(low, min(high, value))
+
+
+def lerp(a: float, b: float, t: float) -> float:
+    return a + (b - a) * t
+
+
+def grown_radius(born: float, now: float) -> float:
+    if CELL_GROW_TIME <= 0:
+        return CELL_R_LARGE
+    progress = min(1.0, (now - born) / CELL_GROW_TIME)
+    return lerp(CELL_R_SMALL, CELL_R_LARGE, progress)
+
+
+def burst_count_for_cell(cell: Cell) -> int:
+    denom = CELL_R_LARGE - CELL_R_SMALL
+    ratio = 1.0 if denom <= 0 else clamp((cell.r - CELL_R_SMALL) / denom, 0.0, 1.0)
+    return int(round(lerp(BURST_VIRUS_COUNT_SMALL, BURST_VIRUS_COUNT_LARGE, ratio)))
+
+
+def pick_discrete_direction(dx: float, dy: float, directions: List[Tuple[float, float]]) -> Tuple[float, float]:
+    ux, uy = unit_vec(dx, dy)
+    best = directions[0]
+    best_dot = -1e9
+    for vx, vy in directions:
+        dot = ux * vx + uy * vy
+        if dot > best_dot:
+            best_dot = dot
+            best = (vx, vy)
+    return best
+
+
+def reflect_off_circle(x: float, y: float, vx: float, vy: float, margin: float) -> Tuple[float, float, float, float]:
+    dx = x - CENTER
+    dy = y - CENTER
+    d = math.hypot(dx, dy)
+    limit = RADIUS - margin
+    if d <= limit or d < 1e-9:
+        return x, y, vx, vy
+
+    nx, ny = dx / d, dy / d
+    x = CENTER + nx * limit
+    y = CENTER + ny * limit
+
+    dot = vx * nx + vy * ny
+    vx = vx - 2 * dot * nx
+    vy = vy - 2 * dot * ny
+    return x, y, vx, vy
+
+
+def _candidates(grid: Optional[SpatialHash], x: float, y: float, reach: float,
+                count: int, after: int = -1):
+    # 没有网格时退化为按列表顺序全扫；有网格时只取附近的候选（同样按下标升序）
+    if grid is None:
+        return range(after + 1, count)
+    return [idx for idx in grid.query(x, y, reach) if idx > after]
+
+
+def substep_count(vx: float, vy: float, dt: float, thickness: float) -> int:
+    # 本步位移超过 SUBSTEP_TRAVEL × 最薄障碍厚度时切成若干等长子步，避免一步跨过障碍
+    travel = math.hypot(vx, vy) * dt
+    limit = SUBSTEP_TRAVEL * thickness
+    if limit <= 0 or travel <= limit:
+        return 1
+    return math.ceil(travel / limit)
+
+
+def _path(item: Any, idx: int, origins: Optional[List[Tuple[float, float]]]) -> Tuple[float, float, float, float]:
+    # 个体本步的起点与位移（按起点到终点的直线近似）；没记起点的（euler 模式、本步新生的）视为原地不动
+    if origins is None or idx >= len(origins):
+        return item.x, item.y, 0.0, 0.0
+    x0, y0 = origins[idx]
+    return x0, y0, item.x - x0, item.y - y0
+
+
+def push_out_of_cells(x: float, y: float, vx: float, vy: float, r_obj: float, cells: List[Cell],
+                      grid: Optional[SpatialHash] = None, rng: Any = random) -> Tuple[float, float, float, float]:
+    # healthy/infected 细胞作为障碍物；dead 不再阻挡（你也可以改成仍阻挡）
+    reach = r_obj + (grid.max_radius if grid is not None else 0.0)
+    order = _candidates(grid, x, y, reach, len(cells))
+    pos = 0
+    while pos < len(order):
+        idx = order[pos]
+        pos += 1
+        c = cells[idx]
+        if c.state == "dead":
+            continue
+        dx = x - c.x
+        dy = y - c.y
+        d = math.hypot(dx, dy)
+        min_d = c.r + r_obj
+        if d < min_d and d > 1e-9:
+            nx, ny = dx / d, dy / d
+            x = c.x + nx * min_d
+            y = c.y + ny * min_d
+            dot = vx * nx + vy * ny
+            vx = vx - 1.8 * dot * nx
+            vy = vy - 1.8 * dot * ny
+        elif d < 1e-9:
+            a = rng.random() * 2 * math.pi
+            x = c.x + math.cos(a) * min_d
+            y = c.y + math.sin(a) * min_d
+        else:
+            continue
+        # 位置被推开后，后续细胞要按新位置重新取候选，保证与全扫结果一致
+        if grid is not None:
+            order = _candidates(grid, x, y, reach, len(cells), idx)
+            pos = 0
+    return x, y, vx, vy
+
+
+def overlapping_cell_pairs(cells: List[Cell], grid: Optional[SpatialHash], skin: float,
+                           rng: Any = random) -> List[Tuple[int, int, float, float, float]]:
+    # 粗筛：收集距离不到 r_i + r_j + skin 的存活细胞对 (i, j, 接触距离, 重合时的推开方向)，i < j。
+    # 完全重合的对预先抽一个随机方向，迭代中一直沿用
+    pairs = []
+    extra = skin + (grid.max_radius if grid is not None else 0.0)
+    for i, c in enumerate(cells):
+        if c.state == "dead":
+            continue
+        for j in _candidates(grid, c.x, c.y, c.r + extra, len(cells), i):
+            other = cells[j]
+            if other.state == "dead":
+                continue
+            min_d = c.r + other.r
+            dx = c.x - other.x
+            dy = c.y - other.y
+            d2 = dx * dx + dy * dy
+            if d2 >= (min_d + skin) * (min_d + skin):
+                continue
+            fx = fy = 0.0
+            if d2 < 1e-18:
+                ang = rng.random() * 2 * math.pi
+                fx, fy = math.cos(ang), math.sin(ang)
+            pairs.append((i, j, min_d, fx, fy))
+    return pairs
+
+
+def resolve_overlaps(cells: List[Cell], grid: Optional[SpatialHash] = None, rng: Any = random) -> float:
+    # 细胞互相推开（位置式 Jacobi）：粗筛一次收集配对，最多迭代 OVERLAP_ITERATIONS 轮，
+    # 每轮按当前位置算出所有重叠对的修正再同时施加：两边各让一半，同时被几对推的取平均，结果与列表顺序无关。
+    # 速度按总位移一次性修正；网格里的位置同步更新。返回剩余的最大重叠（像素）
+    pairs = overlapping_cell_pairs(cells, grid, 0.5 * CELL_R_SMALL, rng)
+    if not pairs:
+        return 0.0
+    start = {}
+    for i, j, _, _, _ in pairs:
+        start[i] = (cells[i].x, cells[i].y)
+        start[j] = (cells[j].x, cells[j].y)
+    residual = 0.0
+    for it in range(OVERLAP_ITERATIONS + 1):
+        shift: Dict[int, List[float]] = {}
+        residual = 0.0
+        for i, j, min_d, fx, fy in pairs:
+            a, b = cells[i], cells[j]
+            dx = a.x - b.x
+            dy = a.y - b.y
+            d = math.hypot(dx, dy)
+            overlap = min_d - d
+            if overlap <= 0:
+                continue
+            residual = max(residual, overlap)
+            if d > 1e-9:
+                nx, ny = dx / d, dy / d
+            else:
+                nx, ny = fx, fy
+            half = 0.5 * overlap
+            sa = shift.setdefault(i, [0.0, 0.0, 0])
+            sa[0] += nx * half
+            sa[1] += ny * half
+            sa[2] += 1
+            sb = shift.setdefault(j, [0.0, 0.0, 0])
+            sb[0] -= nx * half
+            sb[1] -= ny * half
+            sb[2] += 1
+        if not shift or it == OVERLAP_ITERATIONS:
+            break
+        for idx, (sx, sy, count) in shift.items():
+            c = cells[idx]
+            c.x += sx / count
+            c.y += sy / count
+    for idx, (x0, y0) in start.items():
+        c = cells[idx]
+        c.vx -= (c.x - x0) * OVERLAP_VELOCITY_RATIO
+        c.vy -= (c.y - y0) * OVERLAP_VELOCITY_RATIO
+        if grid is not None:
+            grid.move(idx, c.x, c.y)
+    return residual
+
+
+def initial_world(rng: Any = random,
+                  batch: bool = False) -> Tuple[List[Cell], List[Virus], List[Antibody], List[Leukocyte]]:
+    # 各物种依次做泊松圆盘采样：同种之间至少隔 2×半径 + *_SPACING_PAD，病毒/抗体/白细胞还要避开已放好的细胞；
+    # batch=True（数组后端）用 numpy 版采样，得到的世界与纯 Python 版逐位相同
+    center = (CENTER, CENTER)
+    cells: List[Cell] = []
+    for x, y in poisson_disk(N_CELLS, CELL_R_LARGE * 2 + CELL_SPACING_PAD, RADIUS - 70, center, rng,
+                             batch=batch):
+        ang = rng.random() * 2 * math.pi
+        vx = CELL_SPEED * math.cos(ang)
+        vy = CELL_SPEED * math.sin(ang)
+        cells.append(Cell(x=x, y=y, vx=vx, vy=vy, r=CELL_R_LARGE,
+                          divide_at=rng.uniform(CELL_DIVIDE_TIME_MIN, CELL_DIVIDE_TIME_MAX)))
+    blockers = [(c.x, c.y) for c in cells]
+
+    def agents(cls, count: int, spacing: float, margin: float, clearance: float, speed: float) -> list:
+        out = []
+        for x, y in poisson_disk(count, spacing, RADIUS - margin, center, rng, blockers, clearance, batch):
+            ang = rng.random() * 2 * math.pi
+            out.append(cls(x=x, y=y, vx=speed * math.cos(ang), vy=speed * math.sin(ang)))
+        return out
+
+    viruses = agents(Virus, N_VIRUSES, VIRUS_R * 2 + VIRUS_SPACING_PAD, 20,
+                     CELL_R_LARGE + VIRUS_R + 2, VIRUS_SPEED)
+    antibodies = agents(Antibody, N_ANTIBODIES, AB_Y_SIZE * 2 + AB_SPACING_PAD, 15,
+                        CELL_R_LARGE + AB_R_FOR_COLLISION + 2, AB_SPEED)
+    leukocytes = agents(Leukocyte, N_LEUKOCYTES, LEUKOCYTE_R * 2 + LEUKOCYTE_SPACING_PAD, 25,
+                        CELL_R_LARGE + LEUKOCYTE_R + 4, LEUKOCYTE_SPEED)
+    return cells, viruses, antibodies, leukocytes
+
+
+def placement_report(world: Tuple[list, ...], copies: int = 1) -> Dict[str, Tuple[int, int]]:
+    # 初始布局各物种 (实际放下的数量, 要求的数量)；copies 是一次放了几个世界
+    requested = (N_CELLS, N_VIRUSES, N_ANTIBODIES, N_LEUKOCYTES)
+    names = ("cells", "viruses", "antibodies", "leukocytes")
+    return {name: (len(items), count * copies) for name, items, count in zip(names, world, requested)}
+
+
+# ---------- 模拟引擎（与界面无关） ----------
+class Simulation:
+    def __init__(self, seed: Optional[int] = None):
+        # 每个模拟自带随机源（按子系统分流），同一种子可逐位复现
+        self.rng = SimRandom(seed)
+
+        # 统计
+        self.captured = 0
+        self.tick = 0
+        self.infected_count = 0
+        self.burst_count = 0
+        self.elapsed_time = 0.0
+        self.history = History(HISTORY_CAPACITY, HISTORY_MODE)
+        self.metrics = None  # 可选的 metrics.MetricsRecorder，每记录一帧历史就推送一行
+        self.profiler = Profiler()  # 分阶段计时，默认关闭
+        self.set_integrator(INTEGRATOR)  # 积分方式
+
+        # 离散方向（默认16方向，查表量化）
+        self.direction_table = DirectionTable(N_DIRECTIONS)
+        self.directions = self.direction_table.directions
+
+        # 各物种放在个体池里；整体替换世界请用 load_objects，不要直接给这些属性赋值
+        self.cells: EntityPool = EntityPool(Cell)
+        self.viruses: EntityPool = EntityPool(Virus)
+        self.antibodies: EntityPool = EntityPool(Antibody)
+        self.leukocytes: EntityPool = EntityPool(Leukocyte)
+
+        self.ca_accum = 0.0
+
+        # 空间索引（None 表示需要按当前列表重建）
+        self._cell_grid: Optional[SpatialHash] = None
+        self._virus_grid: Optional[SpatialHash] = None
+        self._targets: Optional[TargetIndex] = None  # 白细胞追踪的被标记目标
+
+        # 定时事件：长成/分裂、感染爆发；growing 是仍在长大的细胞（只有它们每帧要算半径）
+        # 与空间索引一样，列表被整体替换后标记失效，下次用到时按细胞字段重建
+        self.growth_events = EventQueue()
+        self.burst_events = EventQueue()
+        self.growing: Dict[int, Cell] = {}
+        self._timers_valid = False
+
+        self.reset()
+
+    def reset(self, seed: Optional[int] = None):
+        # 给定种子则从头换一套随机流；否则沿用当前随机流继续抽（得到新的初始布局）
+        if seed is not None:
+            self.reseed(seed)
+        self.captured = 0
+        self.tick = 0
+        self.infected_count = 0
+        self.burst_count = 0
+        self.overlap_residual = 0.0  # 最近一步细胞推开后剩余的最大重叠（像素）
+        self.elapsed_time = 0.0
+        self.history.clear()
+        self.ca_accum = 0.0
+
+        world = initial_world(self.rng.placement)
+        self.placed = placement_report(world)
+        self.load_objects(*world)
+        self.record_history()
+
+    def reseed(self, seed: Optional[int] = None) -> None:
+        # 只换随机流、不动世界状态（从同一存档分叉出不同分支时用）
+        self.rng = SimRandom(seed)
+
+    def set_integrator(self, name: str) -> None:
+        # euler：逐位复现以前的结果；substep：大步长（如 dt=0.1）快进时仍不穿过细胞、不漏掉擦身而过的接触
+        if name not in INTEGRATORS:
+            raise ValueError(f"unknown integrator: {name!r}")
+        self.integrator = name
+
+    def load_objects(self, cells: List[Cell], viruses: List[Virus],
+                     antibodies: List[Antibody], leukocytes: List[Leukocyte]) -> None:
+        # 与 ArraySimulation.load_objects 对应：整体换成给定的个体（对象直接收进池里）
+        self.cells.load(cells)
+        self.viruses.load(viruses)
+        self.antibodies.load(antibodies)
+        self.leukocytes.load(leukocytes)
+        self.invalidate_indices()
+
+    # ---------- 空间索引 ----------
+    def invalidate_indices(self) -> None:
+        self._cell_grid = None
+        self._virus_grid = None
+        self._targets = None
+        self._timers_valid = False
+
+    def cell_index(self) -> SpatialHash:
+        if self._cell_grid is None:
+            # 网格边长取大细胞直径，查询时再加上最大细胞半径
+            max_r = max(CELL_R_SMALL, CELL_R_LARGE)
+            self._cell_grid = SpatialHash.build(((c.x, c.y) for c in self.cells), 2 * max_r, max_radius=max_r)
+        return self._cell_grid
+
+    def target_index(self) -> TargetIndex:
+        # 被标记的目标：附着了抗体的病毒、感染/死亡细胞、附着了抗体的细胞。
+        # 建好后在病毒被附着、细胞被感染、目标被吞掉时增量登记，不再每个 CA 步全扫
+        if self._targets is None:
+            targets = TargetIndex(LEUKOCYTE_SENSE_RADIUS / 4)
+            for v in self.viruses:
+                if v.attached > 0:
+                    targets.add(v)
+            for c in self.cells:
+                if c.state != "healthy" or c.antibody_attached > 0:
+                    targets.add(c)
+            self._targets = targets
+        return self._targets
+
+    def _mark_target(self, item: Any) -> None:
+        if self._targets is not None:
+            self._targets.add(item)
+
+    def _unmark_target(self, item: Any) -> None:
+        if self._targets is not None:
+            self._targets.discard(item)
+
+    def virus_index(self) -> SpatialHash:
+        if self._virus_grid is None:
+            max_r = max(CELL_R_SMALL, CELL_R_LARGE)
+            self._virus_grid = SpatialHash.build(((v.x, v.y) for v in self.viruses), 2 * max_r, max_radius=VIRUS_R)
+        return self._virus_grid
+
+    # ---------- 定时事件 ----------
+    def sync_timers(self) -> None:
+        if self._timers_valid:
+            return
+        self.growth_events.clear()
+        self.burst_events.clear()
+        self.growing.clear()
+        now = self.elapsed_time
+        for c in self.cells:
+            if c.state == "dead":
+                continue
+            if c.state == "infected":
+                self.burst_events.schedule(c.burst_at, "burst", c)
+            if c.divide_at is None:
+                self._start_growth(c, now)
+            else:
+                self.growth_events.schedule(c.divide_at, "divide", c)
+        self._timers_valid = True
+
+    def _start_growth(self, cell: Cell, now: float) -> None:
+        # 长成时刻到了才排分裂；还没长成的放进 growing 每帧插值半径
+        self.growth_events.schedule(cell.born + CELL_GROW_TIME, "grown", cell)
+        if cell.born + CELL_GROW_TIME > now:
+            self.growing[id(cell)] = cell
+
+    def _forget_timers(self, cell: Cell) -> None:
+        self.growth_events.cancel(cell)
+        self.burst_events.cancel(cell)
+        self.growing.pop(id(cell), None)
+
+    def run(self, seconds: float, dt: float = SIM_DT) -> int:
+        # 不受界面帧率限制，按模拟时间推进 seconds 秒，返回步数
+        steps = 0
+        end_time = self.elapsed_time + seconds
+        while self.elapsed_time < end_time - 1e-9:
+            self.animate_step(dt)
+            steps += 1
+        return steps
+
+    # ---------- 连续动画步 ----------
+    def animate_step(self, dt: float):
+        prof = self.profiler
+        t = prof.start()
+        self.tick += 1
+        self.elapsed_time += dt
+        self.ca_accum += dt
+
+        # CA决策步
+        if self.ca_accum >= CA_INTERVAL:
+            self.ca_accum %= CA_INTERVAL
+            self.ca_step()
+        t = prof.lap("ca_step", t)
+
+        # substep 模式：每个个体按自己的速度切子步（每个子步都做边界反弹，病毒/抗体/白细胞还做推开），
+        # 并记下本步起点，接触判定按起点到终点的扫掠路径算最近距离
+        substep = self.integrator == "substep"
+
+        # 连续移动：细胞（边移动边更新网格，后面的细胞看到的是最新位置）
+        motion = self.rng.motion
+        cell_grid = self.cell_index()
+        for idx, c in enumerate(self.cells):
+            if c.state == "dead":
+                continue
+            speed_factor = 1.0
+            if c.antibody_attached > 0:
+                speed_factor = max(0.3, CELL_ATTACHED_SPEED_FACTOR - c.antibody_attached * CELL_ATTACHED_SPEED_DECAY)
+            n = substep_count(c.vx, c.vy, dt, 2 * CELL_R_SMALL) if substep else 1
+            h = dt / n
+            if substep:
+                # 附着减速按“每个参考帧乘一次”折算到子步长，与步长无关
+                speed_factor **= h * FPS
+            for _ in range(n):
+                c.x += c.vx * h
+                c.y += c.vy * h
+                c.vx *= speed_factor
+                c.vy *= speed_factor
+                c.x, c.y, c.vx, c.vy = reflect_off_circle(c.x, c.y, c.vx, c.vy, margin=c.r)
+                cell_grid.move(idx, c.x, c.y)
+        t = prof.lap("move_cells", t)
+
+        # 细胞成长与分裂
+        self.cell_growth_and_division(dt)
+        t = prof.lap("growth", t)
+
+        # 细胞互相推开：移动和分裂之后统一做一次（新生的子细胞也在里面）
+        self.resolve_cell_overlaps()
+        t = prof.lap("overlaps", t)
+
+        # 连续移动：病毒 / 抗体 / 白细胞（障碍厚度取最小细胞半径 + 自身碰撞半径）
+        origins = None
+        if substep:
+            origins = ([(v.x, v.y) for v in self.viruses],
+                       [(a.x, a.y) for a in self.antibodies],
+                       [(w.x, w.y) for w in self.leukocytes])
+        cell_grid = self.cell_index()
+        for a in self.antibodies:
+            if a.flash > 0:
+                a.flash -= 1
+        for pool, r_obj in ((self.viruses, VIRUS_R), (self.antibodies, AB_R_FOR_COLLISION),
+                            (self.leukocytes, LEUKOCYTE_R)):
+            thickness = CELL_R_SMALL + r_obj
+            for e in pool:
+                n = substep_count(e.vx, e.vy, dt, thickness) if substep else 1
+                h = dt / n
+                for _ in range(n):
+                    e.x += e.vx * h
+                    e.y += e.vy * h
+                    e.x, e.y, e.vx, e.vy = reflect_off_circle(e.x, e.y, e.vx, e.vy, margin=r_obj)
+                    e.x, e.y, e.vx, e.vy = push_out_of_cells(e.x, e.y, e.vx, e.vy, r_obj, self.cells, cell_grid, motion)
+        self._virus_grid = None
+        t = prof.lap("move_agents", t)
+
+        # 到期的感染细胞破裂；喷出的病毒排在末尾，本帧不参与感染
+        infective = len(self.viruses)
+        self.burst_step()
+        t = prof.lap("bursts", t)
+
+        # 接触：一次粗筛找出所有已接触的配对，三种相互作用按原来的优先级依次结算
+        contacts = self.find_contacts(infective, origins)
+        t = prof.lap("contacts", t)
+
+        # 新增：感染逻辑（病毒贴到细胞 → 细胞变色并开始倒计时）
+        self.infection_step(contacts)
+        t = prof.lap("infection", t)
+
+        # 抗体附着
+        self.capture_check(contacts)
+        t = prof.lap("capture", t)
+
+        # 白细胞清理；本帧被消耗/吞掉的个体到最后统一删除
+        self.leukocyte_cleanup(contacts)
+        self.apply_removals()
+        t = prof.lap("cleanup", t)
+        self.record_history()
+        prof.lap("history", t)
+
+    def record_history(self):
+        live_cells = sum(1 for c in self.cells if c.state != "dead")
+        self.history.append((self.elapsed_time, len(self.leukocytes), live_cells, len(self.viruses), len(self.antibodies)))
+        if self.metrics is not None:
+            self.metrics.record(self)
+
+    def attach_metrics(self, recorder) -> None:
+        # 接上后立即写出当前这一帧，保证输出从当前状态开始
+        self.metrics = recorder
+        if recorder is not None:
+            recorder.record(self)
+
+    # ---------- CA决策步：只更新“速度方向” ----------
+    def ca_step(self):
+        # 方向噪声按物种一次性批量抽取，每个个体恰好用一个
+        motion = self.rng.motion
+        live_cells = [c for c in self.cells if c.state != "dead"]
+
+        # 细胞：慢速、无目的乱动
+        for c, ang in zip(live_cells, motion.angles(len(live_cells))):
+            tx, ty = math.cos(ang), math.sin(ang)
+            ddx, ddy = self.direction_table.pick(tx, ty)
+            nvx, nvy = ddx * CELL_SPEED, ddy * CELL_SPEED
+            c.vx = (1.0 - TURN_SMOOTH) * c.vx + TURN_SMOOTH * nvx
+            c.vy = (1.0 - TURN_SMOOTH) * c.vy + TURN_SMOOTH * nvy
+
+        # 病毒：随机游走 + 轻微向最近“未死亡细胞”靠近 + 远离白细胞
+        for v, ang in zip(self.viruses, motion.angles(len(self.viruses))):
+            rx, ry = math.cos(ang), math.sin(ang)
+
+            if live_cells and v.attached <= 0:
+                nearest = min(live_cells, key=lambda c: dist2(v.x, v.y, c.x, c.y))
+                cx, cy = nearest.x - v.x, nearest.y - v.y
+                cux, cuy = unit_vec(cx, cy)
+            else:
+                cux, cuy = 0.0, 0.0
+
+            if self.leukocytes:
+                nearest_w = min(self.leukocytes, key=lambda w: dist2(v.x, v.y, w.x, w.y))
+                wx, wy = v.x - nearest_w.x, v.y - nearest_w.y
+                wux, wuy = unit_vec(wx, wy)
+            else:
+                wux, wuy = 0.0, 0.0
+
+            avoid_scale = 1.0 + v.attached * VIRUS_ATTACHED_AVOID_SCALE
+            avoid_strength = VIRUS_AVOID_LEUKOCYTE * avoid_scale
+            base = max(0.0, 1.0 - VIRUS_ATTRACT_CELL - avoid_strength)
+            tx = base * rx + VIRUS_ATTRACT_CELL * cux + avoid_strength * wux
+            ty = base * ry + VIRUS_ATTRACT_CELL * cuy + avoid_strength * wuy
+
+            ddx, ddy = self.direction_table.pick(tx, ty)
+            speed_factor = max(0.2, VIRUS_ATTACHED_SPEED_FACTOR - v.attached * VIRUS_ATTACHED_SPEED_DECAY)
+            speed = VIRUS_SPEED * speed_factor
+            nvx, nvy = ddx * speed, ddy * speed
+            v.vx = (1.0 - TURN_SMOOTH) * v.vx + TURN_SMOOTH * nvx
+            v.vy = (1.0 - TURN_SMOOTH) * v.vy + TURN_SMOOTH * nvy
+
+        # 抗体：感知半径内找最近未附着病毒，否则随机
+        sense2 = AB_SENSE_RADIUS * AB_SENSE_RADIUS
+        for a, ang in zip(self.antibodies, motion.angles(len(self.antibodies))):
+            target: Optional[Virus] = None
+            best_d2 = sense2
+            for v in self.viruses:
+                if v.attached:
+                    continue
+                d2 = dist2(a.x, a.y, v.x, v.y)
+                if d2 < best_d2:
+                    best_d2 = d2
+                    target = v
+
+            if target is None:
+                tx, ty = math.cos(ang), math.sin(ang)
+            else:
+                dx, dy = target.x - a.x, target.y - a.y
+                tux, tuy = unit_vec(dx, dy)
+                rx, ry = math.cos(ang), math.sin(ang)
+                tx = AB_CHASE * tux + (1.0 - AB_CHASE) * rx
+                ty = AB_CHASE * tuy + (1.0 - AB_CHASE) * ry
+
+            ddx, ddy = self.direction_table.pick(tx, ty)
+            nvx, nvy = ddx * AB_SPEED, ddy * AB_SPEED
+            a.vx = (1.0 - TURN_SMOOTH) * a.vx + TURN_SMOOTH * nvx
+            a.vy = (1.0 - TURN_SMOOTH) * a.vy + TURN_SMOOTH * nvy
+
+        # 白细胞：追踪被标记目标（附着病毒/感染细胞/死亡细胞），感知半径内取最近的
+        targets = self.target_index()
+        targets.refresh()
+        for w, ang in zip(self.leukocytes, motion.angles(len(self.leukocytes))):
+            target = targets.nearest(w.x, w.y, LEUKOCYTE_SENSE_RADIUS)
+            if target is None:
+                tx, ty = math.cos(ang), math.sin(ang)
+            else:
+                dx, dy = target.x - w.x, target.y - w.y
+                tux, tuy = unit_vec(dx, dy)
+                rx, ry = math.cos(ang), math.sin(ang)
+                tx = LEUKOCYTE_CHASE * tux + (1.0 - LEUKOCYTE_CHASE) * rx
+                ty = LEUKOCYTE_CHASE * tuy + (1.0 - LEUKOCYTE_CHASE) * ry
+            ddx, ddy = self.direction_table.pick(tx, ty)
+            nvx, nvy = ddx * LEUKOCYTE_SPEED, ddy * LEUKOCYTE_SPEED
+            w.vx = (1.0 - TURN_SMOOTH) * w.vx + TURN_SMOOTH * nvx
+            w.vy = (1.0 - TURN_SMOOTH) * w.vy + TURN_SMOOTH * nvy
+
+    def cell_growth_and_division(self, dt: float):
+        # 只处理到期的长成/分裂事件；每帧的开销与到期事件数、仍在长大的细胞数成正比
+        self.sync_timers()
+        now = self.elapsed_time
+        growth = self.rng.growth
+        newborn_cells: List[Cell] = []
+
+        for _, kind, c in self.growth_events.pop_due(now):
+            if kind == "grown":
+                self.growing.pop(id(c), None)
+                c.r = CELL_R_LARGE
+                if c.divide_at is None:
+                    c.divide_at = now + growth.uniform(CELL_DIVIDE_TIME_MIN, CELL_DIVIDE_TIME_MAX)
+                self.growth_events.schedule(c.divide_at, "divide", c)
+            elif c.state == "healthy":
+                # 感染后不再分裂（也不会再变回健康），到期的分裂事件直接作废
+                newborn_cells.extend(self.divide_cell(c))
+
+        # 仍在长大的细胞：半径按出生时刻插值
+        for c in self.growing.values():
+            c.r = grown_radius(c.born, now)
+
+        if newborn_cells:
+            # 第一个子细胞占着父细胞的下标，第二个追加在末尾；网格按下标增量更新
+            cell_grid = self.cell_index()
+            for newborn in newborn_cells:
+                self._start_growth(newborn, now)
+                cell_grid.move(newborn.slot, newborn.x, newborn.y)
+
+    def resolve_cell_overlaps(self) -> None:
+        self.overlap_residual = resolve_overlaps(self.cells, self.cell_index(), self.rng.motion)
+
+    def divide_cell(self, cell: Cell) -> List[Cell]:
+        # 父细胞原地变成第一个子细胞（复用对象和下标），第二个从池里取
+        # 一次抽三个角度：分裂方向 + 两个子细胞的速度方向
+        ang, *child_angles = self.rng.growth.angles(3)
+        offset = max(CELL_R_SMALL + 2, cell.r * 0.6)
+        dx = math.cos(ang) * offset
+        dy = math.sin(ang) * offset
+        positions = [(cell.x + dx, cell.y + dy), (cell.x - dx, cell.y - dy)]
+        children = []
+        for (x, y), ang_v in zip(positions, child_angles):
+            if not self._inside_big_circle(x, y, margin=CELL_R_SMALL):
+                dx_c, dy_c = x - CENTER, y - CENTER
+                d = math.hypot(dx_c, dy_c) or 1.0
+                nx, ny = dx_c / d, dy_c / d
+                limit = RADIUS - CELL_R_SMALL
+                x = CENTER + nx * limit
+                y = CENTER + ny * limit
+            vx = CELL_SPEED * math.cos(ang_v)
+            vy = CELL_SPEED * math.sin(ang_v)
+            children.append((x, y, vx, vy))
+        (x1, y1, vx1, vy1), (x2, y2, vx2, vy2) = children
+        now = self.elapsed_time
+        first = self.cells.respawn(cell, x1, y1, vx1, vy1, r=CELL_R_SMALL, born=now)
+        second = self.cells.spawn(x2, y2, vx2, vy2, r=CELL_R_SMALL, born=now)
+        return [first, second]
+
+    # ---------- 接触检测：一次粗筛，感染/捕获/清理共用 ----------
+    def find_contacts(self, infective: Optional[int] = None,
+                      origins: Optional[Tuple[List[Tuple[float, float]], ...]] = None) -> Contacts:
+        # 只做几何判断（含精确距离）；健康/感染/死亡、是否已被删除这些状态在结算过程中会变，留给结算时判断。
+        # 只有前 infective 个病毒参与感染（本帧爆发新生的不算）。
+        # origins 是 (病毒, 抗体, 白细胞) 本步起点：给了就把抗体/白细胞与病毒的接触按两者相对位移的扫掠路径
+        # 算最近距离（相对速度最大，最容易擦身而过）；对细胞的判定仍用终点位置：子步已限制了相对细胞的步长，
+        # 而被细胞推开、贴着细胞表面滑行的个体，起点到终点的直线会穿进细胞里，不能当作接触。
+        # 粗筛以路径中点为圆心，再放宽半条路径和病毒的最大位移
+        cells, viruses = self.cells, self.viruses
+        cell_grid = self.cell_index()
+        virus_grid = self.virus_index()
+        max_r = cell_grid.max_radius
+        contacts = Contacts()
+        virus_from, antibody_from, leukocyte_from = origins if origins is not None else (None, None, None)
+        virus_paths = [_path(v, vi, virus_from) for vi, v in enumerate(viruses)]
+        virus_travel = max((math.hypot(p[2], p[3]) for p in virus_paths), default=0.0)
+
+        # 病毒 -> 健康细胞：附着了抗体的病毒不再感染；不健康的细胞本帧也不会变回健康
+        pad = VIRUS_R + INFECTION_PADDING
+        reach = pad + max_r
+        for vi in range(len(viruses) if infective is None else infective):
+            v = viruses[vi]
+            if v.attached > 0:
+                continue
+            hits = []
+            for idx in cell_grid.query(v.x, v.y, reach):
+                c = cells[idx]
+                if c.state == "healthy" and dist2(v.x, v.y, c.x, c.y) <= (c.r + pad) ** 2:
+                    hits.append(idx)
+            if hits:
+                contacts.infection.append((vi, hits))
+
+        # 两个网格格长相同，抗体和白细胞各只算一次包围盒，同时取出病毒和细胞候选
+        # 抗体 -> 病毒 / 细胞：细胞可能在本帧才被感染，所以只排除已死亡的
+        cap2 = CAPTURE_DIST * CAPTURE_DIST
+        for ai, a in enumerate(self.antibodies):
+            x0, y0, dx, dy = _path(a, ai, antibody_from)
+            half = 0.5 * math.hypot(dx, dy)
+            near_viruses, near_cells = virus_grid.query_with(cell_grid, x0 + dx * 0.5, y0 + dy * 0.5,
+                                                             CAPTURE_DIST + half + virus_travel)
+            virus_hits = []
+            for idx in near_viruses:
+                vx0, vy0, vdx, vdy = virus_paths[idx]
+                if closest_approach2(vx0 - x0, vy0 - y0, vdx - dx, vdy - dy) <= cap2:
+                    virus_hits.append(idx)
+            cell_hits = []
+            for idx in near_cells:
+                c = cells[idx]
+                if c.state != "dead" and dist2(c.x, c.y, a.x, a.y) <= cap2:
+                    cell_hits.append(idx)
+            if virus_hits or cell_hits:
+                contacts.capture.append((ai, virus_hits, cell_hits))
+
+        # 白细胞 -> 病毒 / 细胞：细胞的状态在结算时再看（健康细胞可能在本帧被感染）
+        virus_reach = LEUKOCYTE_R + VIRUS_R
+        virus_dist2 = virus_reach * virus_reach
+        cell_reach = LEUKOCYTE_R + max_r
+        for wi, w in enumerate(self.leukocytes):
+            x0, y0, dx, dy = _path(w, wi, leukocyte_from)
+            half = 0.5 * math.hypot(dx, dy)
+            near_viruses, near_cells = virus_grid.query_with(cell_grid, x0 + dx * 0.5, y0 + dy * 0.5,
+                                                             max(virus_reach + virus_travel, cell_reach) + half)
+            virus_hits = []
+            for idx in near_viruses:
+                vx0, vy0, vdx, vdy = virus_paths[idx]
+                if closest_approach2(x0 - vx0, y0 - vy0, dx - vdx, dy - vdy) <= virus_dist2:
+                    virus_hits.append(idx)
+            cell_hits = []
+            for idx in near_cells:
+                c = cells[idx]
+                if dist2(w.x, w.y, c.x, c.y) <= (LEUKOCYTE_R + c.r) ** 2:
+                    cell_hits.append(idx)
+            if virus_hits or cell_hits:
+                contacts.cleanup.append((wi, virus_hits, cell_hits))
+        return contacts
+
+    def apply_removals(self) -> None:
+        # 统一删除本帧标记的个体（交换删除，细胞网格跟着改编号）
+        if self.viruses.sweep():
+            self._virus_grid = None
+        self.antibodies.sweep()
+        self.cells.sweep(self._cell_grid)
+
+    # ---------- 新增：感染/爆发 ----------
+    def infection_step(self, contacts: Contacts):
+        # 每个病毒按下标顺序结算，感染候选里第一个仍健康的细胞，然后“进入细胞”（标记删除）
+        now = self.elapsed_time
+        cells, viruses = self.cells, self.viruses
+        for vi, hits in contacts.infection:
+            for idx in hits:
+                c = cells[idx]
+                if c.state != "healthy":
+                    continue
+                c.state = "infected"
+                self._mark_target(c)
+                c.burst_at = now + VIRUS_REPLICATION_TIME
+                self.burst_events.schedule(c.burst_at, "burst", c)
+                self.infected_count += 1
+                viruses.mark(vi)
+                break
+
+    def burst_step(self):
+        # 到期的感染细胞 -> 破裂爆发（按到期先后）；场上的病毒全被用掉以后，已感染的细胞照样到期爆发
+        if not self.cells:
+            return
+        self.sync_timers()
+        viruses = self.viruses
+        for _, _, c in self.burst_events.pop_due(self.elapsed_time):
+            self.burst_count += 1
+            c.state = "dead"
+            c.antibody_attached = 0
+            # 死亡细胞不再长大，也不再分裂
+            self.growth_events.cancel(c)
+            self.growing.pop(id(c), None)
+
+            burst_count = burst_count_for_cell(c)
+
+            # 爆发产生病毒：从细胞附近喷出（方向、出生距离、速度抖动各批量抽取），一次性批量生成
+            infection = self.rng.infection
+            angles = infection.angles(burst_count)
+            offsets = infection.uniforms(burst_count, 0.0, 6.0)
+            jitters = infection.uniforms(burst_count, 0.9, 1.4)
+            xs, ys, vxs, vys = [], [], [], []
+            for ang, offset, jitter in zip(angles, offsets, jitters):
+                # 出生点：细胞边缘附近稍微外移一点
+                rr = c.r + VIRUS_R + offset
+                x = c.x + rr * math.cos(ang)
+                y = c.y + rr * math.sin(ang)
+
+                # 保证在大圆内；如果不在就往内拉一点
+                if not self._inside_big_circle(x, y, margin=VIRUS_R):
+                    # 把点拉回到大圆内
+                    dx, dy = x - CENTER, y - CENTER
+                    d = math.hypot(dx, dy) or 1.0
+                    nx, ny = dx / d, dy / d
+                    limit = RADIUS - VIRUS_R
+                    x = CENTER + nx * limit
+                    y = CENTER + ny * limit
+
+                # 速度：随机方向，略带“喷射”效果（速度有抖动）
+                sp = VIRUS_SPEED * jitter
+                xs.append(x)
+                ys.append(y)
+                vxs.append(sp * math.cos(ang))
+                vys.append(sp * math.sin(ang))
+            viruses.spawn_many(xs, ys, vxs, vys)
+            self._virus_grid = None
+
+    def _inside_big_circle(self, x: float, y: float, margin: float = 0) -> bool:
+        dx = x - CENTER
+        dy = y - CENTER
+        return (dx * dx + dy * dy) <= (RADIUS - margin) ** 2
+
+    # ---------- 抗体捕获 ----------
+    def capture_check(self, contacts: Contacts):
+        # 每个抗体至多附着一个目标：先找病毒（下标最小、且本帧没被感染消耗的），再找感染细胞
+        antibodies, viruses, cells = self.antibodies, self.viruses, self.cells
+        consumed = viruses.doomed
+        for ai, virus_hits, cell_hits in contacts.capture:
+            a = antibodies[ai]
+            for idx in virus_hits:
+                if idx in consumed:
+                    continue
+                viruses[idx].attached += 1
+                self._mark_target(viruses[idx])
+                a.flash = 8
+                self.captured += 1
+                antibodies.mark(ai)
+                break
+            else:
+                for idx in cell_hits:
+                    c = cells[idx]
+                    if c.state != "infected":
+                        continue
+                    c.antibody_attached += 1
+                    a.flash = 8
+                    antibodies.mark(ai)
+                    break
+
+    def _spawn_antibodies(self, x: float, y: float, count: int) -> None:
+        if count <= 0:
+            return
+        immune = self.rng.immune
+        angles = immune.angles(count)
+        radii = immune.uniforms(count, 6.0, 14.0)
+        velocity_angles = immune.angles(count)
+        xs, ys, vxs, vys = [], [], [], []
+        for ang, rr, ang_v in zip(angles, radii, velocity_angles):
+            px = x + rr * math.cos(ang)
+            py = y + rr * math.sin(ang)
+            if not self._inside_big_circle(px, py, margin=AB_R_FOR_COLLISION):
+                dx, dy = px - CENTER, py - CENTER
+                d = math.hypot(dx, dy) or 1.0
+                nx, ny = dx / d, dy / d
+                limit = RADIUS - AB_R_FOR_COLLISION
+                px = CENTER + nx * limit
+                py = CENTER + ny * limit
+            xs.append(px)
+            ys.append(py)
+            vxs.append(AB_SPEED * math.cos(ang_v))
+            vys.append(AB_SPEED * math.sin(ang_v))
+        self.antibodies.spawn_many(xs, ys, vxs, vys)
+
+    def leukocyte_cleanup(self, contacts: Contacts):
+        # 每个白细胞吞掉接触到的所有病毒和感染/死亡细胞（先到先得，已被吞或已被消耗的跳过）
+        viruses, cells = self.viruses, self.cells
+        virus_removed = viruses.doomed
+        cell_removed = cells.doomed
+        immune = self.rng.immune
+        for _, virus_hits, cell_hits in contacts.cleanup:
+            for idx in virus_hits:
+                if idx in virus_removed:
+                    continue
+                v = viruses[idx]
+                viruses.mark(idx)
+                self._unmark_target(v)
+                spawn_count = immune.randint(AB_SPAWN_MIN, AB_SPAWN_MAX)
+                self._spawn_antibodies(v.x, v.y, spawn_count)
+
+            for idx in cell_hits:
+                if idx in cell_removed:
+                    continue
+                c = cells[idx]
+                if c.state == "dead" or c.state == "infected":
+                    cells.mark(idx)
+                    self._forget_timers(c)
+                    self._unmark_target(c)
+                    spawn_count = immune.randint(AB_SPAWN_MIN, AB_SPAWN_MAX)
+                    self._spawn_antibodies(c.x, c.y, spawn_count)
+
+
+def write_history_csv(path: str, history: Iterable[Tuple[float, int, int, int, int]]) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["time", "leukocytes", "cells", "viruses", "antibodies"])
+        writer.writerows(history)
+
+
+# ---------- 参数覆盖（批量实验用） ----------
+def param_names() -> List[str]:
+    return [name for name, value in globals().items()
+            if name.isupper() and isinstance(value, (int, float))]
+
+
+@contextmanager
+def override_params(params: Dict[str, Any]) -> Iterator[None]:
+    # 临时改写本模块顶部的参数，退出时恢复；派生值（CENTER、SIM_DT）不会跟着变
+    g = globals()
+    known = set(param_names())
+    unknown = [name for name in params if name not in known]
+    if unknown:
+        raise KeyError(f"unknown simulation parameters: {', '.join(sorted(unknown))}")
+    saved = {name: g[name] for name in params}
+    g.update(params)
+    try:
+        yield
+    finally:
+        g.update(saved)
@@ -0,0 +1,171 @@
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# ---------- 均匀网格空间哈希（碰撞/邻近查询的粗筛） ----------
+class SpatialHash:
+    def __init__(self, cell_size: float, max_radius: float = 0.0):
+        self.cell_size = float(cell_size)
+        self.inv = 1.0 / self.cell_size
+        # 所有条目中的最大半径，查询“与任意条目重叠”时需要加上它
+        self.max_radius = max_radius
+        self.buckets: Dict[Tuple[int, int], List[int]] = {}
+        self.where: Dict[int, Tuple[int, int]] = {}
+
+    def _key(self, x: float, y: float) -> Tuple[int, int]:
+        return math.floor(x * self.inv), math.floor(y * self.inv)
+
+    def clear(self) -> None:
+        self.buckets.clear()
+        self.where.clear()
+
+    def insert(self, item: int, x: float, y: float) -> None:
+        key = self._key(x, y)
+        self.buckets.setdefault(key, []).append(item)
+        self.where[item] = key
+
+    def remove(self, item: int) -> None:
+        key = self.where.pop(item, None)
+        if key is None:
+            return
+        bucket = self.buckets[key]
+        bucket.remove(item)
+        if not bucket:
+            del self.buckets[key]
+
+    def relabel(self, old: int, new: int) -> None:
+        # 条目换了编号（交换删除时末尾条目挪到空位），位置不变
+        key = self.where.pop(old)
+        bucket = self.buckets[key]
+        bucket[bucket.index(old)] = new
+        self.where[new] = key
+
+    def move(self, item: int, x: float, y: float) -> None:
+        key = self._key(x, y)
+        old = self.where.get(item)
+        if old == key:
+            return
+        if old is not None:
+            bucket = self.buckets[old]
+            bucket.remove(item)
+            if not bucket:
+                del self.buckets[old]
+        self.buckets.setdefault(key, []).append(item)
+        self.where[item] = key
+
+    def query(self, x: float, y: float, radius: float) -> List[int]:
+        # 返回包围盒内的候选条目（升序），精确距离判断由调用方完成
+        inv, floor = self.inv, math.floor
+        ix0, ix1 = floor((x - radius) * inv), floor((x + radius) * inv)
+        iy0, iy1 = floor((y - radius) * inv), floor((y + radius) * inv)
+        buckets = self.buckets
+        found: List[int] = []
+        for ix in range(ix0, ix1 + 1):
+            for iy in range(iy0, iy1 + 1):
+                bucket = buckets.get((ix, iy))
+                if bucket:
+                    found.extend(bucket)
+        found.sort()
+        return found
+
+    def query_with(self, other: "SpatialHash", x: float, y: float,
+                   radius: float) -> Tuple[List[int], List[int]]:
+        # 两个同格长的网格一起查：包围盒只算一次，分别返回两边的候选（各自升序）
+        if other.cell_size != self.cell_size:
+            raise ValueError(f"grids differ in cell size: {self.cell_size} vs {other.cell_size}")
+        inv, floor = self.inv, math.floor
+        ix0, ix1 = floor((x - radius) * inv), floor((x + radius) * inv)
+        iy0, iy1 = floor((y - radius) * inv), floor((y + radius) * inv)
+        mine, theirs = self.buckets, other.buckets
+        found: List[int] = []
+        found_other: List[int] = []
+        for ix in range(ix0, ix1 + 1):
+            for iy in range(iy0, iy1 + 1):
+                key = (ix, iy)
+                bucket = mine.get(key)
+                if bucket:
+                    found.extend(bucket)
+                bucket = theirs.get(key)
+                if bucket:
+                    found_other.extend(bucket)
+        found.sort()
+        found_other.sort()
+        return found, found_other
+
+    def nearest(self, x: float, y: float, radius: float,
+                xs: Sequence[float], ys: Sequence[float]) -> int:
+        # 半径内（严格小于）最近的条目，没有则返回 -1；条目坐标由调用方的 xs/ys 给出。
+        # 从所在格子一圈圈往外找，某一圈的最近可能距离已不小于当前最优时提前停止；等距时取编号小的
+        inv, floor = self.inv, math.floor
+        cx, cy = floor(x * inv), floor(y * inv)
+        buckets = self.buckets
+        best, best_d2 = -1, radius * radius
+        for ring in range(int(radius * inv) + 2):
+            gap = (ring - 1) * self.cell_size
+            if ring > 1 and gap * gap > best_d2:
+                break
+            if ring == 0:
+                keys = [(cx, cy)]
+            else:
+                keys = [(ix, cy - ring) for ix in range(cx - ring, cx + ring + 1)]
+                keys += [(ix, cy + ring) for ix in range(cx - ring, cx + ring + 1)]
+                keys += [(cx - ring, iy) for iy in range(cy - ring + 1, cy + ring)]
+                keys += [(cx + ring, iy) for iy in range(cy - ring + 1, cy + ring)]
+            for key in keys:
+                bucket = buckets.get(key)
+                if not bucket:
+                    continue
+                for item in bucket:
+                    dx = xs[item] - x
+                    dy = ys[item] - y
+                    d2 = dx * dx + dy * dy
+                    if d2 < best_d2 or (d2 == best_d2 and item < best):
+                        best, best_d2 = item, d2
+        return best
+
+    @classmethod
+    def build(cls, points: Iterable[Tuple[float, float]], cell_size: float,
+              max_radius: float = 0.0) -> "SpatialHash":
+        grid = cls(cell_size, max_radius)
+        for idx, (x, y) in enumerate(points):
+            grid.insert(idx, x, y)
+        return grid
+
+
+# ---------- 被标记目标的索引：成员增量维护，查询前按当前位置分桶 ----------
+class TargetIndex:
+    # 成员按对象身份增删（状态变化时由调用方登记），遍历顺序即登记顺序；
+    # 目标每帧都在动，所以不随移动更新网格，而是在一批查询前 refresh 一次，只涉及成员本身
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self.members: Dict[int, Any] = {}
+        self.items: List[Any] = []
+        self.xs: List[float] = []
+        self.ys: List[float] = []
+        self.grid = SpatialHash(cell_size)
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def __contains__(self, item: Any) -> bool:
+        return id(item) in self.members
+
+    def add(self, item: Any) -> None:
+        self.members[id(item)] = item
+
+    def discard(self, item: Any) -> None:
+        self.members.pop(id(item), None)
+
+    def clear(self) -> None:
+        self.members.clear()
+        self.refresh()
+
+    def refresh(self) -> None:
+        items = self.items = list(self.members.values())
+        self.xs = [item.x for item in items]
+        self.ys = [item.y for item in items]
+        self.grid = SpatialHash.build(zip(self.xs, self.ys), self.cell_size)
+
+    def nearest(self, x: float, y: float, radius: float) -> Optional[Any]:
+        idx = self.grid.nearest(x, y, radius, self.xs, self.ys)
+        return self.items[idx] if idx >= 0 else None
@@ -0,0 +1,222 @@
+import argparse
+import ast
+import csv
+import itertools
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import simulation
+from checkpoint import load_checkpoint
+from simulation import SIM_DT, Simulation, override_params
+
+SUMMARY_FIELDS = [
+    "final_time", "final_leukocytes", "final_cells", "final_viruses", "final_antibodies",
+    "peak_viruses", "peak_antibodies", "min_cells", "infected", "bursts", "captured",
+    "steps", "wall_s",
+]
+
+
+# ---------- 参数点 ----------
+def param_grid(spec: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    # {"N_CELLS": [60, 90], "INFECTION_PADDING": [1, 2]} -> 笛卡尔积
+    names = list(spec)
+    return [dict(zip(names, values)) for values in itertools.product(*(spec[n] for n in names))]
+
+
+def random_samples(spec: Dict[str, Tuple[float, float]], count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    # 每个参数在 [low, high] 内均匀采样；上下界都是整数时采整数
+    rng = random.Random(seed)
+    points = []
+    for _ in range(count):
+        point = {}
+        for name, (low, high) in spec.items():
+            if isinstance(low, int) and isinstance(high, int):
+                point[name] = rng.randint(low, high)
+            else:
+                point[name] = rng.uniform(low, high)
+        points.append(point)
+    return points
+
+
+def replicate_seed(base_seed: int, point: int, replicate: int) -> int:
+    # 每个 (参数点, 重复) 一个独立种子，与调度顺序/工作进程无关
+    return random.Random(f"{base_seed}:{point}:{replicate}").getrandbits(63)
+
+
+# ---------- 单次运行（在工作进程里执行） ----------
+def summarize(sim, steps: int, wall: float) -> Dict[str, Any]:
+    history = sim.history
+    last = history[-1]
+    return {
+        "final_time": round(last[0], 6),
+        "final_leukocytes": last[1],
+        "final_cells": last[2],
+        "final_viruses": last[3],
+        "final_antibodies": last[4],
+        "peak_viruses": history.max("viruses"),
+        "peak_antibodies": history.max("antibodies"),
+        "min_cells": history.min("cells"),
+        "infected": sim.infected_count,
+        "bursts": sim.burst_count,
+        "captured": sim.captured,
+        "steps": steps,
+        "wall_s": round(wall, 4),
+    }
+
+
+def run_one(point: int, replicate: int, params: Dict[str, Any], seed: int,
+            seconds: float, dt: float, backend: str = "objects",
+            checkpoint: Optional[str] = None, integrator: str = "euler") -> Dict[str, Any]:
+    with override_params(params):
+        if backend == "numpy":
+            if integrator != "euler":
+                raise ValueError(f"the numpy backend only supports the euler integrator, got {integrator!r}")
+            from array_sim import ArraySimulation
+            sim = ArraySimulation(seed)
+        else:
+            sim = Simulation(seed)
+            sim.set_integrator(integrator)
+        if checkpoint:
+            # 所有分支从同一个预热存档出发，各自换上自己的随机流
+            load_checkpoint(checkpoint, sim)
+            sim.reseed(seed)
+        start = time.perf_counter()
+        steps = sim.run(seconds, dt)
+        wall = time.perf_counter() - start
+    row = {"point": point, "replicate": replicate, "seed": seed, "world": 0}
+    row.update(params)
+    row.update(summarize(sim, steps, wall))
+    return row
+
+
+def run_batch(point: int, params: Dict[str, Any], seed: int, replicates: int,
+              seconds: float, dt: float) -> List[Dict[str, Any]]:
+    # 一个参数点的全部重复放进同一个多世界批量模拟，一次跑完；各行共用批量模拟的种子，
+    # 由 world 列（批量模拟里的世界号）区分：(seed, world) 加上重复次数确定一次运行
+    from batch_sim import BatchSimulation
+
+    with override_params(params):
+        sim = BatchSimulation(replicates, seed)
+        start = time.perf_counter()
+        steps = sim.run(seconds, dt)
+        wall = time.perf_counter() - start
+    rows = []
+    for replicate in range(replicates):
+        row = {"point": point, "replicate": replicate, "seed": seed, "world": replicate}
+        row.update(params)
+        row.update(summarize(sim.world(replicate), steps, wall / replicates))
+        rows.append(row)
+    return rows
+
+
+# ---------- 进程池批量运行 ----------
+def run_sweep(points: List[Dict[str, Any]], replicates: int, seconds: float, dt: float = SIM_DT,
+              backend: str = "objects", workers: Optional[int] = None,
+              base_seed: int = 0, checkpoint: Optional[str] = None,
+              integrator: str = "euler") -> Iterator[Dict[str, Any]]:
+    # 所有 (参数点 × 重复) 分发到进程池，哪个先完成就先产出哪一行；
+    # batch 后端按参数点分发，每个任务产出该点的全部重复
+    if backend == "batch":
+        if checkpoint:
+            raise ValueError("the batch backend cannot start from a checkpoint")
+        if integrator != "euler":
+            raise ValueError(f"the batch backend only supports the euler integrator, got {integrator!r}")
+        run, tasks = run_batch, [(p, params, replicate_seed(base_seed, p, 0), replicates, seconds, dt)
+                                 for p, params in enumerate(points)]
+    else:
+        run, tasks = run_one, [(p, r, params, replicate_seed(base_seed, p, r), seconds, dt, backend,
+                                checkpoint, integrator)
+                               for p, params in enumerate(points) for r in range(replicates)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for task in tasks:
+            result = run(*task)
+            yield from result if backend == "batch" else [result]
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run, *task) for task in tasks]
+        for future in as_completed(futures):
+            result = future.result()
+            yield from result if backend == "batch" else [result]
+
+
+def _parse_value(text: str) -> Any:
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        raise argparse.ArgumentTypeError(f"bad parameter value: {text!r}")
+
+
+def _parse_assignment(text: str) -> Tuple[str, str]:
+    name, sep, values = text.partition("=")
+    if not sep or not values:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUES, got {text!r}")
+    name = name.strip()
+    if name not in simulation.param_names():
+        raise argparse.ArgumentTypeError(f"unknown simulation parameter: {name}")
+    return name, values
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程参数扫描 / 蒙特卡洛重复实验")
+    parser.add_argument("--grid", action="append", default=[], type=_parse_assignment,
+                        metavar="NAME=V1,V2,...", help="网格参数（可多次给出，取笛卡尔积）")
+    parser.add_argument("--sample", action="append", default=[], type=_parse_assignment,
+                        metavar="NAME=LOW:HIGH", help="随机采样参数的范围（可多次给出）")
+    parser.add_argument("--samples", type=int, default=10, help="随机采样的参数点数量")
+    parser.add_argument("--replicates", type=int, default=1, help="每个参数点的重复次数")
+    parser.add_argument("--seconds", type=float, default=60.0, help="每次运行的模拟时长（秒）")
+    parser.add_argument("--dt", type=float, default=SIM_DT, help="时间步长（秒）")
+    parser.add_argument("--backend", choices=("objects", "numpy", "batch"), default="objects",
+                        help="batch：每个参数点的全部重复放进一个多世界批量模拟（batch_sim）一次跑完")
+    parser.add_argument("--integrator", choices=simulation.INTEGRATORS, default=simulation.INTEGRATOR,
+                        help="积分方式（substep 配合大 --dt 快进；仅对象引擎）")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认使用全部 CPU 核")
+    parser.add_argument("--seed", type=int, default=0, help="基础种子（各次运行的种子由它派生）")
+    parser.add_argument("--out", default=None, help="结果 CSV 路径，默认写到标准输出")
+    parser.add_argument("--checkpoint", default=None, help="每次运行都从这个存档开始（按各自种子分叉）")
+    args = parser.parse_args()
+
+    if args.backend != "objects" and args.integrator != "euler":
+        parser.error("--integrator substep requires --backend objects")
+    if args.backend == "batch" and args.checkpoint:
+        parser.error("--checkpoint cannot be combined with --backend batch")
+    if args.grid and args.sample:
+        parser.error("--grid and --sample cannot be combined")
+    if args.sample:
+        spec = {}
+        for name, values in args.sample:
+            low, sep, high = values.partition(":")
+            if not sep:
+                parser.error(f"--sample {name} expects LOW:HIGH")
+            spec[name] = (_parse_value(low), _parse_value(high))
+        points = random_samples(spec, args.samples, args.seed)
+        names = list(spec)
+    else:
+        spec = {name: [_parse_value(v) for v in values.split(",")] for name, values in args.grid}
+        points = param_grid(spec)
+        names = list(spec)
+
+    out = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
+    try:
+        writer = csv.DictWriter(out, fieldnames=["point", "replicate", "seed", "world"] + names + SUMMARY_FIELDS)
+        writer.writeheader()
+        total = len(points) * args.replicates
+        for done, row in enumerate(run_sweep(points, args.replicates, args.seconds, args.dt,
+                                             args.backend, args.workers, args.seed,
+                                             args.checkpoint, args.integrator), start=1):
+            writer.writerow(row)
+            out.flush()
+            print(f"[{done}/{total}] point={row['point']} replicate={row['replicate']}",
+                  file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()